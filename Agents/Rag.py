@@ -1,43 +1,93 @@
-import chromadb 
-from huggingface_hub import InferenceClient
 import streamlit as st
+import logging
 import re
+import threading
+import time
+from Agents.streaming import completion_chunks
+from Agents.cache import SemanticCache, normalize_query
+from Agents.embeddings import embed
+from Agents.settings import setting
+from Agents import providers, routing, telemetry
+from Agents.rag_context import UNKNOWN_BOOK, build_context
+
+logger = logging.getLogger(__name__)
 
 class Rag:
 
     def __init__(self):
          
-        token = st.secrets["HF_token"]
-        self.client = InferenceClient(
-            # provider="hf-inference",
-            api_key=token,
-        )
-        client_db = chromadb.CloudClient(
-            api_key= st.secrets["Chromadb_token"],
-            tenant='2c00d764-53a9-4bad-9e5e-4f1bce13358d',
-            database='Edu_KB'
-                )
-        self.K_db = client_db.get_collection(name="books")
-
-
-    # call the model
-    def call_model(self, prompt, model_name = "HuggingFaceTB/SmolLM3-3B",  temperature=0.5, top_p = 0.5, stream = False): 
-        completion = self.client.chat.completions.create(
-        model=model_name,
-        messages=[
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ],
-        temperature= temperature,
-        top_p= top_p,
-        stream=stream, # send wonce finished
+        # shared with the other agents, created on first use
+        self.client = providers.get("hf")
+        # cloud, embedded chroma or memory-mapped npy index (Agents/vector_store.py)
+        self.K_db = providers.get("vector_store")
+
+        # answers to repeated / near-duplicate grammar questions
+        self.answers = SemanticCache(
+            "rag_answers",
+            threshold=setting("rag_cache", "similarity_threshold", 0.92),
+            max_size=setting("rag_cache", "max_size", 500),
+            ttl=setting("rag_cache", "ttl_hours", 24 * 7) * 3600,
         )
+
+        # top_k chunks are compressed into context_tokens, compress = false sends them whole
+        self.top_k = setting("rag", "top_k", 4)
+        self.context_tokens = setting("rag", "context_tokens", 512)
+        self.compress = setting("rag", "compress", True)
+        self._lock = threading.Lock()
+        self.counters = {"explanations": 0, "tokens_before": 0, "tokens_after": 0, "prompt_tokens": 0,
+                         "generation_seconds": 0.0, "first_token_seconds": 0.0}
+
+
+    # call the model, without a model_name it goes through the "explainer" route (SmolLM3, then the fallbacks)
+    def call_model(self, prompt, model_name = None,  temperature=0.5, top_p = 0.5, stream = False): 
+        def ask(target):
+            completion = target.client.chat.completions.create(
+            model=target.model,
+            messages=[
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            temperature= temperature,
+            top_p= top_p,
+            stream=stream, # send wonce finished
+            )
+            # generator of text chunks with <think> blocks removed
+            return completion_chunks(completion) if stream else completion
+
+        if model_name is None:
+            completion = routing.call("explainer", ask, stream=stream)
+        else:
+            completion = ask(routing.Target(f"hf:{model_name}"))
+        if stream:
+            return completion
         raw_output = completion.choices[0].message.content
         return raw_output
         
-    def explain(self, query:str): 
+    # on_token is called with each chunk of the answer as it is generated
+    def explain(self, query:str, on_token=None): 
+        on_token = on_token or (lambda token: None)
+        key = normalize_query(query)
+        try:
+            embedding = embed(key)
+        except Exception as e:
+            # no local embedder: exact-key cache hits only, and the store retrieves without the embedding
+            logger.warning("query embedding failed, answering without it: %r", e)
+            embedding = None
+        answer = self.answers.lookup(key, embedding)
+        telemetry.cache_event("rag_answers", answer is not None)
+        if answer is None:
+            answer = self.generate_explanation(query, on_token, embedding)
+            self.answers.put(key, answer, embedding)
+        else:
+            on_token(answer["content"])
+        citation = f"\n\n:blue-background[The answer was driven from :violet[{answer['book']}]]"
+        on_token(citation)
+        return answer["content"] + citation
+
+    # retrieval + generation, returns {"content", "book"}
+    def generate_explanation(self, query:str, on_token=None, embedding=None):
 
         def gen_prompt(reterival : str, query: str):
             
@@ -49,29 +99,71 @@ class Rag:
             return prompt
         
         # retreving context
-        reterival = self.K_db.query(
-        query_texts = [query],
-        n_results = 1 
+        # the cloud collection embeds the question itself, the local indexes reuse the (cached) query embedding
+        documents, metadatas = self.K_db.query(
+        query, embedding,
+        n_results = self.top_k
         )
-        book = reterival["metadatas"][0][0]["file_name"]
-        #print(''.join(reterival["documents"][0]), "\n")
-        reterival = ''.join(reterival["documents"][0])
+        # best sentences of the top_k chunks within the token budget, see Agents/rag_context.py
+        if self.compress:
+            with telemetry.span("rag", "context") as span:
+                context = build_context(query, documents, metadatas, self.context_tokens)
+                span.update(tokens_before=context["tokens_before"], tokens_after=context["tokens_after"], kept=context["kept"])
+        else:
+            raw_tokens = telemetry.estimate_tokens(''.join(documents))
+            context = {"text": ''.join(documents), "book": (metadatas[0] or {}).get("file_name") or UNKNOWN_BOOK if metadatas else UNKNOWN_BOOK,
+                       "tokens_before": raw_tokens, "tokens_after": raw_tokens}
+        book = context["book"]
+        reterival = context["text"]
         prompt =  gen_prompt(reterival, query)
         messages = [
         {"role": "user", "content": prompt},
         ]
 
 
-        completion = self.client.chat.completions.create(
-            # model="zai-org/GLM-4.6:novita",
-            model = "HuggingFaceTB/SmolLM3-3B",
-            messages=messages)
-        
-        # completion.choices[0].message
-        content = completion.choices[0].message.content 
-        if "<think>" in content:
-            content = re.sub(r"<think>.*?</think>", "", content, flags=re.DOTALL).strip()
-        return  (content+
-                f"\n\n:blue-background[The answer was driven from :violet[{book}]]")
+        prompt_tokens = telemetry.estimate_tokens(prompt)
+        start = time.perf_counter()
+        first_token = None
+        with telemetry.span("provider", "explainer", prompt_tokens=prompt_tokens) as span:
+            # SmolLM3 first, the other models when it fails or doesn't start answering in time
+            # <think> blocks are dropped while streaming
+            tokens = routing.call("explainer", lambda target: completion_chunks(target.client.chat.completions.create(
+                # model="zai-org/GLM-4.6:novita",
+                model = target.model,
+                messages=messages,
+                stream=True)), stream=True)
+            content = ''
+            for token in tokens:
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                content += token
+                if on_token:
+                    on_token(token)
+            span["completion_tokens"] = telemetry.estimate_tokens(content)
+        with self._lock:
+            c = self.counters
+            c["explanations"] += 1
+            c["tokens_before"] += context["tokens_before"]
+            c["tokens_after"] += context["tokens_after"]
+            c["prompt_tokens"] += prompt_tokens
+            c["generation_seconds"] += time.perf_counter() - start
+            c["first_token_seconds"] += first_token or 0.0
+        return {"content": content.strip(), "book": book}
+
+    def stats(self):
+        """Average context tokens before / after compression, prompt tokens and generation latency per explanation."""
+        with self._lock:
+            c = dict(self.counters)
+        n = c["explanations"]
+        out = {"explanations": n, "compress": self.compress, "top_k": self.top_k, "context_tokens": self.context_tokens}
+        if n:
+            out.update({
+                "avg_context_tokens_before": round(c["tokens_before"] / n, 1),
+                "avg_context_tokens_after": round(c["tokens_after"] / n, 1),
+                "avg_prompt_tokens": round(c["prompt_tokens"] / n, 1),
+                "avg_generation_ms": round(c["generation_seconds"] / n * 1000, 1),
+                "avg_first_token_ms": round(c["first_token_seconds"] / n * 1000, 1),
+            })
+        return out
 
 
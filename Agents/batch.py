@@ -0,0 +1,237 @@
+"""
+Headless batch runs of the agent graph over a JSONL dataset.
+
+    python -m Agents.batch inputs.jsonl results.jsonl --concurrency 16 --limit groq=30/min --limit tavily=2/s
+
+Each input line is {"text": ...} with optional "id" (default: the line number),
+"conversation" (turns of the same conversation run in order, on one thread) and
+"expected_language" / "expected_intent". Conversations run concurrently, at most
+`--concurrency` at a time, and `--limit provider=rate` rate limits a provider
+(`Agents/ratelimit.py`, batch requests queue behind the interactive ones). Every turn is appended to the output as soon as it is
+done, with the routing decision (language, intent, classified_by), the answer,
+per-node and per-provider timings and the error, if any. Re-running with the same
+output file resumes: conversations whose turns are all recorded are skipped
+(`--retry-errors` runs failed turns again, the last line per id wins).
+
+From Python: `run_batch(rows, "results.jsonl", concurrency=16)`.
+"""
+import argparse
+import ast
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from Agents import ratelimit, routing, telemetry
+from Agents.settings import setting
+
+logger = logging.getLogger(__name__)
+
+PAGE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pages", "mainpage.py")
+
+
+def page_system_prompt() -> str:
+    """The chat page's system prompt (`sys_prompt` in pages/mainpage.py), without importing the page."""
+    with open(PAGE, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(getattr(t, "id", None) == "sys_prompt" for t in node.targets):
+            return ast.literal_eval(node.value)
+    raise ValueError("sys_prompt not found in pages/mainpage.py")
+
+
+def read_rows(path):
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if line.strip():
+                row = json.loads(line)
+                row["id"] = str(row.get("id", line_no))
+                row["text"] = row.get("text") or row.get("user_input")
+                rows.append(row)
+    return rows
+
+
+def read_done(path, retry_errors=False):
+    """Ids already in the output file (without the failed ones when `retry_errors`)."""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue  # half-written last line of an interrupted run
+            done[str(row["id"])] = row
+    return {i: row for i, row in done.items() if not (retry_errors and row.get("error"))}
+
+
+def turn_record(row, state, spans, seconds, error):
+    nodes = defaultdict(float)
+    calls = []
+    for s in spans:
+        if s["kind"] == "node":
+            nodes[s["name"]] += s["ms"]
+        elif s["kind"] in ("provider", "attempt"):
+            calls.append({"kind": s["kind"], "name": s["name"], "ms": s["ms"], **({"error": s["error"]} if s.get("error") else {})})
+    state = state or {}
+    record = {
+        "id": row["id"],
+        "conversation": row.get("conversation"),
+        "text": row["text"],
+        "language": state.get("language"),
+        "intent": state.get("intent"),
+        "classified_by": state.get("classified_by"),
+        "classifier_confidence": state.get("classifier_confidence"),
+        "translated_input": state.get("translated_input"),
+        "final_output": state.get("final_output"),
+        "seconds": round(seconds, 3),
+        "nodes": {name: round(ms, 1) for name, ms in nodes.items()},
+        "calls": calls,
+        "error": error,
+    }
+    for key in ("language", "intent"):
+        if row.get(f"expected_{key}"):
+            record[f"expected_{key}"] = row[f"expected_{key}"]
+            record[f"{key}_ok"] = record[key] == row[f"expected_{key}"]
+    return record
+
+
+class BatchRunner:
+
+    def __init__(self, graph, out_path, system_prompt, done=None):
+        self.graph = graph
+        self.out_path = out_path
+        self.system_prompt = system_prompt
+        self.done = done or {}
+        self.records = []
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        with self._lock:
+            with open(self.out_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.records.append(record)
+
+    def run_conversation(self, name, rows):
+        # one thread per conversation so later turns see the earlier ones
+        config = {"configurable": {"thread_id": f"batch-{name}"}}
+        with ratelimit.scheduling("batch", session=f"batch-{name}"):
+            self._run_turns(rows, config)
+
+    def _run_turns(self, rows, config):
+        for i, row in enumerate(rows):
+            state = {"user_input": row["text"],
+                     "messages": [{"role": "system", "content": self.system_prompt}] if i == 0 else []}
+            start = time.perf_counter()
+            result, error = None, None
+            with telemetry.turn() as spans:
+                try:
+                    result = self.graph.invoke(state, config=config)
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                    logger.warning("batch turn %s failed: %s", row["id"], error)
+            if row["id"] not in self.done:
+                self.write(turn_record(row, result, spans, time.perf_counter() - start, error))
+
+
+def summarize(records, seconds):
+    ok = [r for r in records if not r["error"]]
+    durations = sorted(r["seconds"] for r in ok)
+    pick = lambda q: durations[min(len(durations) - 1, int(q * len(durations)))] if durations else None
+    summary = {
+        "turns": len(records),
+        "failed": len(records) - len(ok),
+        "seconds": round(seconds, 2),
+        "turns_per_second": round(len(records) / seconds, 2) if seconds else 0.0,
+        "p50_seconds": pick(0.5),
+        "p95_seconds": pick(0.95),
+        "rate_limits": ratelimit.stats(),
+        "routing": routing.router.stats(),
+    }
+    intents = defaultdict(int)
+    for r in ok:
+        intents[r["intent"]] += 1
+    summary["intents"] = dict(sorted(intents.items(), key=lambda kv: str(kv[0])))
+    for key in ("language", "intent"):
+        checked = [r for r in ok if f"{key}_ok" in r]
+        if checked:
+            summary[f"{key}_accuracy"] = round(sum(r[f"{key}_ok"] for r in checked) / len(checked), 3)
+    return summary
+
+
+def run_batch(rows, out_path, concurrency: int = 8, mode: str = None, limits=None, retry_errors: bool = False,
+              system_prompt: str = None):
+    """Run the rows through the graph, appending results to `out_path`; returns a summary of this run."""
+    from Agents.checkpoint import BoundedMemorySaver
+    from Agents.graph import build_graph
+
+    for name, rate in (limits or {}).items():
+        ratelimit.limit_provider(name, rate)
+    done = read_done(out_path, retry_errors)
+    conversations = OrderedDict()
+    for row in rows:
+        row["id"] = str(row["id"])
+        conversations.setdefault(str(row.get("conversation") or row["id"]), []).append(row)
+    todo = {name: turns for name, turns in conversations.items() if any(r["id"] not in done for r in turns)}
+    logger.info("batch: %d conversations, %d already done", len(conversations), len(conversations) - len(todo))
+
+    graph = build_graph(mode, checkpointer=BoundedMemorySaver(keep_last=1, max_threads=max(200, concurrency * 4)))
+    runner = BatchRunner(graph, out_path, system_prompt or page_system_prompt(), done)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as pool:
+        for future in [pool.submit(runner.run_conversation, name, turns) for name, turns in todo.items()]:
+            future.result()
+    summary = summarize(runner.records, time.perf_counter() - start)
+    summary["skipped_conversations"] = len(conversations) - len(todo)
+    return summary
+
+
+def parse_limits(values):
+    limits = {}
+    for value in values:
+        for item in value.split(","):
+            if item.strip():
+                name, _, rate = item.partition("=")
+                ratelimit.parse_rate(rate)  # fail early on a bad rate
+                limits[name.strip()] = rate.strip()
+    return limits
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="run the agent graph over a JSONL file of user inputs")
+    parser.add_argument("input", help="JSONL with {\"text\", \"id\"?, \"conversation\"?, \"expected_intent\"?, \"expected_language\"?}")
+    parser.add_argument("output", help="JSONL results, appended to (resumes an interrupted run)")
+    parser.add_argument("--concurrency", type=int, default=setting("batch", "concurrency", 8))
+    parser.add_argument("--mode", default=None, help="graph mode (sequential, parallel)")
+    parser.add_argument("--limit", action="append", default=[setting("batch", "limits", "")],
+                        help="provider=rate, e.g. groq=30/min (repeatable)")
+    parser.add_argument("--retry-errors", action="store_true", help="run turns that failed last time again")
+    parser.add_argument("--hedge", action="store_true", help="keep hedged requests (off by default, they only spend the rate limits)")
+    parser.add_argument("--system-prompt", default=None, help="file with the chat system prompt (default: the chat page's)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+    logging.getLogger(__name__).setLevel(logging.INFO)
+    if not args.hedge:
+        for role in routing.DEFAULT_TARGETS:
+            os.environ.setdefault(f"AGENTS_ROUTING_{role.upper()}_MAX_HEDGES", "0")
+    system_prompt = None
+    if args.system_prompt:
+        with open(args.system_prompt, encoding="utf-8") as f:
+            system_prompt = f.read()
+
+    summary = run_batch(read_rows(args.input), args.output, concurrency=args.concurrency, mode=args.mode,
+                        limits=parse_limits(args.limit), retry_errors=args.retry_errors, system_prompt=system_prompt)
+    json.dump(summary, sys.stdout, indent=2, ensure_ascii=False, default=str)
+    print()
+    return summary
+
+
+if __name__ == "__main__":
+    main()
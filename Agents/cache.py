@@ -0,0 +1,234 @@
+"""
+Small in-process caches shared by the agents.
+
+`LRUCache` is a bounded LRU with optional TTL that persists itself as JSON under
+the cache dir (`[agents.cache] dir`, default `.cache/`), so entries survive
+restarts. `SemanticCache` adds near-duplicate lookups over stored embeddings.
+`SingleFlight` lets concurrent misses for the same key share one upstream call.
+"""
+import atexit
+import json
+import logging
+import os
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+
+from Agents.settings import setting
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text: str) -> str:
+    """Lowercase, drop punctuation (but keep apostrophes) and collapse whitespace."""
+    text = re.sub(r"[^\w\s']", " ", text.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+_instances = weakref.WeakSet()  # every LRUCache, for the memory report
+
+
+def instances():
+    return list(_instances)
+
+
+def cache_path(name: str) -> str:
+    cache_dir = setting("cache", "dir", ".cache")
+    os.makedirs(cache_dir, exist_ok=True)
+    return os.path.join(cache_dir, f"{name}.json")
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with optional TTL and JSON persistence.
+
+    Values must be JSON serializable. Writes to disk are throttled to at most one
+    every `save_interval` seconds, plus a final save at interpreter exit.
+    """
+
+    def __init__(self, name: str, max_size: int = 1000, ttl: float = None, persist: bool = True, save_interval: float = 30):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = cache_path(name) if persist else None
+        self.save_interval = save_interval
+        self._data = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self.hits = self.misses = self.evictions = 0
+        _instances.add(self)
+        if self.path:
+            self.load()
+            atexit.register(self.save)
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl is not None and time.time() - stored_at > self.ttl
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or self._expired(item[0]):
+                if item is not None:
+                    del self._data[key]
+                    self._dirty = True
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.time(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+            self._dirty = True
+        self._maybe_save()
+
+    def items(self):
+        """Live (not expired) entries, least recently used first."""
+        with self._lock:
+            return [(k, v) for k, (t, v) in self._data.items() if not self._expired(t)]
+
+    def __len__(self):
+        return len(self._data)
+
+    def _maybe_save(self):
+        if self.path and time.monotonic() - self._last_save >= self.save_interval:
+            self.save()
+
+    def save(self):
+        if not self.path or not self._dirty:
+            return
+        with self._lock:
+            payload = [[k, t, v] for k, (t, v) in self._data.items() if not self._expired(t)]
+            self._dirty = False
+            self._last_save = time.monotonic()
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning("could not save cache %s: %s", self.name, e)
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return
+        with self._lock:
+            for key, stored_at, value in payload[-self.max_size:]:
+                if not self._expired(stored_at):
+                    self._data[key] = (stored_at, value)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+class SemanticCache(LRUCache):
+    """
+    LRU cache keyed on a normalized query plus its embedding.
+
+    `lookup` first tries the exact normalized key, then returns the value of the
+    most similar stored query if its cosine similarity reaches `threshold`.
+    """
+
+    def __init__(self, name: str, threshold: float = 0.92, **kwargs):
+        self.threshold = threshold
+        self._matrix = None  # (keys, normalized embeddings) rebuilt lazily
+        super().__init__(name, **kwargs)
+
+    def put(self, key, value, embedding=None):
+        self._matrix = None
+        super().put(key, {"embedding": None if embedding is None else [float(x) for x in embedding], "value": value})
+
+    def _index(self):
+        if self._matrix is None:
+            rows = [(k, v["embedding"]) for k, v in self.items() if v["embedding"] is not None]
+            if not rows:
+                self._matrix = ([], None)
+            else:
+                vectors = np.asarray([e for _, e in rows], dtype=np.float32)
+                vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+                self._matrix = ([k for k, _ in rows], vectors)
+        return self._matrix
+
+    def lookup(self, key, embedding=None):
+        entry = self.get(key)
+        if entry is not None:
+            return entry["value"]
+        if embedding is None:
+            return None
+        with self._lock:
+            keys, vectors = self._index()
+            if vectors is None:
+                return None
+            query = np.asarray(embedding, dtype=np.float32)
+            scores = vectors @ (query / (np.linalg.norm(query) + 1e-12))
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            entry = self.get(keys[best])
+            if entry is None:  # expired since the index was built
+                self._matrix = None
+                return None
+            # the exact-key miss above is really a hit
+            self.misses -= 1
+            return entry["value"]
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls: while `fn` runs for a key, other `do(key, ...)` callers
+    wait for its result (or exception) instead of calling `fn` again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}  # key -> Future
+        self.calls = self.shared = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self.calls += 1
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls, "shared": self.shared, "inflight": len(self._inflight)}
@@ -0,0 +1,172 @@
+"""
+Checkpointers for the LangGraph agent.
+
+`[agents.checkpoint] backend` selects:
+  - "memory" (default): `BoundedMemorySaver`, an `InMemorySaver` that keeps only the
+    latest `keep_last` checkpoints per thread and evicts threads idle for more than
+    `idle_minutes` (or the least recently used ones above `max_threads`).
+  - "sqlite": `BoundedSqliteSaver`, a `SqliteSaver` on a local WAL-mode database
+    (`path`) that prunes every thread to its latest `keep_last` checkpoints. Nothing
+    stays resident, threads are read back from disk when a chat is opened.
+
+Evicted threads are rehydrated from the chat's `chat_bot_hist` in Firestore by the chat page.
+`resident_size()` reports how much each checkpointer holds, `thread_sizes()` the bytes per thread.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+from Agents.settings import setting
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedMemorySaver(InMemorySaver):
+
+    def __init__(self, keep_last: int = 2, idle_seconds: float = 1800, max_threads: int = 200, **kwargs):
+        super().__init__(**kwargs)
+        self.keep_last = keep_last
+        self.idle_seconds = idle_seconds
+        self.max_threads = max_threads
+        self.last_used = {}  # thread_id -> monotonic time
+        self.evicted = 0
+        self._lock = threading.RLock()
+
+    def _touch(self, config):
+        self.last_used[config["configurable"]["thread_id"]] = time.monotonic()
+
+    def get_tuple(self, config):
+        with self._lock:
+            if config["configurable"]["thread_id"] in self.storage:
+                self._touch(config)
+            return super().get_tuple(config)
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        with self._lock:
+            return super().put_writes(config, writes, task_id, task_path)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        with self._lock:
+            saved = super().put(config, checkpoint, metadata, new_versions)
+            self._touch(config)
+            self._prune(config["configurable"]["thread_id"], config["configurable"]["checkpoint_ns"])
+            self._evict_idle(keep=config["configurable"]["thread_id"])
+            return saved
+
+    def delete_thread(self, thread_id):
+        with self._lock:
+            super().delete_thread(thread_id)
+            self.last_used.pop(thread_id, None)
+
+    def _prune(self, thread_id, checkpoint_ns):
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.keep_last:
+            return
+        # checkpoint ids are time ordered
+        ordered = sorted(checkpoints)
+        for checkpoint_id in ordered[:-self.keep_last]:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+        # drop channel values no remaining checkpoint points at
+        referenced = set()
+        for saved, _, _ in checkpoints.values():
+            for channel, version in self.serde.loads_typed(saved)["channel_versions"].items():
+                referenced.add((channel, version))
+        for key in [k for k in self.blobs if k[0] == thread_id and k[1] == checkpoint_ns]:
+            if (key[2], key[3]) not in referenced:
+                del self.blobs[key]
+
+    def _evict_idle(self, keep):
+        now = time.monotonic()
+        idle = [t for t, used in self.last_used.items() if t != keep and now - used > self.idle_seconds]
+        by_age = sorted((t for t in self.last_used if t != keep), key=self.last_used.get)
+        overflow = by_age[:max(0, len(self.last_used) - self.max_threads)]
+        for thread_id in set(idle) | set(overflow):
+            self.delete_thread(thread_id)
+            self.evicted += 1
+
+    def resident_size(self):
+        with self._lock:
+            checkpoints = sum(len(ns) for thread in self.storage.values() for ns in thread.values())
+            size = sum(len(c[1]) + len(m[1]) for thread in self.storage.values() for ns in thread.values() for c, m, _ in ns.values())
+            size += sum(len(blob[1]) for blob in self.blobs.values())
+            size += sum(len(w[2][1]) if isinstance(w[2], tuple) else 0 for writes in self.writes.values() for w in writes.values())
+            return {"backend": "memory", "threads": len(self.storage), "checkpoints": checkpoints,
+                    "resident_bytes": size, "evicted_threads": self.evicted}
+
+    def thread_sizes(self):
+        """{thread_id: serialized bytes of its checkpoints, channel values and pending writes}"""
+        with self._lock:
+            sizes = {}
+            for thread_id, thread in self.storage.items():
+                sizes[thread_id] = sum(len(c[1]) + len(m[1]) for ns in thread.values() for c, m, _ in ns.values())
+            for key, blob in self.blobs.items():
+                if key[0] in sizes:
+                    sizes[key[0]] += len(blob[1])
+            for key, writes in self.writes.items():
+                if key[0] in sizes:
+                    sizes[key[0]] += sum(len(w[2][1]) if isinstance(w[2], tuple) else 0 for w in writes.values())
+            return sizes
+
+
+def _sqlite_saver_class():
+    from langgraph.checkpoint.sqlite import SqliteSaver
+
+    class BoundedSqliteSaver(SqliteSaver):
+
+        def __init__(self, conn, keep_last: int = 2, **kwargs):
+            super().__init__(conn, **kwargs)
+            self.keep_last = keep_last
+            self.path = None
+
+        def put(self, config, checkpoint, metadata, new_versions):
+            saved = super().put(config, checkpoint, metadata, new_versions)
+            thread_id = config["configurable"]["thread_id"]
+            checkpoint_ns = config["configurable"]["checkpoint_ns"]
+            with self.cursor() as cur:
+                cur.execute(
+                    """SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?
+                       ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?""",
+                    (thread_id, checkpoint_ns, self.keep_last),
+                )
+                old = [(thread_id, checkpoint_ns, row[0]) for row in cur.fetchall()]
+                if old:
+                    cur.executemany("DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?", old)
+                    cur.executemany("DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?", old)
+            return saved
+
+        def resident_size(self):
+            with self.cursor(transaction=False) as cur:
+                cur.execute("SELECT COUNT(DISTINCT thread_id), COUNT(*) FROM checkpoints")
+                threads, checkpoints = cur.fetchone()
+            size = os.path.getsize(self.path) if self.path and os.path.exists(self.path) else 0
+            wal = self.path + "-wal" if self.path else None
+            return {"backend": "sqlite", "threads": threads, "checkpoints": checkpoints,
+                    "resident_bytes": 0, "disk_bytes": size + (os.path.getsize(wal) if wal and os.path.exists(wal) else 0)}
+
+    return BoundedSqliteSaver
+
+
+def make_checkpointer():
+    backend = setting("checkpoint", "backend", "memory")
+    keep_last = setting("checkpoint", "keep_last", 2)
+    if backend == "sqlite":
+        path = setting("checkpoint", "path", ".cache/checkpoints.sqlite")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        saver = _sqlite_saver_class()(conn, keep_last=keep_last)
+        saver.path = path
+    else:
+        saver = BoundedMemorySaver(
+            keep_last=keep_last,
+            idle_seconds=setting("checkpoint", "idle_minutes", 30) * 60,
+            max_threads=setting("checkpoint", "max_threads", 200),
+        )
+    logger.info("checkpointer: %s", backend)
+    return saver
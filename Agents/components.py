@@ -1,19 +1,23 @@
 from Agents.state import State
-from huggingface_hub import InferenceClient
 import re, json
-from tavily import TavilyClient
-from Agents.Rag import Rag
 import streamlit as st
 from langchain_core.tools import tool
-from langchain.chat_models import init_chat_model
-from groq import Groq
-from gradio_client import Client
+from Agents import fast_classifier
+from Agents import providers
+from Agents.settings import setting
+from Agents.streaming import emit, completion_chunks, message_text
+from langchain_core.messages import AIMessage, HumanMessage, message_chunk_to_message
+from Agents import context
+import logging
+from Agents import telemetry
+from Agents import speculation
+from Agents import routing
+from Agents import ratelimit
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-Hf_token = st.secrets["HF_token"]
-travily_token = st.secrets["Travily_token"]
-gemini_key = st.secrets["Gemini_key"]
-groq_api_key = st.secrets["Groq_api_key"]
-GC_mdl = Client("Hager-Mohamed/Gemma_Grammar_Correction")
+logger = logging.getLogger(__name__)
 
 @tool
 def get_grammar_correction(statment: str) -> str:
@@ -30,36 +34,51 @@ def get_grammar_correction(statment: str) -> str:
     Usage:
         The LLM should call this tool when it detects the user’s input
         contains grammar mistakes or could be phrased more naturally.
-        The tool returns ONLY the corrected sentence with no extra text.
+        The tool returns ONLY the corrected sentence with no extra text,
+        or a message starting with NO_CORRECTION when the checker is unavailable:
+        then do not suggest a correction and just continue the conversation.
     """
-    raw_output = GC_mdl.predict(statment, api_name="/correct")
-    res = re.sub(r"Corrected:", "", raw_output, flags=re.DOTALL).strip()
-    return res
+    # cached, split per sentence and bounded by a deadline (Agents/grammar_correction.py)
+    return providers.get("grammar").correct(statment)
 
 tools = [get_grammar_correction]
-llm = init_chat_model("google_genai:gemini-2.0-flash", api_key = gemini_key)
-llm_with_tools = llm.bind_tools(tools, enforce_tool_use=False)
-groq_client = Groq(api_key=groq_api_key)
-
-grammer_explain = Rag()
-client = InferenceClient(
-    api_key=Hf_token,
-)
-
-# call the model
-def call_model(prompt, model_name = "HuggingFaceTB/SmolLM3-3B",  temperature=0.5, top_p = 0.5, stream = False): 
-    completion = client.chat.completions.create(
-    model=model_name,
-    messages=[
-        {
-            "role": "user",
-            "content": prompt
-        }
-    ],
-    temperature= temperature,
-    top_p= top_p,
-    stream=stream, # send wonce finished
-    )
+# provider clients are created lazily on first use and shared by every session (Agents/providers.py)
+providers.register("chat_llm", lambda: providers.get("gemini").bind_tools(tools, enforce_tool_use=False))
+
+def _chat_fallback():
+    # used by the "chat" route when gemini fails or is too slow (Agents/routing.py)
+    from langchain.chat_models import init_chat_model
+    model = init_chat_model(setting("routing", "chat_fallback_model", "groq:llama-3.3-70b-versatile"), api_key=st.secrets["Groq_api_key"])
+    return model.bind_tools(tools)
+
+providers.register("chat_fallback", _chat_fallback)
+# process-wide quotas from [agents.ratelimit], shared by every session (Agents/ratelimit.py)
+ratelimit.configure()
+
+# call the model, without a model_name it goes through the "explainer" route (SmolLM3, then the fallbacks)
+def call_model(prompt, model_name = None,  temperature=0.5, top_p = 0.5, stream = False): 
+    def ask(target):
+        completion = target.client.chat.completions.create(
+        model=target.model,
+        messages=[
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        temperature= temperature,
+        top_p= top_p,
+        stream=stream, # send wonce finished
+        )
+        # generator of text chunks with <think> blocks removed
+        return completion_chunks(completion) if stream else completion
+
+    if model_name is None:
+        completion = routing.call("explainer", ask, stream=stream)
+    else:
+        completion = ask(routing.Target(f"hf:{model_name}"))
+    if stream:
+        return completion
     raw_output = completion.choices[0].message.content
     if "<think>" in raw_output:
         return re.sub(r"<think>.*?</think>", "", raw_output, flags=re.DOTALL).strip()
@@ -67,6 +86,23 @@ def call_model(prompt, model_name = "HuggingFaceTB/SmolLM3-3B",  temperature=0.5
 
 
 
+# local fast path for the classifier, falls back to classify_input (groq) when unsure
+def fast_classify(state: State) -> State:
+    guess = fast_classifier.classify(state['user_input'])
+    state["language"], state["intent"] = guess["language"], guess["intent"]
+    state["classifier_confidence"] = guess["confidence"]
+    confident = guess["confidence"] >= setting("classifier", "confidence_threshold", 0.6)
+    state["classified_by"] = "local" if confident else None
+    fast_classifier.stats.record(fallback=not confident)
+    logger.info("fast classifier: %s (confidence %.2f) %s", guess, guess["confidence"], fast_classifier.stats.as_dict())
+    if confident and state["language"] == "arabic":
+        state['status_message'] = "🌐 Translator agent working..."
+    return state
+
+
+LANGUAGES = ("english", "arabic")
+INTENTS = ("chat", "grammar_question", "fact_question")
+
 # language classifier and intent: 
 def classify_input(state:State) -> State:
 
@@ -101,44 +137,103 @@ def classify_input(state:State) -> State:
         User input: "{state['user_input']}"
         """
 
-    chat_completion = groq_client.chat.completions.create(
-        messages=[
+    # groq first, other models on failure / when groq is slow (Agents/routing.py)
+    def ask(target):
+        with telemetry.span("provider", f"{target.provider}.classify", model=target.model) as span:
+            chat_completion = target.client.chat.completions.create(
+                messages=[
+
+                    {
+                        "role": "user",
+                        "content": prompt,
+                    }
+                ],
+                temperature= 0.3,
+                top_p= 0.7,
+                stream= False,
+                model=target.model)
+            usage = getattr(chat_completion, "usage", None)
+            span["prompt_tokens"] = getattr(usage, "prompt_tokens", None) or telemetry.estimate_tokens(prompt)
+            span["completion_tokens"] = getattr(usage, "completion_tokens", None)
+        return chat_completion
 
-            {
-                "role": "user",
-                "content": prompt,
-            }
-        ],
-        temperature= 0.3,
-        top_p= 0.7,
-        stream= False,
-        model="qwen/qwen3-32b")
-    content = chat_completion.choices[0].message.content    
-    if "<think>" in content:
-        content = re.sub(r"<think>.*?</think>", "", content, flags=re.DOTALL).strip()
     try:
+        chat_completion = routing.call("classifier", ask)
+        content = chat_completion.choices[0].message.content
+        if "<think>" in content:
+            content = re.sub(r"<think>.*?</think>", "", content, flags=re.DOTALL).strip()
         res = json.loads(content)
+        if res["language"] not in LANGUAGES or res["intent"] not in INTENTS:
+            raise ValueError(f"unexpected classification: {res}")
         state["intent"], state["language"] = res["intent"], res["language"]
-        if state["language"] == "arabic" : state['status_message'] = "🌐 Translator agent working..."
-        
-    except : 
-        print("error ecured")
-    
+        state["classified_by"] = "groq"
+    except Exception as e:
+        # keep the fast classifier's guess (or make one) so routing still works
+        logger.warning("classifier failed, using the local guess: %r", e)
+        if state.get("language") not in LANGUAGES or state.get("intent") not in INTENTS:
+            guess = fast_classifier.classify(state['user_input'])
+            state["language"], state["intent"] = guess["language"], guess["intent"]
+        state["classified_by"] = "local"
+    if state["language"] == "arabic" : state['status_message'] = "🌐 Translator agent working..."
+
+    return state
+
+
+# parallel mode: classifier, translation and a speculative chat answer at the same time
+_fan_out = ThreadPoolExecutor(max_workers=setting("graph", "fan_out_workers", 32), thread_name_prefix="fan-out")
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    return fn(*args), time.perf_counter() - start
+
+def _submit(fn, *args):
+    # workers report their telemetry spans to the caller's turn
+    return _fan_out.submit(contextvars.copy_context().run, _timed, fn, *args)
+
+def parallel_classify(state: State) -> State:
+    guess_language, guess_intent = state['language'], state['intent']
+    classified = _submit(classify_input, dict(state))
+    # the script is a reliable language signal, so arabic input is translated while the classifier runs
+    translation = _submit(providers.get("translator").translate, state['user_input']) if guess_language == "arabic" else None
+    spec = None
+    if setting("graph", "speculate", True) and guess_intent == "chat":
+        spec = speculation.Speculation(state.get("summarized_upto") or 0)
+        speculation.register(spec)
+
+        def build_messages():
+            query = translation.result()[0] if translation is not None else state['user_input']
+            return context.build_context({**state, "messages": state['messages'] + [HumanMessage(content=query)]})
+
+        _fan_out.submit(contextvars.copy_context().run, spec.run, build_messages)
+
+    result, classify_seconds = classified.result()
+    state["language"], state["intent"], state["classified_by"] = result["language"], result["intent"], result["classified_by"]
+    speculation.stats.add(parallel_turns=1)
+
+    if translation is not None:
+        if state["language"] == "arabic":
+            state['translated_input'], translate_seconds = translation.result()
+            # sequentially the two calls would have added up
+            speculation.stats.add(parallel_translations=1, saved_seconds=min(classify_seconds, translate_seconds))
+        else:
+            speculation.stats.add(wasted_translations=1)
+            translation.add_done_callback(lambda f: None if f.exception() else speculation.stats.add(wasted_seconds=f.result()[1]))
+
+    if spec is not None:
+        if state["intent"] != "chat":
+            speculation.discard(spec, "cancelled")
+        elif state["language"] != guess_language:
+            # the answer was generated for the wrong text (translated or not)
+            speculation.discard(spec, "discarded")
+        else:
+            state['speculation_id'] = spec.id
     return state
 
 
 # translator agent :
 def translator(state : State) -> State: 
-    client = InferenceClient(
-        provider="hf-inference",
-        api_key=Hf_token,
-    )
-
-    result = client.translation(
-    state['user_input'],
-    model="Helsinki-NLP/opus-mt-ar-en",
-    )
-    state['translated_input'] = result.translation_text
+    # translation memory first, then the local / remote opus-mt-ar-en model (Agents/translation.py)
+    state['translated_input'] = providers.get("translator").translate(state['user_input'])
     state["status_message"] = "🔍 Classifying your input..."
 
     return state
@@ -146,31 +241,61 @@ def translator(state : State) -> State:
 
 # fact search
 def fact_search(state: State) -> State: 
-    tavily_client = TavilyClient(api_key=travily_token)
     query = state['user_input'] if state['language'] == 'english' else state['translated_input']
-    response = tavily_client.search(query=query,
-                                    max_results = 1)["results"][0]
-    content, url  = response["content"], response["url"] 
-    state['fact_answer'] = f"""
-        \n{content}\nFor more info visit {url}
-    """
+    # cached per query with a ttl, concurrent identical questions share one search (Agents/facts.py)
+    state['fact_answer'] = providers.get("facts").answer(query)
+    emit("fact_search", state['fact_answer'])
     
     return state
 
 # grammar_explanation
 def grammar_explanation_Rag(state: State) -> State: 
     query = state['user_input'] if state['language'] == 'english' else state['translated_input']
-    state['grammar_explanation'] = grammer_explain.explain(query)
+    state['grammar_explanation'] = providers.get("rag").explain(query, on_token=lambda t: emit("grammar_explanation", t))
     return state
  
 
 
 
+# adds the user message and folds turns that no longer fit the token budget into the summary
+def chat_context(state: State) -> State:
+    query = state['user_input'] if state['language'] == 'english' else state['translated_input']
+    state['messages'] = state['messages'] + [HumanMessage(content=query)]
+    state['context_stats'] = context.update_summary(state)
+    state['messages'] = state['messages'][-1:]  # only the new message goes through add_messages
+    return state
+
+
 def chat(state: State)-> State:
     
-    query = state['user_input'] if state['language'] == 'english' else state['translated_input']
-    state['messages'].append({"role": "user","content": query})
-    state['messages'] = [llm_with_tools.invoke(state["messages"])]
+    # parallel mode: the answer may already be (partly) generated
+    spec = speculation.take(state)
+    state['speculation_id'] = None
+    if spec is not None:
+        emit("chat", reset=True)
+        try:
+            response = spec.stream(lambda token: emit("chat", token))
+            state['messages'] = [response or AIMessage(content="")]
+            state['chat_response'] = state["messages"][-1].content
+            return state
+        except Exception as e:
+            logger.warning("speculative chat answer failed, asking again: %r", e)
+
+    # system prompt + summary + the last turns within the token budget
+    messages = context.build_context(state)
+    # stream the reply token by token, the page restarts the text on every call (tool loops)
+    emit("chat", reset=True)
+    response = None
+    with telemetry.span("provider", "chat") as span:
+        # gemini, then the fallback model when it fails or doesn't start answering in time
+        stream = routing.call("chat", lambda target: target.client.stream(messages), stream=True)
+        for chunk in stream:
+            emit("chat", message_text(chunk))
+            response = chunk if response is None else response + chunk
+        usage = getattr(response, "usage_metadata", None) or {}
+        span["prompt_tokens"] = usage.get("input_tokens") or sum(context.count_tokens(m) for m in messages)
+        span["completion_tokens"] = usage.get("output_tokens") or (telemetry.estimate_tokens(message_text(response)) if response is not None else 0)
+    state['messages'] = [message_chunk_to_message(response) if response is not None else AIMessage(content="")]
     state['chat_response'] = state["messages"][-1].content
     return state
     
@@ -0,0 +1,135 @@
+"""
+Token-budgeted context window for the chat agent.
+
+The chat model gets the system prompt, a rolling summary of the older
+conversation and the last turns that fit in `[agents.context] token_budget`
+(at most `max_turns`). Turns that fall out of the window are folded into the
+summary once, incrementally, by a small Groq model.
+"""
+import logging
+import re
+
+from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
+
+from Agents import providers, telemetry
+from Agents.settings import setting
+
+logger = logging.getLogger(__name__)
+
+
+def message_text(message) -> str:
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return " ".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+
+
+def count_tokens(message) -> int:
+    # ~4 characters per token plus per-message overhead, close enough for budgeting
+    text = message if isinstance(message, str) else message_text(message)
+    extra = len(str(getattr(message, "tool_calls", "") or ""))
+    return (len(text) + extra) // 4 + 4
+
+
+def split_turns(messages):
+    """Group the non-system messages as [(index, message), ...] turns, each starting at a user message."""
+    turns = []
+    for i, m in enumerate(messages):
+        if isinstance(m, SystemMessage):
+            continue
+        if isinstance(m, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append((i, m))
+    return turns
+
+
+def window(messages, summary: str = None):
+    """
+    Return (system prompt, kept messages, index of the first kept message).
+    Whole turns are kept from the newest backwards, so tool calls stay with their results.
+    """
+    budget = setting("context", "token_budget", 2000)
+    max_turns = setting("context", "max_turns", 8)
+    systems = [m for m in messages if isinstance(m, SystemMessage)]
+    # the same system prompt may be stored once per turn, only the latest one is sent
+    system = systems[-1] if systems else None
+    used = (count_tokens(system) if system else 0) + (count_tokens(summary) if summary else 0)
+
+    kept = []
+    for turn in reversed(split_turns(messages)):
+        cost = sum(count_tokens(m) for _, m in turn)
+        # the current turn is always sent
+        if kept and (len(kept) >= max_turns or used + cost > budget):
+            break
+        kept.insert(0, turn)
+        used += cost
+    first = kept[0][0][0] if kept else len(messages)
+    return system, [m for turn in kept for _, m in turn], first
+
+
+def build_context(state):
+    """Messages to send to the chat model for the current state."""
+    system, kept, _ = window(state["messages"], state.get("summary"))
+    if system is None:
+        return kept
+    content = message_text(system)
+    if state.get("summary"):
+        content += f"\n\nSummary of the earlier conversation:\n{state['summary']}"
+    return [SystemMessage(content=content)] + kept
+
+
+def summarize(summary: str, messages) -> str:
+    lines = []
+    for m in messages:
+        if isinstance(m, SystemMessage) or isinstance(m, ToolMessage) or not message_text(m).strip():
+            continue
+        role = "Learner" if isinstance(m, HumanMessage) else "Partner"
+        lines.append(f"{role}: {message_text(m)}")
+    if not lines:
+        return summary
+    prompt = f"""Update the running summary of a conversation between an English learner and their conversation partner.
+Keep what matters for continuing the conversation: facts about the learner (name, interests, plans),
+topics discussed and recurring grammar mistakes. Answer with the updated summary only, at most 120 words.
+
+Current summary: {summary or "(empty)"}
+
+New messages:
+{chr(10).join(lines)}"""
+    with telemetry.span("provider", "groq.summary") as span:
+        completion = providers.get("groq").chat.completions.create(
+            messages=[{"role": "user", "content": prompt}],
+            model=setting("context", "summary_model", "llama-3.1-8b-instant"),
+            temperature=0.2,
+        )
+        usage = getattr(completion, "usage", None)
+        span["prompt_tokens"] = getattr(usage, "prompt_tokens", None) or telemetry.estimate_tokens(prompt)
+        span["completion_tokens"] = getattr(usage, "completion_tokens", None)
+    content = completion.choices[0].message.content
+    return re.sub(r"<think>.*?</think>", "", content, flags=re.DOTALL).strip()
+
+
+def update_summary(state):
+    """Fold the messages that left the window into the summary, returns the per-turn token report."""
+    messages = state["messages"]
+    summary = state.get("summary")
+    upto = state.get("summarized_upto") or 0
+    _, _, first = window(messages, summary)
+    if first > upto:
+        try:
+            summary = summarize(summary, messages[upto:first])
+            state["summary"], state["summarized_upto"] = summary, first
+        except Exception as e:
+            # keep the old summary, the evicted turns are folded on the next turn
+            logger.warning("context summary failed: %r", e)
+
+    # what the whole history would have cost
+    history_tokens = sum(count_tokens(m) for m in messages)
+    sent_tokens = sum(count_tokens(m) for m in build_context(state))
+    stats = {
+        "history_tokens": history_tokens,
+        "sent_tokens": sent_tokens,
+        "saved_tokens": max(0, history_tokens - sent_tokens),
+        "summarized_upto": state.get("summarized_upto") or 0,
+    }
+    logger.info("chat context: %s", stats)
+    return stats
@@ -0,0 +1,30 @@
+"""
+Local query embeddings (chroma's default embedder), with an in-process LRU so a
+repeated query is only embedded once.
+"""
+from Agents import providers, telemetry
+from Agents.cache import LRUCache
+from Agents.settings import setting
+
+_cache = None
+
+
+def get_embedder():
+    return providers.get("embedder")
+
+
+def get_cache() -> LRUCache:
+    global _cache
+    if _cache is None:
+        _cache = LRUCache("query_embeddings", max_size=setting("embeddings", "cache_size", 2000), persist=False)
+    return _cache
+
+
+def embed(text: str):
+    cache = get_cache()
+    vector = cache.get(text)
+    if vector is None:
+        with telemetry.span("provider", "embedder"):
+            vector = [float(x) for x in get_embedder()([text])[0]]
+        cache.put(text, vector)
+    return vector
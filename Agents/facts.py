@@ -0,0 +1,95 @@
+"""
+Web search answers for fact questions, cached and coalesced.
+
+`FactSearch.search` keys answers on the normalized (translated) query in a
+persistent LRU (`fact_answers`). Every entry carries its own expiry: questions
+about changing things ("today", "latest", "weather", ...) expire after
+`[agents.facts] fresh_ttl_minutes`, the rest after `ttl_hours`. Concurrent misses
+for the same query share one Tavily call (`SingleFlight`). One call returns up to
+`max_results` results (capped at `MAX_RESULTS`), trimmed to `max_chars` in total.
+A search without results is not cached and answers `NO_RESULTS`.
+"""
+import re
+import threading
+import time
+
+from Agents import providers, telemetry
+from Agents.cache import LRUCache, SingleFlight, normalize_query
+from Agents.settings import setting
+
+MAX_RESULTS = 5
+NO_RESULTS = "I couldn't find anything on the web about that, try asking it in other words."
+
+TIME_SENSITIVE = re.compile(
+    r"\b(today|tonight|now|current(ly)?|latest|recent(ly)?|this (week|month|year)|news|weather|price|score|live)\b"
+)
+
+
+class FactSearch:
+
+    def __init__(self):
+        self.max_results = max(1, min(setting("facts", "max_results", 1), MAX_RESULTS))
+        self.max_chars = setting("facts", "max_chars", 1500)
+        self.ttl = setting("facts", "ttl_hours", 24.0) * 3600
+        self.fresh_ttl = setting("facts", "fresh_ttl_minutes", 30.0) * 60
+        self.answers = LRUCache("fact_answers", max_size=setting("facts", "cache_size", 2000), ttl=self.ttl)
+        self.flight = SingleFlight()
+        self._lock = threading.Lock()
+        self.counters = {"requests": 0, "hits": 0, "searches": 0}
+
+    def entry_ttl(self, key: str) -> float:
+        return self.fresh_ttl if TIME_SENSITIVE.search(key) else self.ttl
+
+    def _lookup(self, key):
+        entry = self.answers.get(key)
+        if entry is not None and entry["expires"] < time.time():
+            entry = None
+        return entry
+
+    def _search(self, key, query):
+        # another caller may have stored it while this one waited for the flight
+        entry = self._lookup(key)
+        if entry is not None:
+            return entry["results"]
+        with telemetry.span("provider", "tavily.search", results=self.max_results):
+            response = providers.get("tavily").search(query=query, max_results=self.max_results)
+        with self._lock:
+            self.counters["searches"] += 1
+        results = [{"content": r["content"], "url": r["url"]} for r in response["results"][:self.max_results]]
+        if not results:
+            # may be a hiccup of the search, the next ask searches again
+            return results
+        self.answers.put(key, {"results": results, "expires": time.time() + self.entry_ttl(key)})
+        return results
+
+    def search(self, query: str):
+        """[{"content", "url"}, ...] for the query, at most `max_results`."""
+        key = f"{self.max_results}:{normalize_query(query)}"
+        with self._lock:
+            self.counters["requests"] += 1
+        entry = self._lookup(key)
+        telemetry.cache_event("fact_answers", entry is not None)
+        if entry is not None:
+            with self._lock:
+                self.counters["hits"] += 1
+            return entry["results"]
+        return self.flight.do(key, lambda: self._search(key, query))
+
+    def answer(self, query: str) -> str:
+        parts, budget = [], self.max_chars
+        for result in self.search(query):
+            if budget <= 0:
+                break
+            content = result["content"][:budget]
+            budget -= len(content)
+            parts.append(f"\n{content}\nFor more info visit {result['url']}")
+        if not parts:
+            return NO_RESULTS
+        return "\n        " + "\n".join(parts) + "\n    "
+
+    def stats(self):
+        with self._lock:
+            out = dict(self.counters)
+        out["hit_rate"] = round(out["hits"] / out["requests"], 3) if out["requests"] else 0.0
+        out["coalesced"] = self.flight.stats()["shared"]
+        return out
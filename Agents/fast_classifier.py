@@ -0,0 +1,131 @@
+"""
+Local, CPU-only first pass of the language & intent classifier.
+
+Language comes from script detection (Arabic vs Latin letters), intent from a
+small set of weighted rules. Every guess carries a confidence score; the graph
+only falls back to the Groq classifier (`classify_input`) when it is too low.
+"""
+import logging
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+ARABIC_CHARS = re.compile(r"[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF\uFB50-\uFDFF\uFE70-\uFEFF]")
+LATIN_CHARS = re.compile(r"[A-Za-z]")
+
+# (pattern, weight) - weights are summed per intent and squashed into a confidence
+GRAMMAR_RULES = [
+    (r"\bgramm[ae]r\b", 0.6),
+    (r"\b(tense|tenses|article|articles|preposition|prepositions|adjective|adverb|pronoun|conjunction|plural|singular|gerund|infinitive|participle|passive voice|active voice|modal verb|phrasal verb|conditional|subject[- ]verb agreement)\b", 0.5),
+    (r"\b(present|past|future) (simple|perfect|continuous|progressive)\b", 0.6),
+    (r"\bdifference between\b.*\b(and|vs\.?|versus)\b", 0.4),
+    (r"['\"]?\b\w+\b['\"]? (vs\.?|versus) ['\"]?\b\w+\b", 0.4),
+    (r"\bwhen (do|should|can|to) (i|we|you)? ?use\b", 0.5),
+    (r"\bhow (do|should|can) (i|we|you) use\b", 0.4),
+    (r"\bwhy (do|does|is|are|did) (we|you|it|they|people)? ?(say|use|write)\b", 0.5),
+    (r"\b(is it|which is) (correct|right|grammatical)\b", 0.6),
+    (r"\bexplain\b", 0.2),
+    # arabic
+    (r"قواعد|قاعدة|الفرق بين|متى نستخدم|متى استخدم|كيف نستخدم|زمن|الأزمنة|المضارع|الماضي التام|المبني للمجهول|حرف الجر|أداة التعريف|الصفة|الظرف|الجمع|المفرد", 0.6),
+    (r"اشرح|وضح|فسر", 0.2),
+]
+
+FACT_RULES = [
+    (r"^\s*(what|who|where|when|which|how many|how much|how far|how old|how long)\b", 0.4),
+    (r"\b(capital of|population of|president of|founder of|invented|discovered|located|tallest|largest|biggest|smallest|oldest|born|died)\b", 0.4),
+    (r"\bwhat (does|do) ['\"]?\w+['\"]? mean\b", 0.5),
+    (r"\bwhat is (the|a|an) (meaning|definition) of\b", 0.5),
+    (r"\b(tell me about|define|definition of)\b", 0.2),
+    # arabic
+    (r"^\s*(ما هي|ما هو|ما معنى|من هو|من هي|من اخترع|أين|اين|متى|كم)", 0.4),
+    (r"عاصمة|عدد سكان|رئيس|مؤسس|اخترع|اكتشف|أكبر|اكبر|أطول|اطول|تقع", 0.4),
+]
+
+CHAT_RULES = [
+    (r"^\s*(hi|hello|hey|good (morning|evening|afternoon|night)|thanks|thank you|bye|goodbye)\b", 0.6),
+    (r"\b(you|your|yours|yourself)\b", 0.4),
+    (r"^\s*(i|i'm|im|i've|my|we|we're|our|yesterday|today|tomorrow|last)\b", 0.4),
+    (r"\b(i think|i feel|i like|i love|i want|i went|i goes|i go)\b", 0.3),
+    # arabic
+    (r"^\s*(مرحبا|اهلا|أهلا|السلام عليكم|صباح|مساء|شكرا|مع السلامة)", 0.6),
+    (r"(أنا|انا|عندي|أحب|احب|ذهبت|كيف حالك|أنت|انت)", 0.4),
+]
+
+QUESTION = re.compile(r"[?؟]\s*$")
+
+
+def detect_language(text: str):
+    """Return (language, confidence) from the share of Arabic vs Latin letters."""
+    arabic, latin = len(ARABIC_CHARS.findall(text)), len(LATIN_CHARS.findall(text))
+    if arabic + latin == 0:
+        return "english", 0.5
+    share = arabic / (arabic + latin)
+    if share >= 0.5:
+        return "arabic", share
+    return "english", 1 - share
+
+
+def _score(rules, text: str) -> float:
+    return sum(w for pattern, w in rules if re.search(pattern, text, flags=re.IGNORECASE))
+
+
+def detect_intent(text: str):
+    """Return (intent, confidence) using the weighted rules above."""
+    scores = {
+        "grammar_question": _score(GRAMMAR_RULES, text),
+        "fact_question": _score(FACT_RULES, text),
+        "chat": _score(CHAT_RULES, text),
+    }
+    # a plain statement with no question and no grammar hint is conversation
+    if not QUESTION.search(text) and scores["grammar_question"] < 0.5 and scores["fact_question"] < 0.4:
+        scores["chat"] += 0.5
+    # grammar questions asked about "you" are still grammar questions
+    if scores["grammar_question"] >= 0.5:
+        scores["chat"] = max(0.0, scores["chat"] - 0.4)
+
+    ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+    (best, top), (_, second) = ranked[0], ranked[1]
+    if top == 0:
+        return "chat", 0.0
+    # confidence grows with the absolute score (saturating at 0.6) and with the margin over the runner-up
+    confidence = min(1.0, top / 0.6) * (top - second) / top
+    return best, round(confidence, 3)
+
+
+class FastPathStats:
+    """Thread-safe counters of how often the Groq fallback fires."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = 0
+        self.fallbacks = 0
+
+    def record(self, fallback: bool):
+        with self._lock:
+            self.total += 1
+            self.fallbacks += int(fallback)
+
+    def fallback_rate(self) -> float:
+        return self.fallbacks / self.total if self.total else 0.0
+
+    def as_dict(self):
+        return {
+            "turns": self.total,
+            "fast_path": self.total - self.fallbacks,
+            "fallbacks": self.fallbacks,
+            "fallback_rate": round(self.fallback_rate(), 3),
+        }
+
+
+stats = FastPathStats()
+
+
+def classify(text: str):
+    """
+    Return {"language", "intent", "confidence"}.
+    The overall confidence is the weaker of the language and intent guesses.
+    """
+    language, lang_conf = detect_language(text)
+    intent, intent_conf = detect_intent(text)
+    return {"language": language, "intent": intent, "confidence": min(lang_conf, intent_conf)}
@@ -0,0 +1,338 @@
+"""
+Approximate memory footprint per session, chat thread and component, with budgets.
+
+`deep_size` walks containers and object `__dict__`s and adds up `sys.getsizeof`,
+counting shared objects once, so the numbers are estimates of what each part keeps
+alive, not exact RSS. Sizes are reported for
+  - sessions: the Streamlit session state (`messages`, `user_chats`, ...) and the
+    session's `DataBase` chat cache, registered by `main.py` with `track_session`.
+    The state is looked up by session id in Streamlit's session manager, so idle
+    sessions are still seen, and a session is dropped once Streamlit has shut it down;
+  - chat threads: the checkpoints the in-memory checkpointer holds per thread;
+  - components: the process-wide caches (every `LRUCache`) plus whatever else is
+    registered with `component(name, fn)` (checkpointer, write-behind queue, ...).
+
+Budgets (`[agents.memory]`): sessions idle for `idle_minutes` have their cached
+chats and message copies dropped (they are read back from Firestore when needed),
+a session above `session_budget_mb` keeps only its open chat, and above
+`process_budget_mb` the least recently active sessions are trimmed, then their
+checkpointer threads evicted, until the total fits. Chats with a turn in the
+runner are left alone. `enforce()` runs every
+`report_minutes` in the background together with a log of the top consumers, and
+on demand from the memory debug page (`pages/memory_debug.py`).
+"""
+import logging
+import sys
+import threading
+import time
+import types
+import weakref
+from collections import deque
+
+from Agents import telemetry
+from Agents.settings import setting
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+MAX_OBJECTS = 500_000  # stop walking huge object graphs
+
+_LEAVES = (str, bytes, bytearray, int, float, complex, bool, type(None))
+_SKIP = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType,
+         type(threading.Lock()), threading.Thread)
+
+# session state entries that can be dropped from idle sessions (the page reloads them)
+EVICTABLE_STATE = ("messages", "chat_bot_msgs")
+
+
+def deep_size(obj, seen=None) -> int:
+    """Approximate bytes kept alive by `obj` (objects already in `seen` are not counted again)."""
+    seen = set() if seen is None else seen
+    size, stack = 0, [obj]
+    while stack and len(seen) < MAX_OBJECTS:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, _SKIP):
+            continue
+        seen.add(id(o))
+        try:
+            size += sys.getsizeof(o)
+        except TypeError:
+            continue
+        if isinstance(o, _LEAVES):
+            continue
+        try:
+            if isinstance(o, dict):
+                for k, v in list(o.items()):
+                    stack.append(k)
+                    stack.append(v)
+            elif isinstance(o, (list, tuple, set, frozenset, deque)):
+                stack.extend(list(o))
+            else:
+                attrs = getattr(o, "__dict__", None)
+                if attrs is not None:
+                    stack.append(attrs)
+                for slot in getattr(type(o), "__slots__", ()):
+                    if hasattr(o, slot):
+                        stack.append(getattr(o, slot))
+        except RuntimeError:
+            # changed while we walked it
+            continue
+    return size
+
+
+class Footprint:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}    # session id -> {"db": weakref, "user", "last_active"}
+        self._components = {}  # name -> fn() -> object to size, or {"bytes": n, ...}
+        self._checkpointer = None
+        self._thread = None
+        self.evictions = {"idle_sessions": 0, "trimmed_sessions": 0, "threads": 0}
+
+    # registration
+
+    def component(self, name: str, fn):
+        """`fn()` returns the object(s) the component keeps, or a dict with a precomputed "bytes"."""
+        with self._lock:
+            self._components[name] = fn
+
+    def checkpointer(self, saver):
+        self._checkpointer = saver
+        self.component("checkpointer", lambda: {"bytes": saver.resident_size().get("resident_bytes", 0)})
+
+    def track_session(self, db=None, user=None):
+        """Called on every script run of a session; marks it active."""
+        try:
+            from streamlit.runtime.scriptrunner import get_script_run_ctx
+            ctx = get_script_run_ctx()
+        except Exception:
+            ctx = None
+        if ctx is None:
+            return
+        with self._lock:
+            self._sessions[ctx.session_id] = {
+                "db": weakref.ref(db) if db is not None else None,
+                "user": user,
+                "last_active": time.monotonic(),
+            }
+        self._ensure_thread()
+
+    # measurement
+
+    def _session_parts(self, session_id, info):
+        parts = {}
+        db = info["db"]() if info["db"] else None
+        if db is not None:
+            parts["chat_cache"] = db.cache
+            parts["chat_index"] = db.index
+        state = session_state(session_id)
+        if state is not None:
+            try:
+                values = state.filtered_state
+            except Exception:
+                values = {}
+            for key, value in values.items():
+                if key != "db_app":
+                    parts[f"state.{key}"] = value
+        return state, db, parts
+
+    def sessions(self):
+        """[{session, user, idle_seconds, bytes, parts, chats}] largest first; closed sessions are dropped."""
+        now = time.monotonic()
+        with self._lock:
+            items = list(self._sessions.items())
+        out = []
+        for session_id, info in items:
+            state, db, parts = self._session_parts(session_id, info)
+            if state is None:
+                with self._lock:
+                    self._sessions.pop(session_id, None)
+                continue
+            # messages shared with the chat cache are counted once, under the cache
+            seen = set()
+            sizes = {name: deep_size(value, seen) for name, value in parts.items()}
+            out.append({"session": session_id, "user": info["user"], "idle_seconds": round(now - info["last_active"]),
+                        "bytes": sum(sizes.values()), "parts": sizes,
+                        "chats": list(db.cache) if db is not None else []})
+        return sorted(out, key=lambda s: -s["bytes"])
+
+    def threads(self):
+        """{thread_id: bytes} held by the in-memory checkpointer."""
+        saver = self._checkpointer
+        if saver is None or not hasattr(saver, "thread_sizes"):
+            return {}
+        return dict(sorted(saver.thread_sizes().items(), key=lambda kv: -kv[1]))
+
+    def components(self):
+        from Agents.cache import instances
+        with self._lock:
+            registered = dict(self._components)
+        out = {}
+        for cache in instances():
+            out[f"cache.{cache.name}"] = deep_size(cache._data)
+        for name, fn in registered.items():
+            try:
+                value = fn()
+            except Exception as e:
+                logger.warning("footprint of %s failed: %r", name, e)
+                continue
+            out[name] = value["bytes"] if isinstance(value, dict) and "bytes" in value else deep_size(value)
+        return dict(sorted(out.items(), key=lambda kv: -kv[1]))
+
+    def report(self):
+        sessions = self.sessions()
+        components = self.components()
+        threads = self.threads()
+        total = sum(s["bytes"] for s in sessions) + sum(components.values())
+        consumers = [(f"session {s['user'] or s['session'][:8]}", s["bytes"]) for s in sessions]
+        consumers += [(f"component {name}", size) for name, size in components.items()]
+        consumers += [(f"thread {thread_id}", size) for thread_id, size in threads.items()]
+        return {
+            "tracked_bytes": total,
+            "rss_bytes": rss_bytes(),
+            "sessions": sessions,
+            "threads": threads,
+            "components": components,
+            "top": sorted(consumers, key=lambda kv: -kv[1])[:setting("memory", "top", 10)],
+            "evictions": dict(self.evictions),
+        }
+
+    # budgets
+
+    def trim_session(self, session_id, keep_current=True):
+        """Drop a session's cached chats (but the open one) and its message copies."""
+        with self._lock:
+            info = self._sessions.get(session_id)
+        if info is None:
+            return []
+        state, db, _ = self._session_parts(session_id, info)
+        current = None
+        if state is not None:
+            try:
+                current = state["curr_chat_id"] if keep_current and "curr_chat_id" in state else None
+                for key in EVICTABLE_STATE:
+                    if key in state and not keep_current:
+                        del state[key]
+            except Exception as e:
+                logger.warning("could not trim session state: %r", e)
+        dropped = []
+        if db is not None:
+            for chat_id in list(db.cache):
+                if chat_id != current:
+                    db.invalidate(chat_id)
+                    dropped.append(chat_id)
+                elif db.cache.get(chat_id, {}).get("bot") is not None:
+                    # the agent history is read back only if the graph thread is lost
+                    db.cache[chat_id]["bot"] = None
+        return dropped
+
+    def evict_threads(self, chat_ids):
+        from Agents.runner import is_busy
+        saver = self._checkpointer
+        if saver is None or not hasattr(saver, "delete_thread"):
+            return 0
+        evicted = 0
+        for chat_id in chat_ids:
+            # a running turn reads and writes its thread
+            if chat_id in getattr(saver, "storage", {}) and not is_busy(chat_id):
+                saver.delete_thread(chat_id)
+                evicted += 1
+        self.evictions["threads"] += evicted
+        return evicted
+
+    def enforce(self):
+        """Apply the idle / session / process budgets, returns the actions taken."""
+        from Agents.runner import is_busy
+        actions = []
+        idle_seconds = setting("memory", "idle_minutes", 30.0) * 60
+        session_budget = setting("memory", "session_budget_mb", 50.0) * MB
+        process_budget = setting("memory", "process_budget_mb", 0.0) * MB
+        # sessions with a turn in the runner are left alone, a turn can outlast the idle thresholds
+        sessions = [s for s in self.sessions() if not any(is_busy(chat_id) for chat_id in s["chats"])]
+        for s in sessions:
+            if s["idle_seconds"] >= idle_seconds and (s["chats"] or any(f"state.{k}" in s["parts"] for k in EVICTABLE_STATE)):
+                self.trim_session(s["session"], keep_current=False)
+                self.evictions["idle_sessions"] += 1
+                actions.append(f"idle session {s['user'] or s['session'][:8]}: dropped {s['bytes'] // 1024} KB")
+            elif session_budget and s["bytes"] > session_budget:
+                dropped = self.trim_session(s["session"])
+                self.evictions["trimmed_sessions"] += 1
+                actions.append(f"session {s['user'] or s['session'][:8]} over budget: dropped {len(dropped)} cached chats")
+        if process_budget:
+            sessions = self.sessions()
+            total = sum(s["bytes"] for s in sessions) + sum(self.components().values())
+            # least recently active first, the sessions being used right now are left alone
+            for s in sorted(sessions, key=lambda s: -s["idle_seconds"]):
+                if total <= process_budget or s["idle_seconds"] < 60:
+                    break
+                if any(is_busy(chat_id) for chat_id in s["chats"]):
+                    continue
+                self.trim_session(s["session"], keep_current=False)
+                threads = self.evict_threads(s["chats"])
+                total -= s["bytes"]
+                self.evictions["trimmed_sessions"] += 1
+                actions.append(f"process over budget: trimmed session {s['user'] or s['session'][:8]}, evicted {threads} threads")
+        for action in actions:
+            logger.info("memory budget: %s", action)
+        return actions
+
+    def format_report(self, report=None) -> str:
+        report = report or self.report()
+        lines = [f"memory: tracked {report['tracked_bytes'] / MB:.1f} MB, rss {report['rss_bytes'] / MB:.1f} MB, "
+                 f"{len(report['sessions'])} sessions, {len(report['threads'])} graph threads"]
+        for name, size in report["top"]:
+            lines.append(f"  {name:<48}{size / 1024:>10.1f} KB")
+        return "\n".join(lines)
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="memory-footprint", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(setting("memory", "report_minutes", 10.0) * 60)
+            try:
+                self.enforce()
+                logger.info(self.format_report())
+            except Exception as e:
+                logger.warning("memory report failed: %r", e)
+
+
+def session_state(session_id):
+    """The `SessionState` of a session while Streamlit keeps it (None once it is shut down)."""
+    try:
+        from streamlit.runtime import Runtime
+        if not Runtime.exists():
+            return None
+        # the session manager Streamlit's own session state stats read from
+        info = Runtime.instance()._session_mgr.get_session_info(session_id)
+    except Exception:
+        return None
+    return info.session.session_state if info is not None else None
+
+
+def rss_bytes() -> int:
+    """Resident set size of the process (0 when it can't be read)."""
+    try:
+        with open("/proc/self/statm") as f:
+            import os
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        # peak, not current, on macOS / BSD
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    except ImportError:
+        return 0
+
+
+footprint = Footprint()
+telemetry.gauge("process_rss_bytes", "Resident memory of the process.", rss_bytes)
+telemetry.gauge("tracked_sessions", "Streamlit sessions seen by the memory footprint report.", lambda: len(footprint._sessions))
@@ -0,0 +1,155 @@
+"""
+Grammar correction engine behind the `get_grammar_correction` tool.
+
+Wraps the Gemma grammar-correction Gradio Space (`grammar_space` provider):
+  - corrections are cached per whitespace-normalized sentence (`LRUCache`, persisted);
+  - multi-sentence input is split and the sentences are corrected concurrently;
+  - a background probe sends a tiny request every `probe_minutes` so the Space stays awake
+    (straight to the Space: it is not cached or counted as a correction);
+  - a turn waits at most `deadline_seconds`: sentences that aren't back by then keep their
+    original text (late results still land in the cache), and when nothing came back the tool
+    answers NO_CORRECTION so the chat reply is never blocked on a sleeping Space.
+"""
+import contextvars
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from Agents import providers, ratelimit, telemetry
+from Agents.cache import LRUCache
+from Agents.settings import setting
+
+logger = logging.getLogger(__name__)
+
+NO_CORRECTION = "NO_CORRECTION: the grammar checker is not available right now, continue the conversation without a correction."
+PROBE_SENTENCE = "She go to school."
+
+
+def normalize_sentence(sentence: str) -> str:
+    # case and punctuation matter for a correction, only whitespace is normalized
+    return " ".join(sentence.split())
+
+
+def split_sentences(text: str):
+    return [s for s in (normalize_sentence(p) for p in re.split(r"(?<=[.!?])\s+|\n+", text)) if s]
+
+
+class GrammarCorrector:
+
+    def __init__(self):
+        self.deadline = setting("grammar", "deadline_seconds", 8.0)
+        self.cache = LRUCache(
+            "grammar_corrections",
+            max_size=setting("grammar", "cache_size", 2000),
+            ttl=setting("grammar", "ttl_hours", 24 * 30) * 3600,
+        )
+        self.executor = ThreadPoolExecutor(max_workers=setting("grammar", "max_workers", 4),
+                                           thread_name_prefix="grammar")
+        self._lock = threading.Lock()
+        self.inflight = {}  # sentence -> future, so a slow sentence is only sent once
+        self.counters = {"calls": 0, "sentences": 0, "remote_calls": 0, "errors": 0, "timeouts": 0, "no_correction": 0}
+        self.probe = {"healthy": None, "last_seconds": None, "last_error": None, "probes": 0}
+        self._probe_thread = None
+        if setting("grammar", "keep_warm", True):
+            self.start_probe(setting("grammar", "probe_minutes", 5.0) * 60)
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def _predict(self, sentence: str) -> str:
+        with telemetry.span("provider", "gradio.grammar"):
+            raw_output = providers.get("grammar_space").predict(sentence, api_name="/correct")
+        return re.sub(r"Corrected:", "", raw_output, flags=re.DOTALL).strip() or sentence
+
+    def correct_sentence(self, sentence: str) -> str:
+        """Correct one sentence through the Space and cache the result."""
+        self._count("remote_calls")
+        corrected = self._predict(sentence)
+        self.cache.put(sentence, corrected)
+        return corrected
+
+    def _submit(self, sentence):
+        with self._lock:
+            future = self.inflight.get(sentence)
+            if future is None:
+                # the worker reports its span to the caller's turn
+                future = self.executor.submit(contextvars.copy_context().run, self.correct_sentence, sentence)
+                self.inflight[sentence] = future
+                future.add_done_callback(lambda _: self._done(sentence))
+            return future
+
+    def _done(self, sentence):
+        with self._lock:
+            self.inflight.pop(sentence, None)
+
+    def correct(self, text: str, deadline: float = None) -> str:
+        """Corrected text, or NO_CORRECTION when no sentence could be corrected before the deadline."""
+        self._count("calls")
+        sentences = split_sentences(text)
+        if not sentences:
+            return text
+        self._count("sentences", len(sentences))
+        results = {}
+        pending = {}
+        for sentence in set(sentences):
+            cached = self.cache.get(sentence)
+            telemetry.cache_event("grammar_corrections", cached is not None)
+            if cached is not None:
+                results[sentence] = cached
+            else:
+                pending[self._submit(sentence)] = sentence
+
+        deadline = self.deadline if deadline is None else deadline
+        if pending:
+            done, not_done = wait(pending, timeout=deadline)
+            for future in done:
+                try:
+                    results[pending[future]] = future.result()
+                except Exception as e:
+                    self._count("errors")
+                    logger.warning("grammar correction failed: %r", e)
+            if not_done:
+                # keep running in the background, the results are cached for next time
+                self._count("timeouts", len(not_done))
+                logger.warning("grammar correction: %d sentence(s) missed the %.1fs deadline", len(not_done), deadline)
+
+        if not results:
+            self._count("no_correction")
+            return NO_CORRECTION
+        return " ".join(results.get(s, s) for s in sentences)
+
+    def start_probe(self, interval: float):
+        if self._probe_thread is not None:
+            return
+
+        def run():
+            while True:
+                self.probe_once()
+                time.sleep(interval)
+
+        self._probe_thread = threading.Thread(target=run, name="grammar-space-probe", daemon=True)
+        self._probe_thread.start()
+
+    def probe_once(self):
+        """Send the probe sentence to the Space and record whether it answered."""
+        start = time.perf_counter()
+        try:
+            # behind every learner's request for the space's quota
+            with ratelimit.scheduling("background"):
+                self._predict(PROBE_SENTENCE)
+            healthy, error = True, None
+        except Exception as e:
+            healthy, error = False, repr(e)
+        with self._lock:
+            self.probe.update(healthy=healthy, last_error=error, last_seconds=round(time.perf_counter() - start, 3))
+            self.probe["probes"] += 1
+
+    def stats(self):
+        with self._lock:
+            out = dict(self.counters)
+            out["probe"] = dict(self.probe)
+        out["cache"] = self.cache.stats()
+        return out
@@ -1,11 +1,16 @@
-from Agents.components import classify_input, translator, fact_search, grammar_explanation_Rag, chat, final_composer, tools
+from Agents.components import fast_classify, classify_input, parallel_classify, translator, fact_search, grammar_explanation_Rag, chat_context, chat, final_composer, tools
 from langgraph.graph import StateGraph, START, END
 from Agents.state import State
 from langgraph.prebuilt import ToolNode, tools_condition
 
-from langgraph.checkpoint.memory import InMemorySaver
+from Agents.checkpoint import make_checkpointer
+from Agents.footprint import footprint
+from Agents.telemetry import traced_node
+from Agents.settings import setting
 
-memory = InMemorySaver()
+# bounded in-memory or sqlite checkpointer, see Agents/checkpoint.py
+memory = make_checkpointer()
+footprint.checkpointer(memory)
 
 # initial node 
 def init_node(state):
@@ -14,11 +19,15 @@ def init_node(state):
     state['status_message'] = "🔍 Classifying your input..."
     state['intent'] = None  # Reset intent
     state['language'] = None  # Reset language
+    state['classifier_confidence'] = None
+    state['classified_by'] = None
     state['translated_input'] = None  # Reset translation if you have it
     # resoponses
     state['grammar_explanation'] = None
     state['fact_answer'] = None
     state['chat_response'] = None
+    state['context_stats'] = None
+    state['speculation_id'] = None
 
     # final response
     state['final_output'] = None
@@ -45,66 +54,109 @@ def detect_lang(state:State) -> str:
     
     return state['language']
 
+# skip the groq classifier when the local one is confident
+def detect_fast_path(state:State) -> str: 
+    if state['classified_by'] == "local":
+        return state['language']
+    return "fallback"
+
 def detect_intent(state:State) -> str: 
     return state['intent']
 
-# init builder 
-builder = StateGraph(State)
-
-# add nodes 
-builder.add_node("init_node", init_node)
-builder.add_node("classify_input_node", classify_input)
-builder.add_node("translator_node", translator)
-builder.add_node("intent_classifier_cb_node", check_point)
-
-# nodes for intent
-builder.add_node("fact_search_node", fact_search)
-builder.add_node("grammar_explanation_Rag_node", grammar_explanation_Rag)
-builder.add_node("chat_response_node", chat) # we will have the grammer correction as a tool here
-builder.add_node("tools", ToolNode(tools))
-
-# final_composer node
-builder.add_node("final_composer_node", final_composer)
-
-# add edges
-builder.add_edge(START, "init_node")
-builder.add_edge("init_node", "classify_input_node")
-builder.add_conditional_edges(
-    "classify_input_node", 
-    detect_lang , 
-    {
+# parallel mode: arabic input is usually translated already
+def detect_translation(state:State) -> str: 
+    if state['language'] == 'arabic' and not state.get('translated_input'):
+        return 'translate'
+    return 'route'
+
+def build_graph(mode: str = None, checkpointer=None):
+    """
+    Compile the agent graph. `mode` ([agents.graph] mode) is "sequential" (default) or "parallel":
+    when the local classifier isn't confident, "parallel" runs the Groq classifier, the Arabic
+    translation and a speculative chat answer at the same time (`parallel_classify`).
+    """
+    mode = mode or setting("graph", "mode", "sequential")
+    # init builder 
+    builder = StateGraph(State)
+
+    # add nodes (each one is timed, see Agents/telemetry.py)
+    builder.add_node("init_node", traced_node("init_node", init_node))
+    builder.add_node("fast_classify_node", traced_node("fast_classify_node", fast_classify))
+    builder.add_node("classify_input_node", traced_node("classify_input_node", classify_input))
+    builder.add_node("translator_node", traced_node("translator_node", translator))
+    builder.add_node("intent_classifier_cb_node", traced_node("intent_classifier_cb_node", check_point))
+    if mode == "parallel":
+        builder.add_node("parallel_classify_node", traced_node("parallel_classify_node", parallel_classify))
+
+    # nodes for intent
+    builder.add_node("fact_search_node", traced_node("fact_search_node", fact_search))
+    builder.add_node("grammar_explanation_Rag_node", traced_node("grammar_explanation_Rag_node", grammar_explanation_Rag))
+    builder.add_node("chat_context_node", traced_node("chat_context_node", chat_context))
+    builder.add_node("chat_response_node", traced_node("chat_response_node", chat)) # we will have the grammer correction as a tool here
+    builder.add_node("tools", ToolNode(tools))
+
+    # final_composer node
+    builder.add_node("final_composer_node", traced_node("final_composer_node", final_composer))
+
+    # add edges
+    builder.add_edge(START, "init_node")
+    builder.add_edge("init_node", "fast_classify_node")
+    builder.add_conditional_edges(
+        "fast_classify_node",
+        detect_fast_path,
+        {
+            'arabic' : 'translator_node',
+            'english': "intent_classifier_cb_node",
+            'fallback': "parallel_classify_node" if mode == "parallel" else "classify_input_node",
+        } )
+    if mode == "parallel":
+        builder.add_conditional_edges(
+            "parallel_classify_node",
+            detect_translation,
+            {
+                'translate': 'translator_node',
+                'route': "intent_classifier_cb_node",
+            } )
+    builder.add_conditional_edges(
+        "classify_input_node", 
+        detect_lang , 
+        {
         
-        'arabic' : 'translator_node',
-        'english': "intent_classifier_cb_node",
+            'arabic' : 'translator_node',
+            'english': "intent_classifier_cb_node",
         
-    } )
-
-builder.add_edge("translator_node", "intent_classifier_cb_node")
-builder.add_conditional_edges(
-    "intent_classifier_cb_node",
-    detect_intent,
-      {
-          "fact_question" : "fact_search_node",
-          "grammar_question" : "grammar_explanation_Rag_node",
-          "chat" : "chat_response_node" 
-      }
-    )
-builder.add_edge("fact_search_node", "final_composer_node")
-builder.add_edge("chat_response_node", "final_composer_node")
-builder.add_edge("grammar_explanation_Rag_node", "final_composer_node")
-
-# chat bot tools 
-builder.add_conditional_edges("chat_response_node", tools_condition,  {
-        "tools": "tools",         # if tool call detected
-        "default": "final_composer_node", # if NO tool call
-        "__end__": "final_composer_node"
-    })
-builder.add_edge("tools", "chat_response_node")
-
-builder.add_edge("final_composer_node", END)
-
-
-graph = builder.compile(checkpointer=memory)
+        } )
+
+    builder.add_edge("translator_node", "intent_classifier_cb_node")
+    builder.add_conditional_edges(
+        "intent_classifier_cb_node",
+        detect_intent,
+          {
+              "fact_question" : "fact_search_node",
+              "grammar_question" : "grammar_explanation_Rag_node",
+              "chat" : "chat_context_node" 
+          }
+        )
+    builder.add_edge("chat_context_node", "chat_response_node")
+    builder.add_edge("fact_search_node", "final_composer_node")
+    builder.add_edge("chat_response_node", "final_composer_node")
+    builder.add_edge("grammar_explanation_Rag_node", "final_composer_node")
+
+    # chat bot tools 
+    builder.add_conditional_edges("chat_response_node", tools_condition,  {
+            "tools": "tools",         # if tool call detected
+            "default": "final_composer_node", # if NO tool call
+            "__end__": "final_composer_node"
+        })
+    builder.add_edge("tools", "chat_response_node")
+
+    builder.add_edge("final_composer_node", END)
+
+
+    return builder.compile(checkpointer=checkpointer or memory)
+
+
+graph = build_graph()
 
 # ## get graph img:
 # png_bytes = graph.get_graph().draw_mermaid_png()
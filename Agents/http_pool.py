@@ -0,0 +1,135 @@
+"""
+Shared HTTP connection pools for the provider clients.
+
+Every provider gets one keep-alive pool per process (a `requests.Session` or an
+`httpx.Client`) with per-host connection limits and default timeouts taken from
+`[agents.http]`. `stats()` reports how many requests reused a pooled
+connection versus opened a new one (i.e. paid a fresh TCP/TLS handshake).
+"""
+import logging
+import threading
+import weakref
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from Agents.settings import setting
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_sessions = {}   # name -> requests.Session
+_httpx_stats = {}  # name -> {"requests", "new_connections"}
+
+
+def timeouts():
+    """(connect, read) timeouts in seconds."""
+    return setting("http", "connect_timeout", 5.0), setting("http", "timeout", 60.0)
+
+
+class PooledAdapter(HTTPAdapter):
+    """HTTPAdapter with a default timeout for calls that don't pass one."""
+
+    def send(self, request, timeout=None, **kwargs):
+        return super().send(request, timeout=timeout or timeouts(), **kwargs)
+
+
+def session(name: str) -> requests.Session:
+    """Process-wide keep-alive `requests.Session` for one provider."""
+    with _lock:
+        if name not in _sessions:
+            s = requests.Session()
+            adapter = PooledAdapter(
+                pool_connections=setting("http", "pool_connections", 10),  # hosts kept in the pool
+                pool_maxsize=setting("http", "pool_maxsize", 20),          # connections per host
+                max_retries=setting("http", "max_retries", 2),
+                pool_block=False,
+            )
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _sessions[name] = s
+        return _sessions[name]
+
+
+def httpx_client(name: str, httpx_module=None, event_hooks=None, **kwargs):
+    """Process-wide keep-alive `httpx.Client` for one provider, counting new vs reused connections."""
+    if httpx_module is None:
+        import httpx as httpx_module
+    connect, read = timeouts()
+    seen_streams = weakref.WeakSet()
+    with _lock:
+        counters = _httpx_stats.setdefault(name, {"requests": 0, "new_connections": 0})
+
+    def on_response(response):
+        # the network stream is the pooled connection: a stream we haven't seen is a fresh handshake
+        stream = response.extensions.get("network_stream")
+        with _lock:
+            counters["requests"] += 1
+            try:
+                if stream is not None and stream not in seen_streams:
+                    seen_streams.add(stream)
+                    counters["new_connections"] += 1
+            except TypeError:
+                pass
+
+    hooks = {key: list(value) for key, value in (event_hooks or {}).items()}
+    hooks.setdefault("response", []).append(on_response)
+    return httpx_module.Client(
+        limits=httpx_module.Limits(
+            max_connections=setting("http", "pool_maxsize", 20),
+            max_keepalive_connections=setting("http", "pool_maxsize", 20),
+            keepalive_expiry=setting("http", "keepalive_seconds", 60.0),
+        ),
+        timeout=httpx_module.Timeout(read, connect=connect),
+        event_hooks=hooks,
+        **kwargs,
+    )
+
+
+_hf_configured = False
+
+
+def configure_hf():
+    """Route every huggingface_hub call through a pooled client (requests or httpx, depending on the release)."""
+    global _hf_configured
+    with _lock:
+        if _hf_configured:
+            return
+        _hf_configured = True
+    import huggingface_hub
+    if hasattr(huggingface_hub, "configure_http_backend"):
+        # requests based releases (< 1.0)
+        huggingface_hub.configure_http_backend(backend_factory=lambda: session("hf"))
+        return
+    # httpx based releases share one client per process, we only give it limits, timeouts and stats
+    from huggingface_hub.utils import _http
+    httpx_module = getattr(_http, "httpx2", None) or getattr(_http, "httpx")
+    request_hook = getattr(_http, "hf_request_event_hook", None)
+    huggingface_hub.set_client_factory(lambda: httpx_client(
+        "hf", httpx_module,
+        event_hooks={"request": [request_hook]} if request_hook else None,
+        follow_redirects=True,
+    ))
+
+
+def stats():
+    """Per provider pool: requests sent, new connections opened and the share of reused connections."""
+    out = {}
+    with _lock:
+        for name, s in _sessions.items():
+            pools = []
+            for adapter in set(s.adapters.values()):
+                manager = getattr(adapter, "poolmanager", None)
+                if manager is not None:
+                    pools += [manager.pools[key] for key in manager.pools.keys()]
+            out[name] = {
+                "requests": sum(p.num_requests for p in pools),
+                "new_connections": sum(p.num_connections for p in pools),
+            }
+        for name, counters in _httpx_stats.items():
+            out[name] = dict(counters)
+    for counters in out.values():
+        reused = max(0, counters["requests"] - counters["new_connections"])
+        counters["reused"] = reused
+        counters["reuse_rate"] = round(reused / counters["requests"], 3) if counters["requests"] else 0.0
+    return out
@@ -0,0 +1,228 @@
+"""
+Lazy, process-wide provider clients.
+
+Nothing here touches the network at import time. Each client is built on first
+`get(name)`, once per process, and then shared by every Streamlit session.
+`warm_up()` can build them in the background once the UI is up, and
+`report()` breaks the startup cost down per provider.
+
+Run `python -m Agents.providers` to build every client and print the report.
+"""
+import logging
+import threading
+import time
+
+import streamlit as st
+
+from Agents import http_pool
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderRegistry:
+
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._wrappers = {}  # name -> [wrapper(instance) -> instance]
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._timings = {}  # name -> {"status", "seconds", "error"}
+        self._warming = False
+
+    def register(self, name: str, factory):
+        with self._lock:
+            self._factories[name] = factory
+            self._locks.setdefault(name, threading.Lock())
+
+    def override(self, name: str, instance):
+        """Replace a provider with a ready instance (tests, benchmarks, local stand-ins)."""
+        with self._lock:
+            self._locks.setdefault(name, threading.Lock())
+            for wrapper in self._wrappers.get(name, ()):
+                instance = wrapper(instance)
+            self._instances[name] = instance
+            self._timings[name] = {"status": "override", "seconds": 0.0, "error": None}
+
+    def wrap(self, name: str, wrapper):
+        """Apply `wrapper(instance)` to a provider (rate limits, ...), now if it is built, otherwise when it is."""
+        with self._lock:
+            self._wrappers.setdefault(name, []).append(wrapper)
+            self._locks.setdefault(name, threading.Lock())
+            if name in self._instances:
+                self._instances[name] = wrapper(self._instances[name])
+
+    def get(self, name: str):
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        if name not in self._factories:
+            raise KeyError(f"unknown provider: {name}")
+        # one lock per provider: sessions wait for the same client instead of building their own
+        with self._locks[name]:
+            instance = self._instances.get(name)
+            if instance is not None:
+                return instance
+            start = time.perf_counter()
+            try:
+                instance = self._factories[name]()
+                for wrapper in self._wrappers.get(name, ()):
+                    instance = wrapper(instance)
+            except Exception as e:
+                # not cached, the next call retries
+                self._timings[name] = {"status": "failed", "seconds": time.perf_counter() - start, "error": repr(e)}
+                logger.warning("provider %s failed to start: %r", name, e)
+                raise
+            self._timings[name] = {"status": "ready", "seconds": time.perf_counter() - start, "error": None}
+            self._instances[name] = instance
+            logger.info("provider %s ready in %.2fs", name, self._timings[name]["seconds"])
+            return instance
+
+    def reset(self, name: str):
+        with self._lock:
+            self._instances.pop(name, None)
+            self._timings.pop(name, None)
+
+    def warm_up(self, names=None, background: bool = True):
+        """Build the given providers (default: all) in parallel, optionally without blocking the caller."""
+        with self._lock:
+            if background and self._warming:
+                return
+            self._warming = True
+            names = list(names or self._factories)
+
+        def build(name):
+            try:
+                self.get(name)
+            except Exception:
+                pass  # recorded in the report
+
+        def run():
+            threads = [threading.Thread(target=build, args=(name,), daemon=True) for name in names]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            logger.info("provider warm-up finished:\n%s", self.format_report())
+
+        if background:
+            threading.Thread(target=run, name="provider-warm-up", daemon=True).start()
+        else:
+            run()
+
+    def report(self):
+        return {name: dict(self._timings.get(name, {"status": "not started", "seconds": 0.0, "error": None}))
+                for name in self._factories.keys() | self._instances.keys()}
+
+    def format_report(self) -> str:
+        rows = sorted(self.report().items(), key=lambda kv: -kv[1]["seconds"])
+        lines = [f"{'provider':<16}{'status':<12}{'seconds':>8}"]
+        for name, r in rows:
+            lines.append(f"{name:<16}{r['status']:<12}{r['seconds']:>8.2f}" + (f"  {r['error']}" if r["error"] else ""))
+        return "\n".join(lines)
+
+
+registry = ProviderRegistry()
+get = registry.get
+register = registry.register
+
+
+# provider factories, SDKs are imported here so importing the agents stays cheap
+
+def _hf():
+    from huggingface_hub import InferenceClient
+    http_pool.configure_hf()
+    return InferenceClient(api_key=st.secrets["HF_token"], timeout=http_pool.timeouts()[1])
+
+
+def _hf_inference():
+    # translator endpoint (serverless hf-inference provider)
+    from huggingface_hub import InferenceClient
+    http_pool.configure_hf()
+    return InferenceClient(provider="hf-inference", api_key=st.secrets["HF_token"], timeout=http_pool.timeouts()[1])
+
+
+def _translator():
+    from Agents.translation import Translator
+    return Translator()
+
+
+def _groq():
+    from groq import Groq
+    return Groq(api_key=st.secrets["Groq_api_key"], http_client=http_pool.httpx_client("groq"))
+
+
+def _tavily():
+    from tavily import TavilyClient
+    return TavilyClient(api_key=st.secrets["Travily_token"], session=http_pool.session("tavily"))
+
+
+def _gemini():
+    from langchain.chat_models import init_chat_model
+    return init_chat_model("google_genai:gemini-2.0-flash", api_key=st.secrets["Gemini_key"])
+
+
+def _facts():
+    # cached / coalesced tavily answers
+    from Agents.facts import FactSearch
+    return FactSearch()
+
+
+def _grammar_space():
+    from gradio_client import Client
+    return Client("Hager-Mohamed/Gemma_Grammar_Correction")
+
+
+def _grammar():
+    # cached / deadline-bound correction engine on top of the grammar space
+    from Agents.grammar_correction import GrammarCorrector
+    return GrammarCorrector()
+
+
+def _chroma_books():
+    import chromadb
+    client_db = chromadb.CloudClient(
+        api_key=st.secrets["Chromadb_token"],
+        tenant='2c00d764-53a9-4bad-9e5e-4f1bce13358d',
+        database='Edu_KB'
+    )
+    return client_db.get_collection(name="books")
+
+
+def _vector_store():
+    from Agents.vector_store import make_store
+    return make_store()
+
+
+def _embedder():
+    # chroma's default embedder (all-MiniLM-L6-v2 on onnxruntime), runs locally on CPU
+    from chromadb.utils import embedding_functions
+    return embedding_functions.DefaultEmbeddingFunction()
+
+
+def _rag():
+    from Agents.Rag import Rag
+    return Rag()
+
+
+register("hf", _hf)
+register("hf_inference", _hf_inference)
+register("translator", _translator)
+register("groq", _groq)
+register("tavily", _tavily)
+register("facts", _facts)
+register("gemini", _gemini)
+register("grammar_space", _grammar_space)
+register("grammar", _grammar)
+register("chroma_books", _chroma_books)
+register("vector_store", _vector_store)
+register("embedder", _embedder)
+register("rag", _rag)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    # importing the components registers the tool-bound chat model on the shared registry
+    from Agents import components
+    from Agents.providers import registry as shared
+    shared.warm_up(background=False)
@@ -0,0 +1,130 @@
+"""
+Context assembly for the grammar RAG prompt.
+
+`build_context` takes the top-k retrieved chunks and keeps only what fits in
+`[agents.rag] context_tokens`: chunks are split into sentences, every sentence is
+scored against the question (BM25-like term weights, quoted terms such as 'a' /
+'an' always count, earlier chunks weigh a bit more), near-duplicates from
+overlapping chunks are dropped and the best sentences are packed into the token
+budget. They are put back in document order so examples stay next to their rule.
+The citation names the books the kept sentences come from.
+"""
+import math
+import re
+from collections import Counter
+
+from Agents.telemetry import estimate_tokens
+
+# question scaffolding, not what the question is about
+STOPWORDS = {
+    "what", "whats", "why", "how", "when", "where", "which", "who", "is", "are", "was", "were", "be", "do", "does",
+    "did", "can", "could", "would", "should", "will", "you", "me", "i", "we", "my", "please", "explain", "tell",
+    "about", "the", "of", "to", "in", "on", "for", "and", "or", "it", "this", "that", "with", "difference",
+    "between", "mean", "means", "meaning", "there", "some", "any", "know", "want", "need", "help",
+}
+DUPLICATE_JACCARD = 0.8
+# cited when the retrieved chunks carry no file name
+UNKNOWN_BOOK = "the grammar knowledge base"
+RANK_DECAY = 0.15  # weight of the k-th chunk is 1 / (1 + RANK_DECAY * k)
+
+_SENTENCE = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[A-Z0-9])|\n\s*\n|\n(?=\s*(?:[-*•]|\d+[.)])\s)")
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def stem(word: str) -> str:
+    for suffix in ("ing", "ed", "es", "ly", "s"):
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            return word[:-len(suffix)]
+    return word
+
+
+def terms(text: str):
+    words = (re.sub(r"'s$", "", w.strip("'")) for w in _WORD.findall(text.lower()))
+    return [stem(w) for w in words if w]
+
+
+def query_terms(query: str):
+    """Content words of the question plus anything it quotes ('a' vs 'an')."""
+    quoted = {stem(w) for q in re.findall(r"(?:^|\s)['\"“‘]([^'\"”’]{1,40})['\"”’]", query) for w in terms(q)}
+    return {t for t in terms(query) if t not in STOPWORDS and len(t) > 1} | quoted
+
+
+def split_sentences(text: str):
+    return [s.strip() for s in _SENTENCE.split(text) if s and s.strip()]
+
+
+def build_context(query: str, documents, metadatas, token_budget: int = 512):
+    """
+    {"text", "book", "tokens_before", "tokens_after", "chunks", "sentences", "kept"} for the prompt.
+
+    `documents` / `metadatas` are the retrieved chunks, best first.
+    """
+    raw = "".join(documents)
+    sentences = []  # (chunk rank, position, text, terms)
+    for rank, document in enumerate(documents):
+        for position, sentence in enumerate(split_sentences(document or "")):
+            sentences.append((rank, position, sentence, terms(sentence)))
+
+    # idf over the retrieved sentences: words in every sentence don't tell them apart
+    wanted = query_terms(query)
+    df = Counter(t for *_, words in sentences for t in set(words) if t in wanted)
+    n = len(sentences)
+    avg_len = sum(len(words) for *_, words in sentences) / n if n else 1.0
+
+    def score(rank, words):
+        tf = Counter(words)
+        s = 0.0
+        for t in wanted:
+            if tf[t]:
+                idf = math.log(1 + (n - df[t] + 0.5) / (df[t] + 0.5))
+                s += idf * tf[t] * 2.2 / (tf[t] + 1.2 * (0.25 + 0.75 * len(words) / avg_len))
+        return s / (1 + RANK_DECAY * rank)
+
+    scored = sorted(((score(rank, words), rank, position, sentence, words)
+                     for rank, position, sentence, words in sentences), key=lambda x: (-x[0], x[1], x[2]))
+    no_match = bool(scored) and scored[0][0] == 0
+    if no_match:
+        # nothing matches the question's words: keep the chunks' openings in their order
+        scored = sorted(scored, key=lambda x: (x[1], x[2]))
+
+    kept, seen, used = [], [], 0
+    for s, rank, position, sentence, words in scored:
+        if s == 0 and kept and not no_match:
+            break
+        word_set = set(words)
+        if any(len(word_set & other) / max(1, len(word_set | other)) >= DUPLICATE_JACCARD for other in seen):
+            continue
+        tokens = estimate_tokens(sentence) + 1
+        if used + tokens > token_budget:
+            if kept:
+                continue
+            # a single sentence over the budget: cut it to the budget
+            sentence = sentence[:token_budget * 4].rsplit(" ", 1)[0] + " ..."
+            tokens = estimate_tokens(sentence) + 1
+        kept.append((rank, position, sentence))
+        seen.append(word_set)
+        used += tokens
+
+    kept.sort()
+    parts, books = [], []
+    for rank, position, sentence in kept:
+        if parts and parts[-1][0] == rank:
+            parts[-1][1].append(sentence)
+        else:
+            parts.append((rank, [sentence]))
+        book = (metadatas[rank] or {}).get("file_name") if rank < len(metadatas) else None
+        if book and book not in books:
+            books.append(book)
+    if not books:
+        books.append((metadatas[0] or {}).get("file_name") if metadatas else None)
+    books = [b for b in books if b] or [UNKNOWN_BOOK]
+    text = "\n\n".join(" ".join(chunk) for _, chunk in parts)
+    return {
+        "text": text,
+        "book": ", ".join(str(b) for b in books),
+        "tokens_before": estimate_tokens(raw),
+        "tokens_after": estimate_tokens(text),
+        "chunks": len(documents),
+        "sentences": len(sentences),
+        "kept": len(kept),
+    }
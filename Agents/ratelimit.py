@@ -0,0 +1,384 @@
+"""
+Process-wide client-side rate limits for provider calls.
+
+`TokenBucket` is a thread-safe token bucket: `rate` tokens per second, bursts of up
+to `capacity`. Every limited quota has a `FairScheduler` in front of its bucket that
+hands out the tokens by priority (interactive turns, then batch runs, then
+background work such as health probes) and, within a priority, round robin over
+sessions, so one busy chat or batch conversation can't starve the others.
+
+Quotas are per provider service ("groq", "gemini", "hf", "tavily", "grammar_space")
+and optionally per model ("groq:qwen/qwen3-32b"), set in `[agents.ratelimit]` or
+with `limit_provider("groq", "30/min")`. Registry providers that spend the same quota
+share its bucket (`chat_llm` is Gemini, `chat_fallback` Groq, `hf_inference` HF).
+Every request method (`create`, `stream`, `search`, `translation`, `predict`,
+`query`, `__call__`, ...) of a limited provider waits for a token first; a call that
+fails with a 429 (status code, or the SDK's rate limit exception) pauses the bucket
+until the provider's Retry-After has passed, also when a returned stream raises it
+while it is read. A call limited by both a service and a model quota takes a token
+of each or, when it times out on one, gives the other back. The caller's
+priority and session come from `scheduling(priority, session)`, which the turn
+runner, the batch runner and the grammar probe set. Rates are written as
+"<count>/<s|min|hour|day>". `stats()` reports queue depth and wait times per quota
+and priority, also exported as Prometheus gauges.
+"""
+import contextvars
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from Agents import providers, telemetry
+from Agents.settings import setting
+
+logger = logging.getLogger(__name__)
+
+UNITS = {"s": 1, "sec": 1, "second": 1, "m": 60, "min": 60, "minute": 60, "h": 3600, "hour": 3600, "d": 86400, "day": 86400}
+
+# methods that send a request; attributes like `chat` / `completions` are proxied further
+CALL_METHODS = {"create", "stream", "invoke", "search", "translation", "predict", "query"}
+
+PRIORITIES = ("interactive", "batch", "background")
+# registry provider -> the service quota it spends
+QUOTAS = {"chat_llm": "gemini", "chat_fallback": "groq", "hf_inference": "hf"}
+SERVICES = ("groq", "gemini", "hf", "tavily", "grammar_space", "chroma_books")
+# seconds a request may wait for its turn before failing (0 = no limit), `<priority>_max_wait_seconds`
+MAX_WAIT = {"interactive": 20.0, "batch": 0.0, "background": 0.0}
+# SDK exceptions for a 429 that don't carry the status code (groq / openai, google, ...)
+RATE_LIMIT_ERRORS = {"RateLimitError", "ResourceExhausted", "TooManyRequests"}
+
+_priority = contextvars.ContextVar("ratelimit_priority", default="interactive")
+_session = contextvars.ContextVar("ratelimit_session", default=None)
+
+
+class RateLimitTimeout(TimeoutError):
+    pass
+
+
+@contextmanager
+def scheduling(priority: str = None, session=None):
+    """Calls made in this block (and in threads started with its context) queue with this priority / session."""
+    if priority is not None and priority not in PRIORITIES:
+        raise ValueError(f"unknown priority {priority!r}, expected one of {PRIORITIES}")
+    tokens = [(_priority, _priority.set(priority)) if priority else None,
+              (_session, _session.set(session)) if session is not None else None]
+    try:
+        yield
+    finally:
+        for var, token in reversed([t for t in tokens if t]):
+            var.reset(token)
+
+
+def parse_rate(text: str) -> float:
+    """"30/min" -> 0.5 (per second)."""
+    match = re.fullmatch(r"\s*([\d.]+)\s*/\s*([a-z]+)\s*", text.lower())
+    if not match or match.group(2) not in UNITS:
+        raise ValueError(f"bad rate {text!r}, expected e.g. 30/min")
+    return float(match.group(1)) / UNITS[match.group(2)]
+
+
+class TokenBucket:
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.waited_seconds = 0.0
+
+    def _refill(self, now):
+        # nothing accrues while paused
+        start = max(self.updated, self.paused_until)
+        if now > start:
+            self.tokens = min(self.capacity, self.tokens + (now - start) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Take the tokens and return 0, or return the seconds until they will be available."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+            self._refill(now)
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                self.acquired += 1
+                return 0.0
+            return (tokens - self.tokens) / self.rate
+
+    def acquire(self, tokens: float = 1.0, timeout: float = None) -> float:
+        """Block until the tokens are taken, returns the seconds waited."""
+        start = time.monotonic()
+        while True:
+            wait = self.try_acquire(tokens)
+            waited = time.monotonic() - start
+            if wait == 0.0:
+                with self._lock:
+                    self.waited_seconds += waited
+                return waited
+            if timeout is not None and waited + wait > timeout:
+                raise TimeoutError(f"rate limit: no token within {timeout}s")
+            time.sleep(wait)
+
+    def refund(self, tokens: float = 1.0):
+        """Give back tokens taken for a request that was not sent."""
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + tokens)
+            self.acquired -= 1
+
+    def stats(self):
+        with self._lock:
+            return {"rate_per_second": self.rate, "capacity": self.capacity, "acquired": self.acquired,
+                    "waited_seconds": round(self.waited_seconds, 3)}
+
+    def pause(self, seconds: float):
+        """No tokens for the next `seconds` (the provider answered 429); overlapping pauses don't add up."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens = min(self.tokens, 0.0)
+            self.paused_until = max(self.paused_until, now + seconds)
+
+
+class FairScheduler:
+    """Hands out a bucket's tokens by priority, then round robin over the sessions waiting."""
+
+    def __init__(self, name: str, bucket: TokenBucket):
+        self.name = name
+        self.bucket = bucket
+        self._cond = threading.Condition()
+        self._queues = {p: OrderedDict() for p in PRIORITIES}  # priority -> session -> deque of tickets
+        self.waits = {p: deque(maxlen=500) for p in PRIORITIES}
+        self.counters = {p: {"granted": 0, "queued": 0, "timeouts": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+                         for p in PRIORITIES}
+        self.throttled = 0
+
+    def _head(self):
+        for priority in PRIORITIES:
+            for tickets in self._queues[priority].values():
+                return tickets[0]
+        return None
+
+    def _remove(self, priority, session, ticket, granted):
+        queue = self._queues[priority]
+        tickets = queue[session]
+        tickets.remove(ticket)
+        if not tickets:
+            del queue[session]
+        elif granted:
+            # the session's next request goes behind the other sessions'
+            queue.move_to_end(session)
+
+    def _record(self, priority, waited, queued):
+        c = self.counters[priority]
+        c["granted"] += 1
+        c["queued"] += queued
+        c["wait_seconds"] += waited
+        c["max_wait_seconds"] = max(c["max_wait_seconds"], waited)
+        self.waits[priority].append(waited)
+
+    def acquire(self, timeout: float = None) -> float:
+        """Wait for a token in turn, returns the seconds waited."""
+        priority, session = _priority.get(), _session.get()
+        with self._cond:
+            if self._head() is None and self.bucket.try_acquire() == 0.0:
+                self._record(priority, 0.0, 0)
+                return 0.0
+        start = time.monotonic()
+        ticket = object()
+        with telemetry.span("ratelimit", f"{self.name}/{priority}"), self._cond:
+            self._queues[priority].setdefault(session, deque()).append(ticket)
+            granted = False
+            try:
+                while True:
+                    wait = None
+                    if self._head() is ticket:
+                        wait = self.bucket.try_acquire()
+                        if wait == 0.0:
+                            granted = True
+                            break
+                    waited = time.monotonic() - start
+                    if timeout is not None and waited >= timeout:
+                        self.counters[priority]["timeouts"] += 1
+                        raise RateLimitTimeout(f"{self.name}: no {priority} slot within {timeout}s")
+                    # the head sleeps until its token is due, the others until the head is served
+                    limits = [w for w in (wait, None if timeout is None else timeout - waited) if w is not None]
+                    self._cond.wait(min(limits) if limits else None)
+            finally:
+                self._remove(priority, session, ticket, granted)
+                self._cond.notify_all()
+            waited = time.monotonic() - start
+            self._record(priority, waited, 1)
+        return waited
+
+    def refund(self):
+        with self._cond:
+            self.bucket.refund()
+            self._cond.notify_all()
+
+    def throttle(self, seconds: float):
+        with self._cond:
+            self.throttled += 1
+            self.bucket.pause(seconds)
+            self._cond.notify_all()
+
+    def depth(self) -> int:
+        with self._cond:
+            return sum(len(t) for queue in self._queues.values() for t in queue.values())
+
+    def stats(self):
+        with self._cond:
+            out = dict(self.bucket.stats(), throttled=self.throttled,
+                       depth={p: sum(len(t) for t in self._queues[p].values()) for p in PRIORITIES})
+            out["waited_seconds"] = round(sum(c["wait_seconds"] for c in self.counters.values()), 3)
+            for priority in PRIORITIES:
+                c = dict(self.counters[priority])
+                if not c["granted"] and not c["timeouts"]:
+                    continue
+                samples = sorted(self.waits[priority])
+                c["avg_wait_seconds"] = round(c.pop("wait_seconds") / c["granted"], 3) if c["granted"] else 0.0
+                c["p95_wait_seconds"] = round(samples[min(len(samples) - 1, int(0.95 * len(samples)))], 3) if samples else 0.0
+                c["max_wait_seconds"] = round(c["max_wait_seconds"], 3)
+                out[priority] = c
+        return out
+
+
+def retry_after(error) -> float:
+    """Seconds to back off when `error` is a 429 from the provider, else None."""
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None) or getattr(error, "code", None)
+    if status != 429 and not any(cls.__name__ in RATE_LIMIT_ERRORS for cls in type(error).__mro__):
+        return None
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after") or headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return setting("ratelimit", "backoff_seconds", 10.0)
+
+
+class RateLimited:
+    """Proxy that waits for a token of the provider's quota (and the model's, when it has one) before every request."""
+
+    def __init__(self, target, provider: str):
+        self._target = target
+        self._provider = provider
+
+    def _acquire(self, model=None):
+        quota = QUOTAS.get(self._provider, self._provider)
+        limited = [schedulers.get(quota), schedulers.get(f"{quota}:{model}") if model else None]
+        limited = [s for s in limited if s is not None]
+        priority = _priority.get()
+        timeout = setting("ratelimit", f"{priority}_max_wait_seconds", MAX_WAIT[priority]) or None
+        acquired = []
+        try:
+            for scheduler in limited:
+                scheduler.acquire(timeout=timeout)
+                acquired.append(scheduler)
+        except RateLimitTimeout:
+            # both quotas or neither: the request is not sent
+            for scheduler in acquired:
+                scheduler.refund()
+            raise
+        return limited
+
+    def _throttle(self, error, limited):
+        seconds = retry_after(error)
+        if seconds is not None:
+            logger.warning("%s: rate limited by the provider, pausing for %.1fs", self._provider, seconds)
+            for scheduler in limited:
+                scheduler.throttle(seconds)
+
+    def _stream(self, chunks, limited):
+        # streams send the request (and get their 429) when they are first read
+        try:
+            yield from chunks
+        except Exception as e:
+            self._throttle(e, limited)
+            raise
+
+    def _call(self, fn, args, kwargs):
+        limited = self._acquire(kwargs.get("model"))
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self._throttle(e, limited)
+            raise
+        if isinstance(result, Iterator):
+            return self._stream(result, limited)
+        return result
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if callable(value) and name in CALL_METHODS:
+            return lambda *args, **kwargs: self._call(value, args, kwargs)
+        if callable(value) or isinstance(value, (str, bytes, int, float, bool, type(None), dict, list, tuple, set)):
+            return value
+        # nested clients: groq.chat.completions.create
+        return RateLimited(value, self._provider)
+
+    def __call__(self, *args, **kwargs):
+        return self._call(self._target, args, kwargs)
+
+
+schedulers = {}  # quota ("groq", "groq:qwen/qwen3-32b") -> FairScheduler
+_wrapped = set()
+_lock = threading.Lock()
+
+
+def limit(quota: str, rate, capacity: float = None) -> FairScheduler:
+    """Set the rate of a quota ("groq" or "groq:<model>"); `rate` is per second or a "30/min" string."""
+    bucket = TokenBucket(parse_rate(rate) if isinstance(rate, str) else rate, capacity)
+    service = quota.partition(":")[0]
+    with _lock:
+        schedulers[quota] = FairScheduler(quota, bucket)
+        # every registry provider spending this quota waits for its tokens
+        for name in providers.registry.report():
+            if QUOTAS.get(name, name) == service and name not in _wrapped:
+                _wrapped.add(name)
+                providers.registry.wrap(name, lambda instance, name=name: RateLimited(instance, name))
+    return schedulers[quota]
+
+
+def limit_provider(name: str, rate, capacity: float = None) -> FairScheduler:
+    """Rate limit the quota a registry provider spends (`chat_llm` -> gemini, ...)."""
+    return limit(QUOTAS.get(name, name), rate, capacity)
+
+
+def configure():
+    """Quotas from `[agents.ratelimit]`: one rate per service, `models` = "groq:qwen/qwen3-32b=60/min, ..."."""
+    for service in SERVICES:
+        rate = setting("ratelimit", service, "")
+        if rate:
+            limit(service, rate)
+    for item in setting("ratelimit", "models", "").split(","):
+        if item.strip():
+            quota, _, rate = item.rpartition("=")
+            limit(quota.strip(), rate.strip())
+
+
+def stats():
+    return {quota: scheduler.stats() for quota, scheduler in list(schedulers.items())}
+
+
+def _wait_gauge(priority):
+    def value():
+        out = {}
+        for quota, scheduler in list(schedulers.items()):
+            samples = list(scheduler.waits[priority])
+            if samples:
+                out[quota] = round(sum(samples) / len(samples), 4)
+        return out
+    return value
+
+
+telemetry.gauge("ratelimit_queue_depth", "Requests waiting for a rate limit token, per quota.",
+                lambda: {quota: scheduler.depth() for quota, scheduler in list(schedulers.items())})
+for _p in PRIORITIES:
+    telemetry.gauge(f"ratelimit_{_p}_wait_seconds", f"Average wait for a rate limit token of the last {_p} requests, per quota.",
+                    _wait_gauge(_p))
@@ -0,0 +1,319 @@
+"""
+Provider routing for the LLM roles: deadlines, hedged requests, circuit breakers and failover.
+
+Each role (`classifier`, `explainer`, `chat`) has an ordered list of targets in
+`[agents.routing_<role>] targets`, written as "provider:model" (e.g. "groq:qwen/qwen3-32b",
+"hf:HuggingFaceTB/SmolLM3-3B") or as a bare provider name for ready-made chat models
+("chat_llm"). `call(role, fn)` calls `fn(target)` on the first target whose circuit
+breaker is closed and then:
+  - fails over to the next target as soon as an attempt raises;
+  - sends a hedged request to the next target (or the same one when it is the only one)
+    when the attempt is slower than the `hedge_percentile` of its recent latencies, or
+    than `attempt_seconds`; the first answer wins;
+  - gives up with `DeadlineExceeded` after `deadline_seconds`.
+A target's breaker is asked only when the target is about to be called, so a half-open
+breaker's single probe is not used up by a target that is never tried. When every
+breaker is open the call fails at once with `AllTargetsFailed`.
+For streams (`stream=True`) an attempt is done when its first chunk arrives, the rest
+is read from the winning stream and the losers are closed.
+
+`stats()` reports calls, failures, hedges, deadline misses, breaker state and latency
+percentiles per role and target.
+"""
+import contextvars
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from Agents import providers, telemetry
+from Agents.ratelimit import RateLimitTimeout
+from Agents.settings import setting
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TARGETS = {
+    "classifier": "groq:qwen/qwen3-32b,hf:Qwen/Qwen2.5-7B-Instruct",
+    "explainer": "hf:HuggingFaceTB/SmolLM3-3B,hf:Qwen/Qwen2.5-7B-Instruct",
+    "chat": "chat_llm,chat_fallback",
+}
+# seconds until the answer (or, for streams, its first chunk)
+DEFAULT_DEADLINES = {"classifier": 6.0, "explainer": 30.0, "chat": 20.0}
+
+_EMPTY = object()
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class AllTargetsFailed(RuntimeError):
+    pass
+
+
+class Target:
+    """One entry of a role's fallback list."""
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        self.provider, _, self.model = spec.partition(":")
+        self.model = self.model or None
+
+    @property
+    def client(self):
+        return providers.get(self.provider)
+
+    def __repr__(self):
+        return self.spec
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures, lets one probe through after `reset_seconds`."""
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.probing = None  # when the half-open probe was let through
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state != "half-open":
+                return state == "closed"
+            now = time.monotonic()
+            # one probe at a time; a probe that was let through but never reported back expires
+            if self.probing is not None and now - self.probing < self.reset_seconds:
+                return False
+            self.probing = now
+            return True
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = None
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            self.probing = None
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                # a failed half-open probe opens the breaker again
+                self.opened_at = time.monotonic()
+
+
+class TargetStats:
+
+    def __init__(self, breaker: CircuitBreaker):
+        self.breaker = breaker
+        self.latencies = deque(maxlen=200)
+        self.counters = {"attempts": 0, "successes": 0, "failures": 0, "hedges": 0, "wins": 0}
+        self._lock = threading.Lock()
+
+    def percentile(self, q: float):
+        with self._lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def as_dict(self):
+        with self._lock:
+            out = dict(self.counters)
+            n = len(self.latencies)
+        out["breaker"] = self.breaker.state
+        if n:
+            out["p50_ms"] = round(self.percentile(0.5) * 1000, 1)
+            out["p95_ms"] = round(self.percentile(0.95) * 1000, 1)
+        return out
+
+
+class Router:
+
+    def __init__(self, max_workers: int = 64):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="routing")
+        self._lock = threading.Lock()
+        self._targets = {}  # (role, spec) -> TargetStats
+        self.roles = {}     # role -> {"calls", "failed", "deadline_exceeded", "hedged", "failovers"}
+
+    def config(self, role: str):
+        section = f"routing_{role}"
+        targets = setting(section, "targets", DEFAULT_TARGETS.get(role, ""))
+        if isinstance(targets, str):
+            targets = [t.strip() for t in targets.split(",") if t.strip()]
+        return {
+            "targets": [Target(t) for t in targets],
+            "deadline": setting(section, "deadline_seconds", DEFAULT_DEADLINES.get(role, 30.0)),
+            "attempt_seconds": setting(section, "attempt_seconds", DEFAULT_DEADLINES.get(role, 30.0) / 2),
+            "hedge_percentile": setting(section, "hedge_percentile", 0.95),
+            "hedge_min_samples": setting(section, "hedge_min_samples", 20),
+            "max_hedges": setting(section, "max_hedges", 1),
+        }
+
+    def target_stats(self, role: str, target: Target) -> TargetStats:
+        with self._lock:
+            key = (role, target.spec)
+            if key not in self._targets:
+                self._targets[key] = TargetStats(CircuitBreaker(
+                    failure_threshold=setting("routing", "failure_threshold", 5),
+                    reset_seconds=setting("routing", "reset_seconds", 30.0),
+                ))
+            return self._targets[key]
+
+    def _count(self, role, key):
+        with self._lock:
+            counters = self.roles.setdefault(role, {"calls": 0, "failed": 0, "deadline_exceeded": 0, "hedged": 0, "failovers": 0})
+            counters[key] += 1
+
+    def _attempt(self, role, target, fn, stream):
+        stats = self.target_stats(role, target)
+        with stats._lock:
+            stats.counters["attempts"] += 1
+        start = time.perf_counter()
+        try:
+            with telemetry.span("attempt", f"{role}/{target.spec}"):
+                result = fn(target)
+                if stream:
+                    result = iter(result)
+                    result = (next(result, _EMPTY), result)
+        except RateLimitTimeout:
+            # queued behind our own quota: the provider was never asked, its breaker stays as it is
+            with stats._lock:
+                stats.counters["failures"] += 1
+            raise
+        except Exception:
+            stats.breaker.failure()
+            with stats._lock:
+                stats.counters["failures"] += 1
+            raise
+        stats.breaker.success()
+        with stats._lock:
+            stats.counters["successes"] += 1
+            stats.latencies.append(time.perf_counter() - start)
+        return result
+
+    def _hedge_delay(self, role, target, cfg):
+        stats = self.target_stats(role, target)
+        delay = cfg["attempt_seconds"]
+        if len(stats.latencies) >= cfg["hedge_min_samples"]:
+            delay = min(delay, stats.percentile(cfg["hedge_percentile"]))
+        return delay
+
+    def call(self, role: str, fn, stream: bool = False):
+        """`fn(target)` on the role's targets with deadline, hedging and failover; see the module docstring."""
+        cfg = self.config(role)
+        if not cfg["targets"]:
+            raise AllTargetsFailed(f"no targets configured for {role}")
+        self._count(role, "calls")
+        start = time.monotonic()
+        deadline = start + cfg["deadline"]
+        queue = deque(cfg["targets"])
+        inflight = {}  # future -> (target, launched_at)
+        errors = []
+        hedges = 0
+
+        def next_target():
+            # the breaker is asked right before the call: a half-open one lets its probe through here
+            while queue:
+                target = queue.popleft()
+                if self.target_stats(role, target).breaker.allow():
+                    return target
+            return None
+
+        def launch(target):
+            ctx = contextvars.copy_context()
+            inflight[self.executor.submit(ctx.run, self._attempt, role, target, fn, stream)] = (target, time.monotonic())
+
+        def close_losers():
+            # late streams are closed as soon as they show up
+            for future in inflight:
+                future.add_done_callback(_close_stream if stream else (lambda f: None))
+
+        first = next_target()
+        if first is None:
+            self._count(role, "failed")
+            raise AllTargetsFailed(f"{role}: every target's circuit breaker is open")
+        launch(first)
+        while inflight:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            # when the newest attempt should be hedged
+            newest_target, launched_at = max(inflight.values(), key=lambda v: v[1])
+            hedge_at = launched_at + self._hedge_delay(role, newest_target, cfg)
+            can_hedge = hedges < cfg["max_hedges"]
+            timeout = min(deadline, hedge_at) - now if can_hedge else deadline - now
+            done, _ = wait(list(inflight), timeout=max(0.0, timeout), return_when=FIRST_COMPLETED)
+            for future in done:
+                target, _ = inflight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors.append(f"{target.spec}: {e!r}")
+                    logger.warning("%s: %s failed: %r", role, target.spec, e)
+                    target = next_target()
+                    if target is not None:
+                        self._count(role, "failovers")
+                        launch(target)
+                    continue
+                stats = self.target_stats(role, target)
+                with stats._lock:
+                    stats.counters["wins"] += 1
+                close_losers()
+                if stream:
+                    first, rest = result
+                    return rest if first is _EMPTY else itertools.chain([first], rest)
+                return result
+            if not done and can_hedge and time.monotonic() >= hedge_at:
+                hedges += 1
+                # the same target again only when its breaker is closed (a half-open one has its probe in flight)
+                target = next_target()
+                if target is None and self.target_stats(role, newest_target).breaker.state == "closed":
+                    target = newest_target
+                if target is None:
+                    continue
+                self._count(role, "hedged")
+                with self.target_stats(role, target)._lock:
+                    self.target_stats(role, target).counters["hedges"] += 1
+                logger.info("%s: hedging with %s after %.2fs", role, target.spec, time.monotonic() - launched_at)
+                launch(target)
+
+        close_losers()
+        if inflight or time.monotonic() >= deadline:
+            self._count(role, "deadline_exceeded")
+            for target, _ in inflight.values():
+                self.target_stats(role, target).breaker.failure()
+            raise DeadlineExceeded(f"{role}: no answer within {cfg['deadline']}s ({'; '.join(errors) or 'slow'})")
+        self._count(role, "failed")
+        raise AllTargetsFailed(f"{role}: every target failed ({'; '.join(errors)})")
+
+    def stats(self):
+        with self._lock:
+            roles = {role: dict(counters) for role, counters in self.roles.items()}
+            targets = dict(self._targets)
+        for (role, spec), stats in targets.items():
+            roles.setdefault(role, {}).setdefault("targets", {})[spec] = stats.as_dict()
+        return roles
+
+
+def _close_stream(future):
+    if future.exception() is None:
+        _, rest = future.result()
+        close = getattr(rest, "close", None)
+        if close:
+            close()
+
+
+router = Router()
+call = router.call
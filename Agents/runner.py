@@ -0,0 +1,141 @@
+"""
+Runs graph turns on a bounded, process-wide worker pool.
+
+The Streamlit script thread only renders: `TurnRunner.stream()` submits the turn
+to a thread pool shared by every session (`[agents.runner] max_workers`) and yields
+the `graph.stream` events back through a queue as they are produced, so one
+learner waiting on a slow provider no longer holds up the others. Turns of the
+same chat (thread_id) are serialized, different chats run concurrently. A turn
+that produces nothing for `[agents.runner] turn_timeout` seconds raises
+`TimeoutError` in the page.
+"""
+import contextvars
+import logging
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from Agents import ratelimit
+from Agents.settings import setting
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class TurnRunner:
+
+    def __init__(self, graph, max_workers: int = 16, max_pending: int = 64):
+        self.graph = graph
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="graph-turn")
+        # admitted turns (running + queued), beyond this new turns wait before being submitted
+        self.slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._lock = threading.Lock()
+        # thread_id -> lock, an entry lives as long as a turn of the chat holds it
+        self._thread_locks = weakref.WeakValueDictionary()
+        self.counters = {"submitted": 0, "completed": 0, "failed": 0, "running": 0,
+                         "wait_seconds": 0.0, "run_seconds": 0.0}
+
+    def _thread_lock(self, thread_id):
+        with self._lock:
+            lock = self._thread_locks.get(thread_id)
+            if lock is None:
+                lock = self._thread_locks[thread_id] = threading.Lock()
+            return lock
+
+    def is_busy(self, thread_id) -> bool:
+        """A turn of the chat is running or waiting for the chat's lock."""
+        with self._lock:
+            return thread_id in self._thread_locks
+
+    def _run(self, events, state, config, stream_mode, submitted):
+        thread_lock = self._thread_lock(config["configurable"]["thread_id"])
+        try:
+            # provider calls of the turn queue as interactive, round robin with the other chats
+            with thread_lock, ratelimit.scheduling("interactive", session=config["configurable"]["thread_id"]):
+                started = time.perf_counter()
+                with self._lock:
+                    self.counters["running"] += 1
+                    self.counters["wait_seconds"] += started - submitted
+                try:
+                    for item in self.graph.stream(state, stream_mode=stream_mode, config=config):
+                        events.put(item)
+                finally:
+                    with self._lock:
+                        self.counters["running"] -= 1
+                        self.counters["run_seconds"] += time.perf_counter() - started
+            with self._lock:
+                self.counters["completed"] += 1
+            events.put(_DONE)
+        except BaseException as e:
+            with self._lock:
+                self.counters["failed"] += 1
+            events.put(e)
+        finally:
+            self.slots.release()
+
+    def submit(self, state, config, stream_mode=("values", "custom")):
+        """Start a turn in the pool, returns the queue its events are pushed to."""
+        self.slots.acquire()
+        events = queue.Queue()
+        with self._lock:
+            self.counters["submitted"] += 1
+        # the worker sees the caller's context variables
+        ctx = contextvars.copy_context()
+        try:
+            self.executor.submit(ctx.run, self._run, events, state, config, list(stream_mode), time.perf_counter())
+        except BaseException:
+            self.slots.release()
+            raise
+        return events
+
+    def stream(self, state, config, stream_mode=("values", "custom"), timeout: float = None):
+        """Same events as `graph.stream(state, stream_mode=[...], config=config)`, produced on a pool thread."""
+        events = self.submit(state, config, stream_mode)
+        timeout = timeout or setting("runner", "turn_timeout", 300.0)
+        while True:
+            try:
+                item = events.get(timeout=timeout)
+            except queue.Empty:
+                raise TimeoutError(f"The answer is taking longer than {timeout:g}s, please try again in a moment.") from None
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    def stats(self):
+        with self._lock:
+            out = dict(self.counters)
+        out["max_workers"] = self.max_workers
+        done = out["completed"] + out["failed"]
+        out["avg_wait_seconds"] = round(out["wait_seconds"] / done, 3) if done else 0.0
+        out["avg_run_seconds"] = round(out["run_seconds"] / done, 3) if done else 0.0
+        return out
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_runner() -> TurnRunner:
+    """The process-wide runner for the agent graph, shared by every session."""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            from Agents.graph import graph
+            _runner = TurnRunner(
+                graph,
+                max_workers=setting("runner", "max_workers", 16),
+                max_pending=setting("runner", "max_pending", 64),
+            )
+            logger.info("turn runner: %d workers", _runner.max_workers)
+        return _runner
+
+
+def is_busy(thread_id) -> bool:
+    """A turn of the chat is in the runner (False before the runner is started)."""
+    return _runner is not None and _runner.is_busy(thread_id)
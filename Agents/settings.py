@@ -0,0 +1,24 @@
+import os
+import streamlit as st
+
+
+def setting(section: str, key: str, default=None):
+    """
+    Read an optional tuning value.
+
+    Looked up (in order) from the env var `AGENTS_<SECTION>_<KEY>`, then from the
+    `[agents.<section>]` table in `.streamlit/secrets.toml`, then `default`.
+    Env values are cast to the type of `default` when one is given.
+    """
+    env = os.environ.get(f"AGENTS_{section}_{key}".upper())
+    if env is not None:
+        if isinstance(default, bool):
+            return env.strip().lower() in ("1", "true", "yes", "on")
+        if default is not None:
+            return type(default)(env)
+        return env
+    try:
+        return st.secrets["agents"][section][key]
+    except Exception:
+        # no secrets file / no such table -> keep the default
+        return default
@@ -0,0 +1,149 @@
+"""
+Speculative chat answers for the parallel graph mode (`[agents.graph] mode = "parallel"`).
+
+When the local classifier isn't sure, `parallel_classify` (Agents/components.py) runs the
+Groq classifier, the Arabic translation and a speculative chat answer at the same time.
+The speculative answer is buffered here until the chat node takes it (and streams it on),
+or cancelled when the classifier picks another intent. `stats` compares the critical-path
+time saved with the calls that were wasted.
+"""
+import logging
+import queue
+import threading
+import time
+import uuid
+
+from langchain_core.messages import message_chunk_to_message
+
+from Agents import routing, telemetry
+from Agents.footprint import footprint
+from Agents.streaming import message_text
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class Speculation:
+    """A chat answer generated ahead of the chat node, readable while it is still streaming."""
+
+    def __init__(self, summarized_upto):
+        self.id = uuid.uuid4().hex
+        self.summarized_upto = summarized_upto  # context the answer was built from
+        self.tokens = queue.Queue()
+        self.cancelled = threading.Event()
+        self.response = None
+        self.error = None
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def run(self, build_messages):
+        try:
+            messages = build_messages()
+            with telemetry.span("provider", "chat.speculative"):
+                stream = routing.call("chat", lambda target: target.client.stream(messages), stream=True)
+                for chunk in stream:
+                    if self.cancelled.is_set():
+                        # closing the stream drops the provider request
+                        getattr(stream, "close", lambda: None)()
+                        return
+                    self.tokens.put(message_text(chunk))
+                    self.response = chunk if self.response is None else self.response + chunk
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished = time.perf_counter()
+            self.tokens.put(_DONE)
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def stream(self, on_token, timeout: float = 120):
+        """Replay the buffered tokens and the rest as it arrives, returns the final message."""
+        while True:
+            token = self.tokens.get(timeout=timeout)
+            if token is _DONE:
+                break
+            if token:
+                on_token(token)
+        if self.error is not None:
+            raise self.error
+        return message_chunk_to_message(self.response) if self.response is not None else None
+
+
+class SpeculationStats:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {
+            "parallel_turns": 0,
+            "parallel_translations": 0,   # translation overlapped with the classifier
+            "wasted_translations": 0,     # translated, but the classifier said english
+            "speculations": 0,
+            "speculations_used": 0,
+            "speculations_cancelled": 0,  # classifier picked another intent
+            "speculations_discarded": 0,  # context changed (summary folded) or the answer failed
+            "saved_seconds": 0.0,         # critical-path time saved
+            "wasted_seconds": 0.0,        # provider time spent on discarded work
+        }
+
+    def add(self, **values):
+        with self._lock:
+            for key, value in values.items():
+                self.counters[key] += value
+
+    def as_dict(self):
+        with self._lock:
+            out = dict(self.counters)
+        out["saved_seconds"] = round(out["saved_seconds"], 3)
+        out["wasted_seconds"] = round(out["wasted_seconds"], 3)
+        wasted_calls = out["wasted_translations"] + out["speculations_cancelled"] + out["speculations_discarded"]
+        out["wasted_calls"] = wasted_calls
+        out["hit_rate"] = round(out["speculations_used"] / out["speculations"], 3) if out["speculations"] else 0.0
+        return out
+
+
+stats = SpeculationStats()
+
+_lock = threading.Lock()
+_pending = {}  # speculation id -> Speculation
+MAX_AGE = 300  # seconds an untaken speculation is kept (the turn failed before the chat node)
+footprint.component("speculation", lambda: list(_pending.values()))
+
+
+def register(spec: Speculation):
+    now = time.perf_counter()
+    with _lock:
+        for key, old in list(_pending.items()):
+            if now - old.started > MAX_AGE:
+                old.cancel()
+                del _pending[key]
+        _pending[spec.id] = spec
+    stats.add(speculations=1)
+
+
+def discard(spec: Speculation, reason: str):
+    """Cancel a speculation the turn won't use."""
+    spec.cancel()
+    with _lock:
+        _pending.pop(spec.id, None)
+    spent = (spec.finished or time.perf_counter()) - spec.started
+    stats.add(wasted_seconds=spent, **{f"speculations_{reason}": 1})
+    logger.info("speculative chat %s after %.2fs", reason, spent)
+
+
+def take(state):
+    """The speculation prepared for this turn, if it is still valid for the chat node's context."""
+    spec_id = state.get("speculation_id")
+    if not spec_id:
+        return None
+    with _lock:
+        spec = _pending.pop(spec_id, None)
+    if spec is None:
+        return None
+    if spec.summarized_upto != (state.get("summarized_upto") or 0) or spec.error is not None:
+        discard(spec, "discarded")
+        return None
+    # the chat call already ran for this long before the chat node needed it
+    stats.add(speculations_used=1, saved_seconds=(spec.finished or time.perf_counter()) - spec.started)
+    return spec
@@ -8,6 +8,8 @@ class State(TypedDict):
     
     language: str = None
     intent: str = None
+    classifier_confidence: Optional[float] = None
+    classified_by: Optional[str] = None # "local" or "groq"
     status_message : str = None # indcate current state 
     translated_input: Optional[str] = None
 
@@ -16,5 +18,13 @@ class State(TypedDict):
     fact_answer: Optional[str] = None
     chat_response : Optional[str] = None
 
+    # chat context window: rolling summary of the turns before `summarized_upto` (index in messages)
+    summary: Optional[str] = None
+    summarized_upto: Optional[int] = None
+    context_stats: Optional[dict] = None
+
+    # parallel mode: id of the speculative chat answer started with the classifier (Agents/speculation.py)
+    speculation_id: Optional[str] = None
+
     # final response
     final_output: str = None
@@ -0,0 +1,87 @@
+"""
+Token streaming helpers.
+
+Nodes push answer chunks through LangGraph's `custom` stream mode as
+`{"node": <name>, "token": <text>}` events (or `{"node": <name>, "reset": True}`
+when a node restarts its answer, e.g. after a tool call), so the page can
+render them as they arrive with `graph.stream(..., stream_mode=["values", "custom"])`.
+"""
+from langgraph.config import get_stream_writer
+
+
+def emit(node: str, token: str = "", reset: bool = False):
+    """Send a chunk to the page; a no-op when the graph isn't streaming custom events."""
+    try:
+        writer = get_stream_writer()
+    except RuntimeError:
+        # called outside of a graph run
+        return
+    if reset:
+        writer({"node": node, "reset": True})
+    if token:
+        writer({"node": node, "token": token})
+
+
+class ThinkFilter:
+    """Drops `<think>...</think>` blocks from a token stream, even when tags are split across chunks."""
+
+    OPEN, CLOSE = "<think>", "</think>"
+
+    def __init__(self):
+        self.buffer = ""
+        self.thinking = False
+
+    def feed(self, chunk: str) -> str:
+        self.buffer += chunk
+        out = ""
+        while self.buffer:
+            tag = self.CLOSE if self.thinking else self.OPEN
+            idx = self.buffer.find(tag)
+            if idx >= 0:
+                if not self.thinking:
+                    out += self.buffer[:idx]
+                self.buffer = self.buffer[idx + len(tag):]
+                self.thinking = not self.thinking
+                continue
+            # keep a possible partial tag at the end of the buffer for the next chunk
+            keep = 0
+            for n in range(min(len(tag) - 1, len(self.buffer)), 0, -1):
+                if tag.startswith(self.buffer[-n:]):
+                    keep = n
+                    break
+            if not self.thinking:
+                out += self.buffer[:len(self.buffer) - keep]
+            self.buffer = self.buffer[len(self.buffer) - keep:]
+            break
+        return out
+
+    def flush(self) -> str:
+        rest, self.buffer = ("" if self.thinking else self.buffer), ""
+        return rest
+
+
+def completion_chunks(stream):
+    """Yield the text deltas of a streamed HF / Groq style chat completion, without think blocks."""
+    think = ThinkFilter()
+    started = False
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content or ""
+        text = think.feed(delta)
+        if not started:
+            text = text.lstrip()
+            started = bool(text)
+        if text:
+            yield text
+    rest = think.flush()
+    if rest:
+        yield rest
+
+
+def message_text(chunk) -> str:
+    """Plain text of a LangChain message chunk (content can be a list of parts for Gemini)."""
+    content = chunk.content
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
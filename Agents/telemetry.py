@@ -0,0 +1,242 @@
+"""
+Timing spans for graph nodes and provider calls.
+
+    with telemetry.span("provider", "groq.classify") as s:
+        completion = ...
+        s["prompt_tokens"] = completion.usage.prompt_tokens
+
+Every finished span is
+  - logged as one JSON line on the `Agents.telemetry` logger (`[agents.telemetry] log_spans`),
+  - added to process-wide metrics, rendered in Prometheus text format by `render_prometheus()`,
+    written to `prometheus_file` and/or served on `prometheus_port` when configured,
+  - appended to the current turn (`with telemetry.turn() as spans:`), which the chat page
+    shows as a per-turn timing breakdown when `show_timings` is on.
+
+Cache lookups are recorded with `cache_event(name, hit)`, and `gauge(name, help, fn)` adds a
+value read at export time (queue depths, sizes).
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from Agents.settings import setting
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_turn = contextvars.ContextVar("telemetry_turn", default=None)
+_lock = threading.Lock()
+_durations = {}  # (kind, name) -> {"count", "sum", "errors", "buckets"}
+_tokens = {}     # (name, "prompt" | "completion") -> count
+_caches = {}     # name -> {"hits", "misses"}
+_gauges = {}     # metric name -> (help, fn)
+_exporter = None
+
+
+@contextmanager
+def turn():
+    """Collect the spans of one chat turn (also from the worker threads that inherit the context)."""
+    spans = []
+    token = _turn.set(spans)
+    try:
+        yield spans
+    finally:
+        _turn.reset(token)
+
+
+@contextmanager
+def span(kind: str, name: str, **attrs):
+    """Time a block; the yielded dict takes extra fields (prompt_tokens, completion_tokens, cache_hit, ...)."""
+    record = {"kind": kind, "name": name, **attrs}
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        record["ms"] = round((time.perf_counter() - start) * 1000, 1)
+        _finish(record)
+
+
+def traced_node(name: str, fn):
+    """Wrap a graph node function in a "node" span."""
+    @functools.wraps(fn)
+    def wrapper(state, *args, **kwargs):
+        with span("node", name):
+            return fn(state, *args, **kwargs)
+    return wrapper
+
+
+def _count_cache(name, hit):
+    with _lock:
+        counters = _caches.setdefault(name, {"hits": 0, "misses": 0})
+        counters["hits" if hit else "misses"] += 1
+
+
+def cache_event(name: str, hit: bool):
+    _count_cache(name, hit)
+    spans = _turn.get()
+    if spans is not None:
+        spans.append({"kind": "cache", "name": name, "cache_hit": hit, "ms": 0.0})
+
+
+def gauge(name: str, help: str, fn):
+    """Export `fn()` (a number, or {label: number} for an `agents_<name>{key="..."}` series) as a gauge."""
+    with _lock:
+        _gauges[name] = (help, fn)
+
+
+def estimate_tokens(text: str) -> int:
+    # same ~4 characters per token estimate as the context window
+    return len(text or "") // 4
+
+
+def _finish(record):
+    seconds = record["ms"] / 1000
+    with _lock:
+        stats = _durations.setdefault((record["kind"], record["name"]),
+                                      {"count": 0, "sum": 0.0, "errors": 0, "buckets": [0] * len(BUCKETS)})
+        stats["count"] += 1
+        stats["sum"] += seconds
+        stats["errors"] += 1 if record.get("error") else 0
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                stats["buckets"][i] += 1
+        for kind in ("prompt", "completion"):
+            if record.get(f"{kind}_tokens"):
+                key = (record["name"], kind)
+                _tokens[key] = _tokens.get(key, 0) + int(record[f"{kind}_tokens"])
+    if "cache_hit" in record:
+        _count_cache(record["name"], bool(record["cache_hit"]))
+    spans = _turn.get()
+    if spans is not None:
+        spans.append(record)
+    if setting("telemetry", "log_spans", True):
+        logger.info(json.dumps(record, ensure_ascii=False))
+    _ensure_exporter()
+
+
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def render_prometheus() -> str:
+    lines = [
+        "# HELP agents_span_seconds Latency of graph nodes and provider calls.",
+        "# TYPE agents_span_seconds histogram",
+    ]
+    with _lock:
+        durations = {k: dict(v, buckets=list(v["buckets"])) for k, v in _durations.items()}
+        tokens = dict(_tokens)
+        caches = {k: dict(v) for k, v in _caches.items()}
+        gauges = dict(_gauges)
+    for (kind, name), stats in sorted(durations.items()):
+        labels = f'kind="{_label(kind)}",name="{_label(name)}"'
+        for bound, count in zip(BUCKETS, stats["buckets"]):
+            lines.append(f'agents_span_seconds_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'agents_span_seconds_bucket{{{labels},le="+Inf"}} {stats["count"]}')
+        lines.append(f"agents_span_seconds_sum{{{labels}}} {stats['sum']:.6f}")
+        lines.append(f"agents_span_seconds_count{{{labels}}} {stats['count']}")
+    lines += ["# HELP agents_span_errors_total Spans that raised.", "# TYPE agents_span_errors_total counter"]
+    for (kind, name), stats in sorted(durations.items()):
+        lines.append(f'agents_span_errors_total{{kind="{_label(kind)}",name="{_label(name)}"}} {stats["errors"]}')
+    lines += ["# HELP agents_tokens_total Prompt and completion tokens per provider call.", "# TYPE agents_tokens_total counter"]
+    for (name, kind), count in sorted(tokens.items()):
+        lines.append(f'agents_tokens_total{{name="{_label(name)}",type="{kind}"}} {count}')
+    lines += ["# HELP agents_cache_requests_total Cache lookups by result.", "# TYPE agents_cache_requests_total counter"]
+    for name, counters in sorted(caches.items()):
+        lines.append(f'agents_cache_requests_total{{name="{_label(name)}",result="hit"}} {counters["hits"]}')
+        lines.append(f'agents_cache_requests_total{{name="{_label(name)}",result="miss"}} {counters["misses"]}')
+    for name, (help, fn) in sorted(gauges.items()):
+        try:
+            value = fn()
+        except Exception as e:
+            logger.warning("gauge %s failed: %r", name, e)
+            continue
+        lines += [f"# HELP agents_{name} {help}", f"# TYPE agents_{name} gauge"]
+        if isinstance(value, dict):
+            lines += [f'agents_{name}{{key="{_label(k)}"}} {v}' for k, v in sorted(value.items())]
+        else:
+            lines.append(f"agents_{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: str):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(tmp, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _ensure_exporter():
+    """Start the configured exporters once: a /metrics endpoint and/or a periodically rewritten file."""
+    global _exporter
+    if _exporter is not None:
+        return
+    with _lock:
+        if _exporter is not None:
+            return
+        _exporter = []
+    port = setting("telemetry", "prometheus_port", 0)
+    if port:
+        try:
+            # local only unless prometheus_host says otherwise, the spans describe every user's turns
+            host = setting("telemetry", "prometheus_host", "127.0.0.1")
+            server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=server.serve_forever, name="metrics-endpoint", daemon=True).start()
+            _exporter.append(server)
+            logger.info("prometheus metrics on %s:%d", host, port)
+        except OSError as e:
+            # another process (or Streamlit rerun) already serves it
+            logger.warning("metrics endpoint not started: %s", e)
+    path = setting("telemetry", "prometheus_file", "")
+    if path:
+        interval = setting("telemetry", "export_seconds", 15.0)
+
+        def run():
+            while True:
+                try:
+                    write_prometheus(path)
+                except OSError as e:
+                    logger.warning("could not write metrics file: %s", e)
+                time.sleep(interval)
+
+        threading.Thread(target=run, name="metrics-file", daemon=True).start()
+
+
+def breakdown(spans):
+    """Rows for the per-turn timing table: nodes and provider calls in the order they finished."""
+    rows = []
+    for s in spans:
+        tokens = ""
+        if s.get("prompt_tokens") or s.get("completion_tokens"):
+            tokens = f"{s.get('prompt_tokens') or 0} → {s.get('completion_tokens') or 0}"
+        rows.append({
+            "step": f"{s['kind']} · {s['name']}" + (f" ({s['error']})" if s.get("error") else ""),
+            "ms": s["ms"] if s["kind"] != "cache" else "",
+            "tokens": tokens,
+            "cache": "" if "cache_hit" not in s else ("hit" if s["cache_hit"] else "miss"),
+        })
+    return rows
@@ -0,0 +1,132 @@
+"""
+Arabic -> English translation with a translation memory.
+
+`Translator.translate` answers from a persistent LRU (`translation_memory`) first,
+looking up the exact text and then its normalized form (diacritics, tatweel,
+punctuation and extra whitespace removed), so stock phrases and greetings are
+translated once. Misses go to a local CPU MarianMT model when
+`[agents.translation] local_model = true` and transformers is installed, with the
+HF inference API as fallback (and as the only path otherwise).
+"""
+import logging
+import re
+import threading
+import time
+
+from Agents import providers, telemetry
+from Agents.cache import LRUCache
+from Agents.settings import setting
+
+logger = logging.getLogger(__name__)
+
+MODEL = "Helsinki-NLP/opus-mt-ar-en"
+
+# harakat, superscript alef and tatweel
+ARABIC_MARKS = re.compile(r"[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]")
+PUNCTUATION = re.compile(r"[^\w\s]|_")
+
+
+def normalize_arabic(text: str) -> str:
+    text = ARABIC_MARKS.sub("", text)
+    text = PUNCTUATION.sub(" ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class LocalMarian:
+    """opus-mt-ar-en on CPU through transformers."""
+
+    def __init__(self, model_name: str = MODEL):
+        from transformers import MarianMTModel, MarianTokenizer
+        self.tokenizer = MarianTokenizer.from_pretrained(model_name)
+        self.model = MarianMTModel.from_pretrained(model_name)
+        self.model.eval()
+
+    def translate(self, text: str) -> str:
+        batch = self.tokenizer([text], return_tensors="pt", truncation=True)
+        output = self.model.generate(**batch, max_new_tokens=256)
+        return self.tokenizer.decode(output[0], skip_special_tokens=True)
+
+
+class Translator:
+
+    def __init__(self):
+        self.memory = LRUCache(
+            "translation_memory",
+            max_size=setting("translation", "memory_size", 5000),
+            ttl=setting("translation", "ttl_hours", 24 * 90) * 3600,
+        )
+        self._lock = threading.Lock()
+        self.counters = {"requests": 0, "exact_hits": 0, "normalized_hits": 0, "local": 0, "remote": 0,
+                         "local_errors": 0, "miss_seconds": 0.0, "saved_seconds": 0.0}
+        self.local = None
+        if setting("translation", "local_model", False):
+            try:
+                self.local = LocalMarian(setting("translation", "model", MODEL))
+            except Exception as e:
+                # transformers / torch missing or the model can't be downloaded
+                logger.warning("local translation model unavailable, using the inference API: %r", e)
+
+    def _avg_miss_seconds(self):
+        misses = self.counters["local"] + self.counters["remote"]
+        return self.counters["miss_seconds"] / misses if misses else 0.0
+
+    def lookup(self, text: str):
+        exact = text.strip()
+        translation = self.memory.get(exact)
+        kind = "exact_hits"
+        if translation is None:
+            translation = self.memory.get("~" + normalize_arabic(text))
+            kind = "normalized_hits"
+        if translation is not None:
+            with self._lock:
+                self.counters[kind] += 1
+                # a hit saves what a miss costs on average
+                self.counters["saved_seconds"] += self._avg_miss_seconds()
+        telemetry.cache_event("translation_memory", translation is not None)
+        return translation
+
+    def translate_remote(self, text: str) -> str:
+        # shared client, its connections are pooled across turns (Agents/http_pool.py)
+        with telemetry.span("provider", "hf.translation", prompt_tokens=telemetry.estimate_tokens(text)) as span:
+            result = providers.get("hf_inference").translation(text, model=setting("translation", "model", MODEL))
+            span["completion_tokens"] = telemetry.estimate_tokens(result.translation_text)
+        return result.translation_text
+
+    def translate(self, text: str) -> str:
+        with self._lock:
+            self.counters["requests"] += 1
+        translation = self.lookup(text)
+        if translation is not None:
+            return translation
+
+        start = time.perf_counter()
+        source = "remote"
+        if self.local is not None:
+            try:
+                with telemetry.span("provider", "marian.translation"):
+                    translation = self.local.translate(text)
+                source = "local"
+            except Exception as e:
+                logger.warning("local translation failed, using the inference API: %r", e)
+                with self._lock:
+                    self.counters["local_errors"] += 1
+        if translation is None:
+            translation = self.translate_remote(text)
+        with self._lock:
+            self.counters[source] += 1
+            self.counters["miss_seconds"] += time.perf_counter() - start
+
+        self.memory.put(text.strip(), translation)
+        self.memory.put("~" + normalize_arabic(text), translation)
+        return translation
+
+    def stats(self):
+        with self._lock:
+            out = dict(self.counters)
+        hits = out["exact_hits"] + out["normalized_hits"]
+        out["hit_rate"] = round(hits / out["requests"], 3) if out["requests"] else 0.0
+        out["avg_miss_seconds"] = round(self._avg_miss_seconds(), 3)
+        out["miss_seconds"] = round(out["miss_seconds"], 3)
+        out["saved_seconds"] = round(out["saved_seconds"], 3)
+        out["backend"] = "local" if self.local is not None else "remote"
+        return out
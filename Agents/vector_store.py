@@ -0,0 +1,195 @@
+"""
+Retrieval backends for the RAG knowledge base (the `books` collection).
+
+`[agents.rag] backend` selects where `Rag` retrieves from:
+  - "cloud" (default): the Chroma Cloud collection (`chroma_books` provider);
+  - "chroma": an embedded `chromadb.PersistentClient` under `[agents.rag] path`;
+  - "npy": a memory-mapped float32 matrix of normalized embeddings plus a JSON file of
+    documents / metadata, searched with an exact cosine scan (the collection is a few
+    thousand chunks, a single matrix-vector product is well under a millisecond).
+
+The cloud collection is queried with the question text, so it is embedded by the
+collection's own embedding function. The local backends are queried with the local
+query embedding (`Agents/embeddings.py`) and refuse to start when their vectors have
+another dimension. Every backend records its latency.
+Run `python -m Agents.vector_store sync` to pull the cloud collection into the local backends.
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from Agents import telemetry
+from Agents.embeddings import embed
+from Agents.settings import setting
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "books"
+
+
+class LatencyStats:
+    """Per backend query latency over the last `window` queries."""
+
+    def __init__(self, backend: str, window: int = 1000):
+        self.backend = backend
+        self.samples = deque(maxlen=window)
+        self.queries = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.samples.append(seconds)
+            self.queries += 1
+        logger.info("retrieval (%s): %.1f ms", self.backend, seconds * 1000)
+
+    def as_dict(self):
+        with self._lock:
+            samples = sorted(self.samples)
+        if not samples:
+            return {"backend": self.backend, "queries": self.queries}
+        ms = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 2)
+        return {"backend": self.backend, "queries": self.queries, "p50_ms": ms(0.5), "p95_ms": ms(0.95),
+                "max_ms": round(samples[-1] * 1000, 2)}
+
+
+class ChromaStore:
+    """A Chroma collection, cloud or embedded."""
+
+    def __init__(self, collection, backend: str):
+        self.collection = collection
+        self.stats = LatencyStats(backend)
+
+    def query(self, text: str, embedding=None, n_results: int = 1):
+        """(documents, metadatas) of the nearest chunks."""
+        start = time.perf_counter()
+        with telemetry.span("provider", f"chroma.{self.stats.backend}"):
+            if self.stats.backend == "cloud":
+                # the collection embeds the text with the function it was built with
+                query = {"query_texts": [text]}
+            else:
+                query = {"query_embeddings": [[float(x) for x in (embedding if embedding is not None else embed(text))]]}
+            result = self.collection.query(**query, n_results=n_results, include=["documents", "metadatas"])
+        self.stats.record(time.perf_counter() - start)
+        return result["documents"][0], result["metadatas"][0]
+
+
+class NpyStore:
+    """Memory-mapped embeddings (`embeddings.npy`) plus `records.json` ({ids, documents, metadatas})."""
+
+    def __init__(self, path: str):
+        self.vectors = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+        with open(os.path.join(path, "records.json"), encoding="utf-8") as f:
+            records = json.load(f)
+        self.documents = records["documents"]
+        self.metadatas = records["metadatas"]
+        self.stats = LatencyStats("npy")
+
+    def query(self, text: str, embedding=None, n_results: int = 1):
+        if not len(self.vectors) or n_results <= 0:
+            return [], []
+        start = time.perf_counter()
+        with telemetry.span("provider", "npy.search"):
+            query = np.asarray(embedding if embedding is not None else embed(text), dtype=np.float32)
+            scores = self.vectors @ (query / (np.linalg.norm(query) + 1e-12))
+            n = min(n_results, len(scores))
+            top = np.argpartition(-scores, n - 1)[:n]
+            top = top[np.argsort(-scores[top])]
+        self.stats.record(time.perf_counter() - start)
+        return [self.documents[i] for i in top], [self.metadatas[i] for i in top]
+
+
+def local_path() -> str:
+    return setting("rag", "path", "kb")
+
+
+def open_local_chroma(path: str):
+    import chromadb
+    return chromadb.PersistentClient(path=os.path.join(path, "chroma"))
+
+
+def check_dimension(dim: int, backend: str):
+    """The local index must be searchable with the local query embeddings."""
+    local = len(embed("dimension check"))
+    if dim != local:
+        raise ValueError(f"the {backend} index has {dim}-d vectors but the local embedder makes {local}-d ones; "
+                         "use backend = \"cloud\" or rebuild the index with the local embedder")
+
+
+def make_store():
+    """Retrieval backend picked by `[agents.rag] backend`."""
+    from Agents import providers
+    backend = setting("rag", "backend", "cloud")
+    if backend == "npy":
+        store = NpyStore(os.path.join(local_path(), "npy"))
+        if len(store.vectors):
+            check_dimension(store.vectors.shape[1], backend)
+        return store
+    if backend == "chroma":
+        collection = open_local_chroma(local_path()).get_collection(name=COLLECTION)
+        sample = collection.peek(1)["embeddings"]
+        if sample is not None and len(sample):
+            check_dimension(len(sample[0]), backend)
+        return ChromaStore(collection, "chroma")
+    return ChromaStore(providers.get("chroma_books"), "cloud")
+
+
+def export_collection(collection, batch_size: int = 500):
+    """All ids, documents, metadatas and embeddings of a collection, fetched in pages."""
+    out = {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+    total = collection.count()
+    for offset in range(0, total, batch_size):
+        page = collection.get(include=["documents", "metadatas", "embeddings"], limit=batch_size, offset=offset)
+        for key in out:
+            out[key].extend(list(page[key]))
+        logger.info("exported %d/%d", len(out["ids"]), total)
+    return out
+
+
+def write_npy(data, path: str):
+    os.makedirs(path, exist_ok=True)
+    vectors = np.asarray(data["embeddings"], dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+    np.save(os.path.join(path, "embeddings.npy"), vectors)
+    with open(os.path.join(path, "records.json"), "w", encoding="utf-8") as f:
+        json.dump({"ids": data["ids"], "documents": data["documents"], "metadatas": data["metadatas"]}, f, ensure_ascii=False)
+
+
+def write_chroma(data, path: str, batch_size: int = 500):
+    client = open_local_chroma(path)
+    try:
+        client.delete_collection(COLLECTION)
+    except Exception:
+        pass  # first sync
+    collection = client.create_collection(COLLECTION, metadata={"hnsw:space": "cosine"})
+    for i in range(0, len(data["ids"]), batch_size):
+        collection.add(**{key: values[i:i + batch_size] for key, values in data.items()})
+
+
+def sync(targets=("chroma", "npy"), path: str = None):
+    """Pull the cloud `books` collection into the local backends."""
+    from Agents import providers
+    path = path or local_path()
+    data = export_collection(providers.get("chroma_books"))
+    if "npy" in targets:
+        write_npy(data, os.path.join(path, "npy"))
+    if "chroma" in targets:
+        write_chroma(data, path)
+    logger.info("synced %d chunks into %s (%s)", len(data["ids"]), path, ", ".join(targets))
+    return len(data["ids"])
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="RAG knowledge base tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sync_cmd = sub.add_parser("sync", help="pull the cloud collection into the local index")
+    sync_cmd.add_argument("--target", choices=["chroma", "npy", "all"], default="all")
+    sync_cmd.add_argument("--path", default=None, help="local index dir (default [agents.rag] path)")
+    args = parser.parse_args()
+    sync(("chroma", "npy") if args.target == "all" else (args.target,), args.path)
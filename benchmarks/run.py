@@ -0,0 +1,272 @@
+"""
+Offline end-to-end benchmark of the agent graph.
+
+Every external provider is replaced by a local stand-in (`benchmarks/stand_ins.py`)
+with seeded latency distributions and error rates, then the corpus of English and
+Arabic conversations (`benchmarks/corpus.jsonl`, every intent plus the grammar tool
+loop) is replayed through `graph.stream` at increasing concurrency, once per graph
+mode. The report has p50/p95/p99 per node, end to end and to the first streamed
+token, turns per second per concurrency level, tracemalloc memory growth and, for
+the parallel mode, the time saved against the speculative calls wasted, as JSON
+that can be diffed between commits. The corpus' grammar questions are also run
+through the RAG explainer with and without context compression, for the prompt
+tokens and generation latency of both.
+
+    python -m benchmarks.run --concurrency 1,4,16 --repeat 2 --out bench.json
+    python -m benchmarks.run --time-scale 0.1      # same shape, 10x faster
+    python -m benchmarks.run --profile slow.json   # {"groq": {"median_ms": 900, "error_rate": 0.05}, ...}
+    python -m benchmarks.run --modes sequential,parallel
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SYSTEM_PROMPT = "You are an English conversation partner."
+
+
+def percentiles(samples):
+    """p50/p95/p99/mean in milliseconds."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        "count": len(ordered),
+        "p50_ms": round(pick(0.50) * 1000, 1),
+        "p95_ms": round(pick(0.95) * 1000, 1),
+        "p99_ms": round(pick(0.99) * 1000, 1),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 1),
+    }
+
+
+def load_corpus(path):
+    conversations = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                conversations[row["conversation"]].append(row["text"])
+    return dict(conversations)
+
+
+def run_turn(graph, config, text, first):
+    """Stream one turn, returns {seconds, ttft, nodes: [(node, seconds)], error}."""
+    state = {"user_input": text, "messages": [{"role": "system", "content": SYSTEM_PROMPT}] if first else []}
+    start = last = time.perf_counter()
+    record = {"nodes": [], "ttft": None, "error": None}
+    try:
+        # "updates" arrive when a node finishes, the gap since the previous one is that node's time
+        for mode, chunk in graph.stream(state, stream_mode=["updates", "custom"], config=config):
+            now = time.perf_counter()
+            if mode == "custom":
+                if record["ttft"] is None and chunk.get("token"):
+                    record["ttft"] = now - start
+                continue
+            for node in chunk:
+                record["nodes"].append((node, now - last))
+            last = now
+    except Exception as e:
+        record["error"] = type(e).__name__
+    record["seconds"] = time.perf_counter() - start
+    return record
+
+
+def run_conversation(graph, thread_id, turns):
+    config = {"configurable": {"thread_id": thread_id}}
+    return [run_turn(graph, config, text, first=i == 0) for i, text in enumerate(turns)]
+
+
+def reset_caches(cache_dir):
+    """Fresh, empty caches so every concurrency level starts cold."""
+    from Agents import embeddings, providers
+    os.environ["AGENTS_CACHE_DIR"] = cache_dir
+    for name in ("translator", "rag", "grammar", "facts"):
+        providers.registry.reset(name)
+    embeddings._cache = None
+
+
+def run_level(graph, conversations, concurrency, repeat, mode):
+    jobs = [(f"bench-{mode}-c{concurrency}-{name}-{r}", turns) for r in range(repeat) for name, turns in conversations.items()]
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda job: run_conversation(graph, *job), jobs))
+    elapsed = time.perf_counter() - start
+
+    turns = [turn for conversation in results for turn in conversation]
+    ok = [t for t in turns if t["error"] is None]
+    nodes = defaultdict(list)
+    for t in ok:
+        for node, seconds in t["nodes"]:
+            nodes[node].append(seconds)
+    errors = defaultdict(int)
+    for t in turns:
+        if t["error"]:
+            errors[t["error"]] += 1
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        "concurrency": concurrency,
+        "turns": len(turns),
+        "failed": len(turns) - len(ok),
+        "errors": dict(sorted(errors.items())),
+        "seconds": round(elapsed, 2),
+        "turns_per_second": round(len(turns) / elapsed, 2),
+        "end_to_end": percentiles([t["seconds"] for t in ok]),
+        "first_token": percentiles([t["ttft"] for t in ok if t["ttft"] is not None]),
+        "nodes": {node: percentiles(samples) for node, samples in sorted(nodes.items())},
+        "memory": {"traced_kb": round(current / 1024), "peak_kb": round(peak / 1024)},
+    }
+
+
+def rag_comparison(conversations):
+    """Prompt tokens and generation latency of the grammar explanations with and without context compression."""
+    from Agents import fast_classifier
+    from Agents.Rag import Rag
+    questions = list(dict.fromkeys(text for turns in conversations.values() for text in turns
+                                   if fast_classifier.detect_intent(text)[0] == "grammar_question"))
+    out = {}
+    for name, compress in (("uncompressed", False), ("compressed", True)):
+        rag = Rag()
+        rag.compress = compress
+        for question in questions:
+            rag.generate_explanation(question)
+        out[name] = rag.stats()
+    return out
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=HERE, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def format_report(report):
+    lines = [f"commit {report['meta']['commit']}  seed {report['meta']['seed']}  time scale {report['meta']['time_scale']}"]
+    for mode, result in report["modes"].items():
+        lines.append(f"\n== {mode} ==")
+        for level in result["levels"]:
+            e2e = level["end_to_end"]
+            lines.append(
+                f"\nconcurrency {level['concurrency']:>3}: {level['turns']} turns, {level['failed']} failed, "
+                f"{level['turns_per_second']} turns/s, e2e p50 {e2e.get('p50_ms')} / p95 {e2e.get('p95_ms')} / "
+                f"p99 {e2e.get('p99_ms')} ms, memory +{level['memory']['growth_kb']} KB"
+            )
+            for node, p in level["nodes"].items():
+                lines.append(f"    {node:<30}{p['count']:>5}{p['p50_ms']:>10}{p['p95_ms']:>10}{p['p99_ms']:>10}")
+        spec = result["speculation"]
+        if spec["parallel_turns"]:
+            lines.append(
+                f"\nparallel fan-out: {spec['parallel_turns']} turns, saved {spec['saved_seconds']}s on the critical path, "
+                f"wasted {spec['wasted_calls']} calls / {spec['wasted_seconds']}s "
+                f"(speculations used {spec['speculations_used']}/{spec['speculations']})"
+            )
+        for role, counters in sorted(result["routing"].items()):
+            lines.append(
+                f"routing {role}: {counters.get('calls', 0)} calls, {counters.get('hedged', 0)} hedged, "
+                f"{counters.get('failovers', 0)} failovers, {counters.get('deadline_exceeded', 0)} over deadline, "
+                f"{counters.get('failed', 0)} failed"
+            )
+    rag = report.get("rag_context") or {}
+    if rag.get("compressed", {}).get("explanations"):
+        lines.append("\n== rag context ==")
+        for name, stats in rag.items():
+            lines.append(
+                f"{name:<14} context {stats['avg_context_tokens_after']:>7} tokens (of {stats['avg_context_tokens_before']}), "
+                f"prompt {stats['avg_prompt_tokens']:>7} tokens, first token {stats['avg_first_token_ms']} ms, "
+                f"generation {stats['avg_generation_ms']} ms"
+            )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="offline benchmark of the agent graph")
+    parser.add_argument("--corpus", default=os.path.join(HERE, "corpus.jsonl"))
+    parser.add_argument("--concurrency", default="1,4,16", help="comma separated concurrency levels")
+    parser.add_argument("--modes", default="sequential", help="comma separated graph modes (sequential, parallel)")
+    parser.add_argument("--repeat", type=int, default=2, help="times the corpus is replayed per level")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--time-scale", type=float, default=1.0, help="multiplier on every simulated delay")
+    parser.add_argument("--profile", default=None, help="JSON file overriding the stand-in latency profile")
+    parser.add_argument("--warm", action="store_true", help="keep caches between levels instead of starting cold")
+    parser.add_argument("--out", default=None, help="write the JSON report here")
+    args = parser.parse_args(argv)
+
+    cache_root = tempfile.mkdtemp(prefix="agents-bench-")
+    # isolated caches, no background probes, in-memory checkpoints
+    os.environ["AGENTS_CACHE_DIR"] = cache_root
+    os.environ["AGENTS_GRAMMAR_KEEP_WARM"] = "false"
+    os.environ["AGENTS_CHECKPOINT_BACKEND"] = "memory"
+    os.environ["AGENTS_RAG_BACKEND"] = "cloud"
+    os.environ["AGENTS_TRANSLATION_LOCAL_MODEL"] = "false"
+
+    from benchmarks import stand_ins
+    from Agents import routing, speculation
+    from Agents.graph import build_graph, memory
+
+    profile = None
+    if args.profile:
+        with open(args.profile, encoding="utf-8") as f:
+            profile = json.load(f)
+    latencies = stand_ins.install(profile, seed=args.seed, time_scale=args.time_scale)
+    conversations = load_corpus(args.corpus)
+
+    tracemalloc.start()
+    gc.collect()
+    baseline = tracemalloc.get_traced_memory()[0]
+    modes = {}
+    for mode in args.modes.split(","):
+        graph = build_graph(mode)
+        speculation.stats = speculation.SpeculationStats()
+        routing.router = routing.Router()
+        routing.call = routing.router.call
+        levels = []
+        for i, concurrency in enumerate(int(c) for c in args.concurrency.split(",")):
+            if not args.warm:
+                reset_caches(os.path.join(cache_root, f"{mode}-level{i}"))
+            level = run_level(graph, conversations, concurrency, args.repeat, mode)
+            level["memory"]["growth_kb"] = level["memory"]["traced_kb"] - round(baseline / 1024)
+            level["memory"]["checkpointer"] = memory.resident_size()
+            levels.append(level)
+            print(f"{mode} concurrency {concurrency}: {level['turns_per_second']} turns/s", file=sys.stderr)
+        modes[mode] = {"levels": levels, "speculation": speculation.stats.as_dict(), "routing": routing.router.stats()}
+    tracemalloc.stop()
+    rag_context = rag_comparison(conversations)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "seed": args.seed,
+            "time_scale": args.time_scale,
+            "repeat": args.repeat,
+            "conversations": len(conversations),
+            "corpus_turns": sum(len(t) for t in conversations.values()),
+            "warm": args.warm,
+            "python": sys.version.split()[0],
+            "profile": {name: dict(stand_ins.DEFAULT_PROFILE[name], **(profile or {}).get(name, {}))
+                        for name in sorted(stand_ins.DEFAULT_PROFILE)},
+            "provider_calls": {name: {"calls": l.calls, "errors": l.errors} for name, l in sorted(latencies.items())},
+        },
+        "modes": modes,
+        "rag_context": rag_context,
+    }
+    print(format_report(report))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True, ensure_ascii=False)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Local stand-ins for every external provider of the agent graph.
+
+Each stand-in sleeps for a latency drawn from a seeded log-normal distribution
+(`median_ms`, `sigma`, plus `prompt_token_ms` of prefill per prompt token) and
+fails with probability `error_rate`, so a benchmark
+run exercises the real nodes, caches and tool loop without touching the network.
+`install(profile, seed, time_scale)` registers them with `registry.override`.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace as NS
+
+import numpy as np
+from langchain_core.messages import AIMessageChunk, HumanMessage, ToolMessage
+
+from Agents import fast_classifier, providers
+
+# provider -> latency model; streamed providers also have a per token delay
+DEFAULT_PROFILE = {
+    "groq": {"median_ms": 350, "sigma": 0.35, "error_rate": 0.0},
+    "hf_inference": {"median_ms": 600, "sigma": 0.4, "error_rate": 0.0},
+    "hf": {"median_ms": 800, "sigma": 0.4, "error_rate": 0.0, "token_ms": 20, "prompt_token_ms": 0.8},
+    "chat_llm": {"median_ms": 500, "sigma": 0.35, "error_rate": 0.0, "token_ms": 15},
+    "chat_fallback": {"median_ms": 400, "sigma": 0.35, "error_rate": 0.0, "token_ms": 10},
+    "tavily": {"median_ms": 900, "sigma": 0.5, "error_rate": 0.0},
+    "chroma_books": {"median_ms": 250, "sigma": 0.3, "error_rate": 0.0},
+    "grammar_space": {"median_ms": 700, "sigma": 0.5, "error_rate": 0.0},
+    "embedder": {"median_ms": 15, "sigma": 0.2, "error_rate": 0.0},
+}
+
+# what the grammar stand-in fixes, the chat stand-in calls the tool when it sees one of these
+GRAMMAR_FIXES = {
+    "I goes": "I went",
+    "she go ": "she goes ",
+    "He don't": "He doesn't",
+    "I has": "I have",
+    "They was": "They were",
+    "more better": "better",
+}
+
+
+class StandInError(RuntimeError):
+    pass
+
+
+class Latency:
+    """Seeded log-normal latency with an error rate, thread-safe."""
+
+    def __init__(self, name, median_ms, sigma=0.4, error_rate=0.0, token_ms=0, prompt_token_ms=0, seed=0, time_scale=1.0):
+        self.name = name
+        self.median = median_ms / 1000
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.token = token_ms / 1000
+        self.prompt_token = prompt_token_ms / 1000
+        self.time_scale = time_scale
+        self.rng = random.Random(f"{seed}:{name}")
+        self._lock = threading.Lock()
+        self.calls = self.errors = 0
+
+    def wait(self):
+        with self._lock:
+            self.calls += 1
+            delay = self.rng.lognormvariate(0, self.sigma) * self.median
+            fail = self.rng.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        time.sleep(delay * self.time_scale)
+        if fail:
+            raise StandInError(f"{self.name}: simulated provider error")
+
+    def prefill(self, messages):
+        # longer prompts take longer to the first token
+        chars = sum(len(m["content"]) for m in messages or [])
+        time.sleep(chars / 4 * self.prompt_token * self.time_scale)
+
+    def tokens(self, text):
+        for word in re.findall(r"\S+\s*", text):
+            time.sleep(self.token * self.time_scale)
+            yield word
+
+
+def apply_fixes(text: str) -> str:
+    for wrong, right in GRAMMAR_FIXES.items():
+        text = text.replace(wrong, right)
+    return text
+
+
+class Groq:
+    """Classifier (JSON answer) and context summaries."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.chat = NS(completions=NS(create=self.create))
+
+    def create(self, messages, **kwargs):
+        self.latency.wait()
+        prompt = messages[-1]["content"]
+        match = re.search(r'User input: "(.*)"', prompt, flags=re.DOTALL)
+        if match:
+            guess = fast_classifier.classify(match.group(1))
+            content = f'<think>classifying</think>{{"language": "{guess["language"]}", "intent": "{guess["intent"]}"}}'
+        else:
+            content = "The learner talked about their day and hobbies."
+        return NS(choices=[NS(message=NS(content=content))])
+
+
+class HFInference:
+    """opus-mt translation endpoint."""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def translation(self, text, model=None):
+        self.latency.wait()
+        return NS(translation_text=f"hello, how are you? ({len(text)} chars)")
+
+
+class HFChat:
+    """Streamed SmolLM3 completions (RAG explanations)."""
+
+    ANSWER = ("<think>let me think</think>Use 'an' before words that start with a vowel sound and 'a' before "
+              "words that start with a consonant sound, for example an hour and a university.")
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.chat = NS(completions=NS(create=self.create))
+
+    def create(self, model=None, messages=None, stream=False, **kwargs):
+        self.latency.wait()
+        self.latency.prefill(messages)
+        if not stream:
+            return NS(choices=[NS(message=NS(content=self.ANSWER))])
+        return (NS(choices=[NS(delta=NS(content=token))]) for token in self.latency.tokens(self.ANSWER))
+
+
+class ChatLLM:
+    """Tool-bound chat model: calls the grammar tool on known mistakes, otherwise streams a reply."""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def stream(self, messages, **kwargs):
+        self.latency.wait()
+        last = messages[-1]
+        if isinstance(last, ToolMessage):
+            text = f'It would be better to say: "{last.content}" That sounds like a nice day, tell me more!'
+        else:
+            said = last.content if isinstance(last, HumanMessage) else ""
+            if any(wrong in said for wrong in GRAMMAR_FIXES):
+                yield AIMessageChunk(content="", tool_call_chunks=[{
+                    "name": "get_grammar_correction", "args": json.dumps({"statment": said}),
+                    "id": "call_" + hashlib.md5(said.encode()).hexdigest()[:8], "index": 0}])
+                return
+            text = "That's interesting! What else do you enjoy doing in your free time?"
+        for token in self.latency.tokens(text):
+            yield AIMessageChunk(content=token)
+
+
+class Tavily:
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def search(self, query, max_results=1, **kwargs):
+        self.latency.wait()
+        return {"results": [{"content": f"Simulated answer for: {query}", "url": "https://example.com"}] * max_results}
+
+
+class Collection:
+    """Chroma `books` collection: overlapping textbook-sized chunks, like the real index returns."""
+
+    CHUNKS = [
+        ("Unit 69. A and an. We use a before a consonant sound: a car, a house, a university, a one-way street. "
+         "We use an before a vowel sound: an apple, an hour, an honest man, an MP. It is the sound that matters, "
+         "not the letter: a European country, an X-ray. A/an is used with singular countable nouns only. "
+         "We do not use a/an with plural or uncountable nouns: some water, not a water. "
+         "Compare: I need a new job. I need some information.", "english_grammar_in_use.pdf"),
+        ("It is the sound that matters, not the letter: a European country, an X-ray. Unit 70. The. "
+         "We use the when it is clear which thing or person we mean. Can you close the window, please? "
+         "We say the sun, the moon, the world, the sky, the sea. We use the before same: the same time. "
+         "Exercises. Put in a, an or the where necessary.", "english_grammar_in_use.pdf"),
+        ("Present perfect and past simple. We use the present perfect (have done) for a time that continues "
+         "until now: I have lived here for ten years. We use the past simple (did) for a finished time in the past: "
+         "I lived in Paris for two years (I don't live there now). Do not use the present perfect with a finished "
+         "time: I saw him yesterday, not I have seen him yesterday. Compare: Have you seen Anna this morning? "
+         "(it is still morning) Did you see Anna this morning? (it is now afternoon)", "practical_english_usage.pdf"),
+        ("Modal verbs. Can, could and be able to are used for ability. Must and have to are used for obligation. "
+         "Questions with how long often use the present perfect continuous: How long have you been waiting? "
+         "Time expressions such as yesterday, last week and in 2010 go with the past simple.", "practical_english_usage.pdf"),
+    ]
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def query(self, query_embeddings=None, query_texts=None, n_results=1, include=None):
+        self.latency.wait()
+        chunks = (self.CHUNKS * (n_results // len(self.CHUNKS) + 1))[:n_results]
+        return {"documents": [[c for c, _ in chunks]], "metadatas": [[{"file_name": book} for _, book in chunks]],
+                "distances": [[0.1 + 0.05 * i for i in range(n_results)]]}
+
+
+class Embedder:
+    """Deterministic 384-d embeddings (hash seeded), same interface as chroma's embedding functions."""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def __call__(self, texts):
+        self.latency.wait()
+        out = []
+        for text in texts:
+            seed = int(hashlib.md5(text.encode()).hexdigest()[:8], 16)
+            out.append(np.random.default_rng(seed).normal(size=384).astype(np.float32))
+        return out
+
+
+class GrammarSpace:
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def predict(self, sentence, api_name=None):
+        self.latency.wait()
+        return "Corrected: " + apply_fixes(sentence)
+
+
+STAND_INS = {
+    "groq": Groq,
+    "hf_inference": HFInference,
+    "hf": HFChat,
+    "chat_llm": ChatLLM,
+    "chat_fallback": ChatLLM,
+    "tavily": Tavily,
+    "chroma_books": Collection,
+    "grammar_space": GrammarSpace,
+    "embedder": Embedder,
+}
+
+
+def install(profile=None, seed: int = 0, time_scale: float = 1.0):
+    """Override every external provider with a stand-in, returns {name: Latency}."""
+    latencies = {}
+    for name, cls in STAND_INS.items():
+        spec = dict(DEFAULT_PROFILE[name], **(profile or {}).get(name, {}))
+        latencies[name] = Latency(name, seed=seed, time_scale=time_scale, **spec)
+        providers.registry.override(name, cls(latencies[name]))
+    return latencies
@@ -2,14 +2,204 @@ import firebase_admin
 from firebase_admin import credentials, firestore
 from google.cloud.firestore_v1.base_query import FieldFilter
 import streamlit as st
-from datetime import datetime
+from datetime import datetime, timezone
 import random
 import string
+import sys
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict
+from Agents import telemetry
+from Agents.footprint import footprint
+from Agents.settings import setting
 from langchain_core.messages import messages_to_dict, messages_from_dict, SystemMessage
 from langchain_core.messages import (
     BaseMessage, SystemMessage, AIMessage, HumanMessage
 )
 
+logger = logging.getLogger(__name__)
+
+
+class WriteBehind:
+    """
+    Background writer for chat updates, so firestore writes leave the reply path.
+
+    `submit` keeps only the latest update per chat (an update stores every message that isn't
+    stored yet, so it covers the earlier ones), a single worker commits the queued chats together
+    in batched writes and a chat is never written by two flushes at once, so its writes stay in
+    order. A chat whose update fails (building it or writing it) is retried with exponential
+    backoff until it is stored or a newer update replaces it, in a batch of its own so it can't keep
+    failing the other chats'; after `max_retries` failed attempts it is listed in `failed` so the
+    page can tell the learner. The worker only touches a `DataBase`'s `counts`, under its lock. `flush()` waits until everything
+    queued (or one chat / one user's chats) is stored.
+    """
+
+    def __init__(self, linger: float = 0.2, retry_seconds: float = 2.0, max_retries: int = 5, max_backoff: float = 60.0):
+        self.linger = linger
+        self.retry_seconds = retry_seconds
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self._cond = threading.Condition()
+        self._pending = OrderedDict()  # chat path -> {"db", "chat_id", "snapshot", "queued_at", "attempts", "due"}
+        self._writing = set()  # chat paths of the flush in progress
+        self.failed = {}  # chat path -> last error, for updates not stored after max_retries attempts
+        self._thread = None
+        self.counters = {"submitted": 0, "coalesced": 0, "flushes": 0, "chats_written": 0, "writes": 0, "failures": 0,
+                         "max_depth": 0, "flush_seconds": 0.0, "max_flush_seconds": 0.0, "lag_seconds": 0.0, "max_lag_seconds": 0.0}
+
+    def submit(self, db, chat_id, snapshot):
+        key = db.chats.document(chat_id).path
+        with self._cond:
+            self.counters["submitted"] += 1
+            old = self._pending.pop(key, None)
+            if old is not None:
+                self.counters["coalesced"] += 1
+                if snapshot["summary"] is None:
+                    snapshot = dict(snapshot, summary=old["snapshot"]["summary"], summarized_upto=old["snapshot"]["summarized_upto"])
+            # a chat that keeps failing stays on its backoff
+            self._pending[key] = {"db": db, "chat_id": chat_id, "snapshot": snapshot,
+                                  "queued_at": old["queued_at"] if old else time.monotonic(),
+                                  "attempts": old["attempts"] if old else 0, "due": old["due"] if old else 0.0}
+            self.counters["max_depth"] = max(self.counters["max_depth"], len(self._pending))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    due = min((job["due"] for job in self._pending.values()), default=None)
+                    if due is not None and due <= time.monotonic():
+                        break
+                    self._cond.wait(None if due is None else due - time.monotonic())
+            # let updates of other sessions join this batch
+            time.sleep(self.linger)
+            with self._cond:
+                now = time.monotonic()
+                jobs = [(key, job) for key, job in self._pending.items() if job["due"] <= now]
+                for key, _ in jobs:
+                    del self._pending[key]
+                self._writing = {key for key, _ in jobs}
+            try:
+                self._flush(jobs)
+            finally:
+                with self._cond:
+                    self._writing = set()
+                    self._cond.notify_all()
+
+    def _flush(self, jobs):
+        plans = []
+        for key, job in jobs:
+            try:
+                # reads the chat document (and migrates legacy chats), so it can fail like the write
+                chat_ops, counts = job["db"].chat_ops(job["chat_id"], **job["snapshot"])
+            except Exception as e:
+                logger.warning("building the update of chat %s failed, retrying: %r", job["chat_id"], e)
+                with self._cond:
+                    self._retry(key, job, e)
+                continue
+            plans.append((key, job, chat_ops, counts))
+        # chats that failed before are written on their own, so one bad chat can't keep failing the others' batch
+        fresh = [plan for plan in plans if not plan[1]["attempts"]]
+        for group in ([fresh] if fresh else []) + [[plan] for plan in plans if plan[1]["attempts"]]:
+            self._write(group)
+
+    def _write(self, plans):
+        ops = [op for _, _, chat_ops, _ in plans for op in chat_ops]
+        start = time.monotonic()
+        try:
+            # every session shares the default firebase app, one client commits all chats
+            with telemetry.span("firestore", "write_behind_flush", chats=len(plans)):
+                plans[0][1]["db"].write_batched(ops)
+        except Exception as e:
+            logger.warning("write-behind flush of %d chats failed, retrying: %r", len(plans), e)
+            with self._cond:
+                for key, job, _, _ in plans:
+                    self._retry(key, job, e)
+            return
+        now = time.monotonic()
+        for key, job, _, counts in plans:
+            job["db"].set_counts(job["chat_id"], counts)
+        with self._cond:
+            for key, _, _, _ in plans:
+                self.failed.pop(key, None)
+            c = self.counters
+            c["flushes"] += 1
+            c["chats_written"] += len(plans)
+            c["writes"] += len(ops)
+            c["flush_seconds"] += now - start
+            c["max_flush_seconds"] = max(c["max_flush_seconds"], now - start)
+            for _, job, _, _ in plans:
+                c["lag_seconds"] += now - job["queued_at"]
+                c["max_lag_seconds"] = max(c["max_lag_seconds"], now - job["queued_at"])
+
+    def _retry(self, key, job, error):
+        """Queue a failed update again after its backoff (caller holds `_cond`)."""
+        self.counters["failures"] += 1
+        job["attempts"] += 1
+        if job["attempts"] >= self.max_retries:
+            if key not in self.failed:
+                logger.error("chat %s is still not stored after %d attempts, retrying: %r", job["chat_id"], job["attempts"], error)
+            self.failed[key] = str(error) or type(error).__name__
+        newer = self._pending.get(key)
+        if newer is not None:
+            # a newer update of the same chat covers this one's messages, it keeps the summary and the backoff
+            if newer["snapshot"]["summary"] is None:
+                newer["snapshot"] = dict(newer["snapshot"], summary=job["snapshot"]["summary"],
+                                         summarized_upto=job["snapshot"]["summarized_upto"])
+            newer["attempts"] = max(newer["attempts"], job["attempts"])
+            return
+        job["due"] = time.monotonic() + min(self.max_backoff, self.retry_seconds * 2 ** (job["attempts"] - 1))
+        self._pending[key] = job
+        self._pending.move_to_end(key, last=False)
+        self._cond.notify_all()
+
+    def _busy(self, keys=None):
+        if keys is None:
+            return bool(self._pending or self._writing)
+        return any(key in self._pending or key in self._writing for key in keys)
+
+    def flush(self, timeout: float = None, keys=None) -> bool:
+        """Wait until the queued updates (of the chat paths in `keys`, or all) are stored; False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._busy(keys):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stats(self):
+        with self._cond:
+            out = dict(self.counters)
+            out["depth"] = len(self._pending)
+            out["writing"] = len(self._writing)
+            out["failing"] = len(self.failed)
+        flushes, chats = out["flushes"], out["chats_written"]
+        out["avg_flush_seconds"] = round(out.pop("flush_seconds") / flushes, 3) if flushes else 0.0
+        out["avg_lag_seconds"] = round(out.pop("lag_seconds") / chats, 3) if chats else 0.0
+        out["max_flush_seconds"] = round(out["max_flush_seconds"], 3)
+        out["max_lag_seconds"] = round(out["max_lag_seconds"], 3)
+        return out
+
+
+write_behind = WriteBehind(
+    linger=setting("persistence", "linger_ms", 200) / 1000,
+    retry_seconds=setting("persistence", "retry_seconds", 2.0),
+    max_retries=setting("persistence", "max_retries", 5),
+    max_backoff=setting("persistence", "max_backoff_seconds", 60.0),
+)
+telemetry.gauge("write_behind_depth", "Chats with an update waiting to be stored.", lambda: write_behind.stats()["depth"])
+footprint.component("write_behind", lambda: [job["snapshot"] for job in list(write_behind._pending.values())])
+# pending chat updates are stored before the process exits
+atexit.register(lambda: write_behind.flush(timeout=setting("persistence", "flush_timeout", 10.0)))
+
+
 class DataBase: 
     chat_bot_sys_prompt = '''
             You are an English conversation partner.
@@ -35,7 +225,13 @@ class DataBase:
             st.session_state.app = firebase_admin.initialize_app(cred)
         self.db = firestore.client()
         self.current_user = None
+        self.user_ref = None
         self.chats = None
+        self.index = {}  # chat_id -> {title, created_at, updated_at}
+        self.counts = {}  # chat_id -> (stored hist length, stored chat_bot_hist length)
+        self._counts_lock = threading.Lock()  # `counts` is also updated by the write_behind worker
+        self.cache = {}  # chat_id -> {"hist", "bot", "reads"}
+        self.cache_stats = {"hits": 0, "misses": 0, "reads_avoided": 0}
 
     def ensure_lc_message(self, m):
         if isinstance(m, BaseMessage):
@@ -61,10 +257,12 @@ class DataBase:
             data = doc.to_dict() # only the main data doesn't get the chats collection
             if password_ == data['password']:
                 self.current_user = username_
+                self.user_ref = doc_ref
                 self.chats = doc_ref.collection("chats")
+                self.load_index(data)
                 st.session_state.user_id = username_
                 st.session_state.user_data = data
-                st.session_state.user_chats = self.chats.get()
+                st.session_state.user_chats = self.chat_list()
                 st.session_state.state = "hello"
                 return True
             else:
@@ -87,14 +285,11 @@ class DataBase:
                 self.db.collection("users").document(username).set(data)
                 self.current_user = username
                 ref = self.db.collection("users").document(username)
-                self.chats  = ref.collection("chats").document(self.generate_unique_id())
-                self.chats.set({
-                    "title": "first chat",
-                    "chat_bot_hist":messages_to_dict([SystemMessage(content=self.chat_bot_sys_prompt)]),
-                    "hist": []
-                },  merge=True )
+                self.user_ref = ref
                 self.chats = ref.collection("chats")
-                st.session_state.user_chats = self.chats.get()
+                self.index = {}
+                self.create_chat("first chat")
+                st.session_state.user_chats = self.chat_list()
                 st.session_state.user_id = username
                 st.session_state.user_data = data
                 st.session_state.state = "hello"
@@ -104,26 +299,185 @@ class DataBase:
                 return False
 
 
+    # Chat index: a compact {chat_id: {title, created_at, updated_at}} map kept in the user document,
+    # so login and navigation never download the chats themselves (the login already reads that document).
+    def load_index(self, user_data):
+        index = user_data.get("chat_index")
+        if index is None:
+            # older accounts: build it once from a projection query (no message history is downloaded)
+            index = {}
+            for doc in self.chats.select(["title", "updated_at"]).get():
+                data = doc.to_dict()
+                index[doc.id] = {"title": data.get("title", "New Chat"), "created_at": data.get("updated_at"), "updated_at": data.get("updated_at")}
+            self.user_ref.set({"chat_index": index}, merge=True)
+        self.index = index
+
+    def chat_list(self):
+        """[{id, title, updated_at}] in creation order, used to build the sidebar pages."""
+        entries = [{"id": chat_id, "title": entry["title"], "updated_at": entry.get("updated_at")} for chat_id, entry in self.index.items()]
+        epoch = datetime.min.replace(tzinfo=timezone.utc)
+        return sorted(entries, key=lambda e: (self.index[e["id"]].get("created_at") or epoch, e["id"]))
+
+    def index_op(self, chat_id, **fields):
+        """Write op updating one index entry, committed in the same batch as the chat itself."""
+        self.index.setdefault(chat_id, {}).update(fields)
+        return (self.user_ref, {"chat_index": {chat_id: fields}})
+
+    # Chat storage layout (v2):
+    #   chats/{chat_id}                      -> title, updated_at, layout, hist_len, bot_len
+    #   chats/{chat_id}/hist/{seq}           -> {seq, role, content}      (UI history)
+    #   chats/{chat_id}/chat_bot_hist/{seq}  -> {seq, message}            (messages_to_dict entry)
+    # each turn only appends the new messages, so write cost no longer grows with the chat length.
+    # legacy chats keep `hist` / `chat_bot_hist` arrays in the chat document until migrated.
+    LAYOUT = 2
+    BATCH_LIMIT = 500  # firestore max writes per batch
+
+    def seq_id(self, seq):
+        return f"{seq:08d}"
+
+    def chat_doc(self, id):
+        doc = self.chats.document(id).get()
+        data = doc.to_dict() or {}
+        if data.get("layout") == self.LAYOUT:
+            # what our own writes stored wins, the document may be read while an update is queued
+            self.set_counts(id, (data.get("hist_len", 0), data.get("bot_len", 0)), overwrite=False)
+        return data
+
+    def get_counts(self, id):
+        with self._counts_lock:
+            return self.counts.get(id)
+
+    def set_counts(self, id, counts, overwrite=True):
+        with self._counts_lock:
+            if overwrite or id not in self.counts:
+                self.counts[id] = counts
+
+    def read_messages(self, id, kind):
+        docs = self.chats.document(id).collection(kind).order_by("seq").stream()
+        return [doc.to_dict() for doc in docs]
+
+    def read_page(self, id, kind, before=None, limit=None):
+        """The `limit` messages before sequence number `before` (default: the newest), oldest first."""
+        query = self.chats.document(id).collection(kind)
+        if before is not None:
+            query = query.where(filter=FieldFilter("seq", "<", before))
+        docs = query.order_by("seq", direction=firestore.Query.DESCENDING).limit(limit or self.page_size()).stream()
+        return [doc.to_dict() for doc in docs][::-1]
+
+    def page_size(self):
+        return setting("history", "page_size", 30)
+
+    # read-through / write-through cache of the chats opened in this session, so a
+    # streamlit rerun with no new message costs zero database reads.
+    # only the newest page of `hist` is loaded (`hist_offset` is the seq of its first message),
+    # older pages on demand (`load_older`) and `chat_bot_hist` when the agent memory needs it
+    def load_chat(self, id):
+        if id in self.cache:
+            entry = self.cache[id]
+            self.cache_stats["hits"] += 1
+            self.cache_stats["reads_avoided"] += entry["reads"]
+            telemetry.cache_event("chat_cache", True)
+            return entry
+        self.cache_stats["misses"] += 1
+        telemetry.cache_event("chat_cache", False)
+        # a queued update of this chat is stored before it is read back
+        write_behind.flush(timeout=setting("persistence", "flush_timeout", 10.0), keys=[self.chats.document(id).path])
+        with telemetry.span("firestore", "load_chat") as span:
+            data = self.chat_doc(id)
+            if data.get("layout") != self.LAYOUT:
+                hist, offset, bot, reads = data["hist"], 0, messages_from_dict(data["chat_bot_hist"]), 1
+            else:
+                page = self.read_page(id, "hist")
+                hist = [{"role": m["role"], "content": m["content"]} for m in page]
+                offset = page[0]["seq"] if page else data.get("hist_len", 0)
+                bot = None
+                reads = 1 + len(hist)  # firestore bills one read per document
+            span["reads"] = reads
+        entry = {"hist": hist, "hist_offset": offset, "bot": bot, "reads": reads,
+                 "summary": data.get("summary"), "summarized_upto": data.get("summarized_upto")}
+        self.cache[id] = entry
+        return entry
+
+    def load_older(self, id, limit=None):
+        """Prepend the page before the loaded messages, returns how many were loaded."""
+        entry = self.load_chat(id)
+        if entry["hist_offset"] <= 0:
+            return 0
+        with telemetry.span("firestore", "load_older") as span:
+            page = self.read_page(id, "hist", before=entry["hist_offset"], limit=limit)
+            span["reads"] = len(page)
+        entry["hist"] = [{"role": m["role"], "content": m["content"]} for m in page] + entry["hist"]
+        entry["hist_offset"] = page[0]["seq"] if page else 0
+        entry["reads"] += len(page)
+        return len(page)
+
+    def invalidate(self, id=None):
+        if id is None:
+            self.cache.clear()
+        else:
+            self.cache.pop(id, None)
+
     def get_chat(self, id):
-        return self.chats.document(id).get().to_dict()["hist"]
+        """The whole UI history (loads every older page)."""
+        while self.load_older(id, limit=self.BATCH_LIMIT):
+            pass
+        # copies, the page appends to the returned lists
+        return list(self.load_chat(id)["hist"])
+
+    def get_chat_page(self, id):
+        """(loaded messages, seq of the first one): the newest page plus the older pages loaded so far."""
+        entry = self.load_chat(id)
+        return list(entry["hist"]), entry["hist_offset"]
     
     def get_chat_bot_msgs(self, id):
-        msgs = self.chats.document(id).get().to_dict()["chat_bot_hist"]
-        return messages_from_dict(msgs)
+        entry = self.load_chat(id)
+        if entry["bot"] is None:
+            with telemetry.span("firestore", "load_chat_bot_hist") as span:
+                bot = [m["message"] for m in self.read_messages(id, "chat_bot_hist")]
+                span["reads"] = len(bot)
+            entry["bot"] = messages_from_dict(bot)
+            entry["reads"] += len(bot)
+            # every chat starts with the same system prompt, keep one copy of it per process
+            for m in entry["bot"]:
+                if isinstance(m, SystemMessage) and isinstance(m.content, str):
+                    m.content = sys.intern(m.content)
+        return list(entry["bot"])
+
+    def get_chat_summary(self, id):
+        """(summary, summarized_upto) of the chat agent's context window."""
+        entry = self.load_chat(id)
+        return entry.get("summary"), entry.get("summarized_upto")
     
     
+    def create_chat(self, title):
+        chat_id = self.generate_unique_id()
+        ref = self.chats.document(chat_id)
+        now = datetime.now(timezone.utc)
+        self.write_batched([
+            (ref, {
+                "title": title,
+                "updated_at": now,
+                "layout": self.LAYOUT,
+                "hist_len": 0,
+                "bot_len": 1,
+            }),
+            (ref.collection("chat_bot_hist").document(self.seq_id(0)), {
+                "seq": 0,
+                "message": messages_to_dict([SystemMessage(content=self.chat_bot_sys_prompt)])[0],
+            }),
+            self.index_op(chat_id, title=title, created_at=now, updated_at=now),
+        ])
+        self.set_counts(chat_id, (0, 1))
+        self.cache[chat_id] = {"hist": [], "hist_offset": 0, "bot": [SystemMessage(content=self.chat_bot_sys_prompt)], "reads": 2}
+        return chat_id
+
     def add_chat(self, title = "New Chat"):
        
-        chats = self.chats.document(self.generate_unique_id())
-        chats.set({
-            "title": title,
-            "chat_bot_hist": messages_to_dict([SystemMessage(content=self.chat_bot_sys_prompt)]),
-            "hist": []
-        },  merge=True )
-        st.session_state.user_chats = self.chats.get()
-    
-    def update_chat(self, chat_id, chat , chat_bot_hist):
-        chats = self.chats.document(chat_id)
+        self.create_chat(title)
+        # the index is already up to date, no need to download the chats again
+        st.session_state.user_chats = self.chat_list()
+
+    def to_safe_messages(self, chat_bot_hist):
         fixed = []
         for m in chat_bot_hist:
             if hasattr(m, "model_dump"):
@@ -131,17 +485,124 @@ class DataBase:
             else:
                 # Convert dict → LC Message
                 fixed.append(self.ensure_lc_message(m))
+        return messages_to_dict(fixed)
 
-        safe_messages = messages_to_dict(fixed)
-        # print(safe_messages)
-        # print("\n\n", chat, "\n\n")
+    def write_batched(self, ops):
+        """Commit (ref, data) set operations in as few batches as firestore allows, in order."""
+        with telemetry.span("firestore", "write_batched", writes=len(ops)):
+            for start in range(0, len(ops), self.BATCH_LIMIT):
+                batch = self.db.batch()
+                for ref, data in ops[start:start + self.BATCH_LIMIT]:
+                    if data is None:
+                        batch.delete(ref)
+                    else:
+                        batch.set(ref, data, merge=True)
+                batch.commit()
 
-        chats.set({
-            "chat_bot_hist":safe_messages,
-            "hist": chat
-        },  merge=True )
-        
-    
+    def message_ops(self, ref, hist, bot_dicts, hist_start, bot_start):
+        ops = []
+        for i, m in enumerate(hist):
+            seq = hist_start + i
+            ops.append((ref.collection("hist").document(self.seq_id(seq)), {"seq": seq, "role": m["role"], "content": m["content"]}))
+        for i, m in enumerate(bot_dicts):
+            seq = bot_start + i
+            ops.append((ref.collection("chat_bot_hist").document(self.seq_id(seq)), {"seq": seq, "message": m}))
+        return ops
+
+    def update_chat(self, chat_id, chat , chat_bot_hist, summary=None, summarized_upto=None, hist_offset=0):
+        """
+        Append the messages of `chat` / `chat_bot_hist` that are not stored yet.
+        `chat` may be a window of the UI history starting at seq `hist_offset` (see `get_chat_page`).
+        `summary` / `summarized_upto` is the chat agent's rolling context summary, stored with the chat.
+        Only the cache is updated here, the write is queued on `write_behind` unless
+        `[agents.persistence] write_behind = false`.
+        """
+        # write-through: the next rerun reads this instead of firestore
+        cached = self.cache.get(chat_id, {})
+        self.cache[chat_id] = {
+            "hist": list(chat),
+            "hist_offset": hist_offset,
+            "bot": [m if isinstance(m, BaseMessage) else self.ensure_lc_message(m) for m in chat_bot_hist],
+            "reads": 1 + len(chat) + len(chat_bot_hist),
+            "summary": summary if summary is not None else cached.get("summary"),
+            "summarized_upto": summarized_upto if summary is not None else cached.get("summarized_upto"),
+        }
+        snapshot = {"chat": list(chat), "chat_bot_hist": list(chat_bot_hist), "summary": summary, "summarized_upto": summarized_upto,
+                    "hist_offset": hist_offset}
+        if setting("persistence", "write_behind", True):
+            write_behind.submit(self, chat_id, snapshot)
+        else:
+            ops, counts = self.chat_ops(chat_id, **snapshot)
+            self.write_batched(ops)
+            self.set_counts(chat_id, counts)
+
+    def chat_ops(self, chat_id, chat, chat_bot_hist, summary=None, summarized_upto=None, hist_offset=0):
+        """
+        (write ops, stored counts after them) for the messages that are not stored yet.
+        Runs on the write_behind worker: it reads the chat (and migrates a legacy one) but leaves
+        the session's chat cache alone.
+        """
+        ref = self.chats.document(chat_id)
+        if self.get_counts(chat_id) is None:
+            data = self.chat_doc(chat_id)
+            if data.get("layout") != self.LAYOUT:
+                self.migrate_chat(chat_id, data)
+        hist_len, bot_len = self.get_counts(chat_id)
+
+        ops = []
+        if len(chat_bot_hist) < bot_len:
+            # the agent history was rebuilt from scratch (e.g. lost graph memory), store it again
+            ops += [(ref.collection("chat_bot_hist").document(self.seq_id(seq)), None) for seq in range(len(chat_bot_hist), bot_len)]
+            bot_len = 0
+        # only the new tail is serialized and written (`chat` starts at seq `hist_offset`)
+        new_hist = chat[max(0, hist_len - hist_offset):]
+        ops += self.message_ops(ref, new_hist, self.to_safe_messages(chat_bot_hist[bot_len:]), max(hist_len, hist_offset), bot_len)
+        counts = (max(hist_len, hist_offset + len(chat)), len(chat_bot_hist))
+        now = datetime.now(timezone.utc)
+        chat_fields = {"hist_len": counts[0], "bot_len": counts[1], "updated_at": now}
+        if summary is not None:
+            chat_fields.update(summary=summary, summarized_upto=summarized_upto)
+        ops.append((ref, chat_fields))
+        ops.append(self.index_op(chat_id, updated_at=now))
+        return ops, counts
+
+    def flush(self, timeout=None):
+        """Wait for this user's queued chat updates to be stored (logout)."""
+        if self.chats is None:
+            return True
+        return write_behind.flush(timeout=timeout, keys={self.chats.document(chat_id).path for chat_id in {*self.index, *self.cache}})
+
+    def save_error(self, chat_id):
+        """Why the latest update of the chat is still not stored, None when it is (or is on its way)."""
+        if self.chats is None:
+            return None
+        return write_behind.failed.get(self.chats.document(chat_id).path)
+
+    def migrate_chat(self, chat_id, data=None):
+        """Move a legacy chat (inline `hist` / `chat_bot_hist` arrays) to the append-only layout."""
+        ref = self.chats.document(chat_id)
+        data = data if data is not None else (ref.get().to_dict() or {})
+        if data.get("layout") == self.LAYOUT:
+            return
+        hist, bot = data.get("hist", []), data.get("chat_bot_hist", [])
+        # messages first, the chat document flips to the new layout last, so a crash just re-runs the migration
+        ops = self.message_ops(ref, hist, bot, 0, 0)
+        ops.append((ref, {
+            "layout": self.LAYOUT,
+            "hist_len": len(hist),
+            "bot_len": len(bot),
+            "updated_at": data.get("updated_at") or datetime.now(timezone.utc),
+            "hist": firestore.DELETE_FIELD,
+            "chat_bot_hist": firestore.DELETE_FIELD,
+        }))
+        self.write_batched(ops)
+        # a cached copy holds the same messages and stays valid
+        self.set_counts(chat_id, (len(hist), len(bot)))
+
+    def migrate_all_chats(self):
+        """Migrate every legacy chat of the current user."""
+        for doc in self.chats.get():
+            self.migrate_chat(doc.id, doc.to_dict())
 
     # generate new id for each chat
     def generate_unique_id(self,length=11):
@@ -2,6 +2,9 @@
 import streamlit as st
 from widgets import  login, logout, add_chat
 from pages.mainpage import chat_page
+from Agents import providers
+from Agents.footprint import footprint
+from Agents.settings import setting
 
 # initial state
 if "state" not in st.session_state:
@@ -13,13 +16,17 @@ if st.session_state.state == "logging in" or st.session_state.state == "signing
     pg = st.navigation([st.Page(login)])
 else : 
     pages = []
-    for doc in st.session_state.user_chats: 
+    # user_chats is the compact chat index (id, title, updated_at), the history loads when a chat is opened
+    for chat in st.session_state.user_chats: 
         pages.append(
-            st.Page(lambda doc_id=doc.id: chat_page(doc_id)
-            , title=str(doc.to_dict()["title"]),  url_path=f"chat_{doc.id}" ))
+            st.Page(lambda chat_id=chat["id"]: chat_page(chat_id)
+            , title=str(chat["title"]),  url_path=f"chat_{chat['id']}" ))
 
 
 
+    if setting("memory", "debug_page", False):
+        from pages.memory_debug import memory_page
+        pages.append(st.Page(memory_page, title="Memory", icon=":material/memory:", url_path="memory"))
     pages.append(st.Page(logout,  title="Logout", icon=":material/logout:"))
     pg = st.navigation(pages)
     
@@ -33,4 +40,11 @@ else :
     st.sidebar.button("Add New Chat!", on_click=lambda title=new_chat_title: add_chat(title=title), type = 'secondary', disabled=btn_state)
 
 
-pg.run()
\ No newline at end of file
+# sizes are reported per session, idle sessions' cached chats are dropped by the memory budgets
+footprint.track_session(st.session_state.get("db_app"), st.session_state.get("user_id"))
+
+pg.run()
+
+# build the provider clients in the background once the page is rendered (once per process)
+if setting("providers", "warm_up", True):
+    providers.registry.warm_up()
@@ -1,6 +1,8 @@
 import streamlit as st
 from Agents.graph import graph
-import time
+from Agents.runner import get_runner
+from Agents import telemetry
+from Agents.settings import setting
 from Agents.state import State
 
 
@@ -20,13 +22,21 @@ sys_prompt = '''
                 → Just respond naturally.
             7. You MUST follow these rules strictly.'''
 
-state: State = { 'messages' : 
-                    [{"role": "system", "content": sys_prompt}]}
+def new_turn_state(chat_id, prompt, config) -> State:
+    state: State = {'user_input': prompt, 'messages': []}
+    if graph.get_state(config).values.get("messages"):
+        # the checkpointer still has this chat, only the new input is sent
+        return state
+    # new, evicted or restarted thread: rehydrate the agent memory from the stored chat
+    # the stored agent history is only downloaded in this case
+    state['messages'] = st.session_state.db_app.get_chat_bot_msgs(chat_id) or [{"role": "system", "content": sys_prompt}]
+    state['summary'], state['summarized_upto'] = st.session_state.db_app.get_chat_summary(chat_id)
+    return state
 
 def chat_page(chat_id):
 
-    st.session_state.messages = st.session_state.db_app.get_chat(chat_id)
-    st.session_state.chat_bot_msgs = st.session_state.db_app.get_chat_bot_msgs(chat_id)
+    # newest page of the history (plus the older pages loaded so far), hist_offset is the seq of the first one
+    st.session_state.messages, st.session_state.hist_offset = st.session_state.db_app.get_chat_page(chat_id)
     
     st.session_state.curr_chat_id = chat_id
     config ={ 'configurable': {'thread_id' : f'{st.session_state.curr_chat_id}'}}
@@ -41,11 +51,21 @@ def chat_page(chat_id):
 
 
 
+    # older messages are fetched a page at a time, on demand
+    if st.session_state.hist_offset > 0:
+        if st.button(f"Load older messages ({st.session_state.hist_offset} more)", icon=":material/expand_less:", type="tertiary"):
+            st.session_state.db_app.load_older(chat_id)
+            st.rerun()
+
     # Display chat history
     for message in st.session_state.messages:
         with st.chat_message(message["role"], avatar= avatars[message["role"]]):
             st.markdown(message["content"])
 
+    # the background writer keeps retrying, but the learner should know the chat isn't stored yet
+    if save_error := st.session_state.db_app.save_error(chat_id):
+        st.warning(f"Your latest messages are not saved yet, still retrying ({save_error}).", icon=":material/cloud_off:")
+
 
 
     # Get user input
@@ -56,29 +76,55 @@ def chat_page(chat_id):
             st.markdown(prompt)
 
         status_box = st.empty()
+        assistant_box = st.chat_message("assistant", avatar=avatars["assistant"])
+        with assistant_box:
+            answer_box = st.empty()
         final_ans = ''
-        state['user_input'] =  prompt
-        # Stream node-by-node updates
-        for event in graph.stream(state, stream_mode="values", config=config):
-
-            # If node updates its status, show it live
-            if "status_message" in event and event["status_message"]:
-                status_box.info(event["status_message"])
-
-            # If node updates the final output field, capture it
-            if "final_output" in event and event["final_output"]:
-                time.sleep(1)
-                final_ans = event["final_output"]
-                state['status_message'] = None
-        
-                
-
-        # Clear the status text once workflow completes
-        status_box.empty()
-
-        with st.chat_message("assistant", avatar=avatars["assistant"]):
-            st.markdown(final_ans)
-        st.session_state.chat_bot_msgs = event["messages"]
-
-        st.session_state.messages.append({"role": "assistant", "content": final_ans})
-        st.session_state.db_app.update_chat(st.session_state.curr_chat_id, st.session_state.messages, st.session_state.chat_bot_msgs)
+        streamed = ''
+        state = new_turn_state(chat_id, prompt, config)
+        # spans of the nodes and provider calls of this turn, see Agents/telemetry.py
+        with telemetry.turn() as spans:
+            # the turn runs on the shared worker pool, this thread only renders its events:
+            # "values" gives node-by-node state, "custom" gives the answer tokens as they are generated
+            try:
+                for mode, chunk in get_runner().stream(state, config):
+
+                    if mode == "custom":
+                        if chunk.get("reset"):
+                            streamed = ''
+                        streamed += chunk.get("token", '')
+                        if streamed:
+                            answer_box.markdown(streamed + "▌")
+                        continue
+
+                    event = chunk
+                    # If node updates its status, show it live
+                    if "status_message" in event and event["status_message"]:
+                        status_box.info(event["status_message"])
+
+                    # If node updates the final output field, capture it
+                    if "final_output" in event and event["final_output"]:
+                        final_ans = event["final_output"]
+            except TimeoutError as e:
+                # the turn may still finish on its worker, the page stops waiting for it
+                status_box.empty()
+                answer_box.empty()
+                st.session_state.messages.pop()
+                st.error(str(e))
+                st.stop()
+
+            # Clear the status text once workflow completes
+            status_box.empty()
+            answer_box.markdown(final_ans)
+            # the agent history lives in the chat cache and the checkpointer, not in the session state
+            chat_bot_msgs = event["messages"]
+
+            st.session_state.messages.append({"role": "assistant", "content": final_ans})
+            st.session_state.db_app.update_chat(st.session_state.curr_chat_id, st.session_state.messages, chat_bot_msgs,
+                                                summary=event.get("summary"), summarized_upto=event.get("summarized_upto"),
+                                                hist_offset=st.session_state.hist_offset)
+
+        if setting("telemetry", "show_timings", False):
+            with assistant_box:
+                with st.expander("⏱️ Timings"):
+                    st.dataframe(telemetry.breakdown(spans), hide_index=True)
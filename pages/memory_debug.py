@@ -0,0 +1,34 @@
+import streamlit as st
+
+from Agents.footprint import footprint, MB
+
+
+def memory_page():
+    st.title("Memory")
+    if st.button("Apply budgets now", icon=":material/delete_sweep:"):
+        for action in footprint.enforce() or ["nothing to evict"]:
+            st.toast(action)
+
+    report = footprint.report()
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Process RSS", f"{report['rss_bytes'] / MB:.1f} MB")
+    c2.metric("Tracked", f"{report['tracked_bytes'] / MB:.1f} MB")
+    c3.metric("Sessions", len(report["sessions"]))
+
+    st.subheader("Top consumers")
+    st.dataframe([{"consumer": name, "KB": round(size / 1024, 1)} for name, size in report["top"]], hide_index=True)
+
+    st.subheader("Sessions")
+    st.dataframe([
+        {"user": s["user"], "session": s["session"][:8], "idle s": s["idle_seconds"], "KB": round(s["bytes"] / 1024, 1),
+         "cached chats": len(s["chats"]),
+         **{part: round(size / 1024, 1) for part, size in s["parts"].items()}}
+        for s in report["sessions"]
+    ], hide_index=True)
+
+    st.subheader("Chat threads (checkpointer)")
+    st.dataframe([{"thread": thread_id, "KB": round(size / 1024, 1)} for thread_id, size in report["threads"].items()], hide_index=True)
+
+    st.subheader("Components")
+    st.dataframe([{"component": name, "KB": round(size / 1024, 1)} for name, size in report["components"].items()], hide_index=True)
+    st.caption(f"Evictions so far: {report['evictions']}")
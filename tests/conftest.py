@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+# the app modules are imported from the repository root (`Agents.*`, `functions`)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """Persistent caches are written to a temporary directory, not the repo's `.cache`."""
+    monkeypatch.setenv("AGENTS_CACHE_DIR", str(tmp_path / "cache"))
+    return tmp_path / "cache"
@@ -0,0 +1,99 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("firebase_admin")
+
+import functions  # noqa: E402
+from functions import DataBase  # noqa: E402
+
+
+class Query:
+    """The part of a firestore collection `read_page` and `message_ops` use, over `{seq: message}`."""
+
+    def __init__(self, messages, before=None, descending=False, limit=None):
+        self.messages = messages
+        self.before = before
+        self.descending = descending
+        self.count = limit
+        self.reads = []
+
+    def document(self, doc_id):
+        return SimpleNamespace(id=doc_id)
+
+    def where(self, filter=None):
+        assert (filter.field_path, filter.op_string) == ("seq", "<")
+        return Query(self.messages, filter.value, self.descending, self.count)
+
+    def order_by(self, field, direction=None):
+        return Query(self.messages, self.before, direction == functions.firestore.Query.DESCENDING, self.count)
+
+    def limit(self, n):
+        return Query(self.messages, self.before, self.descending, n)
+
+    def stream(self):
+        seqs = sorted((s for s in self.messages if self.before is None or s < self.before), reverse=self.descending)
+        return [SimpleNamespace(to_dict=lambda s=s: dict(self.messages[s])) for s in seqs[:self.count]]
+
+
+class Chats:
+    """One layout-2 chat "c" holding `n` UI messages."""
+
+    def __init__(self, n):
+        self.hist = {seq: {"seq": seq, "role": "user", "content": f"m{seq}"} for seq in range(n)}
+        self.data = {"layout": DataBase.LAYOUT, "hist_len": n, "bot_len": 0}
+
+    def document(self, chat_id):
+        return SimpleNamespace(path=f"users/u/chats/{chat_id}", get=lambda: SimpleNamespace(to_dict=lambda: dict(self.data)),
+                               collection=lambda kind: Query(self.hist))
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """A DataBase over `Chats(75)`, pages of 30."""
+    monkeypatch.setenv("AGENTS_HISTORY_PAGE_SIZE", "30")
+    db = DataBase.__new__(DataBase)
+    db.chats = Chats(75)
+    db.user_ref = SimpleNamespace(path="users/u")
+    db.index = {}
+    db.counts = {}
+    db._counts_lock = threading.Lock()
+    db.cache = {}
+    db.cache_stats = {"hits": 0, "misses": 0, "reads_avoided": 0}
+    return db
+
+
+def contents(messages):
+    return [m["content"] for m in messages]
+
+
+def test_first_page_is_the_newest_messages(db):
+    messages, offset = db.get_chat_page("c")
+    assert offset == 45
+    assert contents(messages) == [f"m{seq}" for seq in range(45, 75)]
+
+
+def test_older_pages_are_prepended_until_the_first_message(db):
+    db.get_chat_page("c")
+    assert db.load_older("c") == 30
+    assert db.get_chat_page("c")[1] == 15
+    assert db.load_older("c") == 15
+    messages, offset = db.get_chat_page("c")
+    assert offset == 0
+    assert contents(messages) == [f"m{seq}" for seq in range(75)]
+    assert db.load_older("c") == 0
+
+
+def test_get_chat_loads_every_page(db):
+    assert contents(db.get_chat("c")) == [f"m{seq}" for seq in range(75)]
+
+
+def test_only_messages_after_the_stored_ones_are_written_from_a_page(db):
+    messages, offset = db.get_chat_page("c")
+    messages += [{"role": "user", "content": "m75"}, {"role": "assistant", "content": "m76"}]
+    db.set_counts("c", (75, 0))
+    ops, counts = db.chat_ops("c", messages, [], hist_offset=offset)
+    written = [fields for _, fields in ops if fields and "seq" in fields]
+    assert [(m["seq"], m["content"]) for m in written] == [(75, "m75"), (76, "m76")]
+    assert counts == (77, 0)
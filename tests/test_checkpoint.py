@@ -0,0 +1,94 @@
+import operator
+import sqlite3
+from typing import Annotated, TypedDict
+
+import pytest
+from langgraph.graph import END, START, StateGraph
+
+from Agents.checkpoint import BoundedMemorySaver, _sqlite_saver_class, make_checkpointer
+
+
+class State(TypedDict):
+    messages: Annotated[list, operator.add]
+
+
+def reply(state):
+    return {"messages": ["bot"]}
+
+
+def chat(checkpointer):
+    """A one-node graph that answers every message with "bot"."""
+    graph = StateGraph(State)
+    graph.add_node("reply", reply)
+    graph.add_edge(START, "reply")
+    graph.add_edge("reply", END)
+    return graph.compile(checkpointer=checkpointer)
+
+
+def config(thread_id):
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def turns(app, thread_id, n):
+    for _ in range(n):
+        app.invoke({"messages": ["hi"]}, config(thread_id))
+
+
+def test_memory_keeps_the_latest_checkpoints_of_a_thread():
+    saver = BoundedMemorySaver(keep_last=2)
+    app = chat(saver)
+    turns(app, "t", 3)
+    assert len(list(saver.list(config("t")))) == 2
+    # the latest state is whole
+    assert app.get_state(config("t")).values["messages"] == ["hi", "bot"] * 3
+
+
+def test_memory_drops_channel_values_of_pruned_checkpoints():
+    saver = BoundedMemorySaver(keep_last=1)
+    app = chat(saver)
+    turns(app, "t", 5)
+    # one value per channel the remaining checkpoint points at
+    assert len([key for key in saver.blobs if key[0] == "t"]) <= 3
+    assert app.get_state(config("t")).values["messages"] == ["hi", "bot"] * 5
+
+
+def test_idle_threads_are_evicted():
+    saver = BoundedMemorySaver(idle_seconds=60)
+    app = chat(saver)
+    turns(app, "old", 1)
+    saver.last_used["old"] -= 120
+    turns(app, "new", 1)
+    assert set(saver.storage) == {"new"}
+    assert saver.resident_size()["evicted_threads"] == 1
+    assert app.get_state(config("old")).values == {}
+
+
+def test_least_recently_used_thread_is_evicted_above_max_threads():
+    saver = BoundedMemorySaver(max_threads=2)
+    app = chat(saver)
+    turns(app, "a", 1)
+    turns(app, "b", 1)
+    # reading a thread counts as using it
+    saver.get_tuple(config("a"))
+    turns(app, "c", 1)
+    assert set(saver.storage) == {"a", "c"}
+    assert set(saver.thread_sizes()) == {"a", "c"}
+
+
+def test_sqlite_keeps_the_latest_checkpoints_of_a_thread():
+    saver = _sqlite_saver_class()(sqlite3.connect(":memory:", check_same_thread=False), keep_last=2)
+    app = chat(saver)
+    turns(app, "t", 3)
+    turns(app, "u", 1)
+    assert saver.resident_size()["checkpoints"] == 4
+    assert len(list(saver.list(config("t")))) == 2
+    assert app.get_state(config("t")).values["messages"] == ["hi", "bot"] * 3
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_backend_is_chosen_by_the_setting(backend, tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENTS_CHECKPOINT_BACKEND", backend)
+    monkeypatch.setenv("AGENTS_CHECKPOINT_PATH", str(tmp_path / "checkpoints.sqlite"))
+    saver = make_checkpointer()
+    turns(chat(saver), "t", 1)
+    assert saver.resident_size()["backend"] == backend
@@ -0,0 +1,49 @@
+import pytest
+
+from Agents import providers
+from Agents.facts import NO_RESULTS, FactSearch
+
+
+class Tavily:
+
+    def __init__(self, results):
+        self.results = results
+        self.calls = 0
+
+    def search(self, query, max_results=1):
+        self.calls += 1
+        return {"results": self.results}
+
+
+@pytest.fixture
+def tavily():
+    def use(results):
+        client = Tavily(results)
+        providers.registry.override("tavily", client)
+        return client
+
+    yield use
+    providers.registry.reset("tavily")
+
+
+def test_answer_cites_the_result(tavily):
+    tavily([{"content": "Paris is the capital of France.", "url": "http://example.com"}])
+    answer = FactSearch().answer("What is the capital of France?")
+    assert "Paris is the capital of France." in answer
+    assert "For more info visit http://example.com" in answer
+
+
+def test_answers_are_cached(tavily):
+    client = tavily([{"content": "Paris.", "url": "http://example.com"}])
+    facts = FactSearch()
+    facts.answer("capital of France")
+    facts.answer("Capital of France?")
+    assert client.calls == 1
+
+
+def test_no_results_is_an_explicit_fallback_and_not_cached(tavily):
+    client = tavily([])
+    facts = FactSearch()
+    assert facts.answer("zzzz qqqq") == NO_RESULTS
+    assert facts.answer("zzzz qqqq") == NO_RESULTS
+    assert client.calls == 2
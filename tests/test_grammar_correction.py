@@ -0,0 +1,69 @@
+import threading
+
+import pytest
+
+from Agents import providers
+from Agents.grammar_correction import NO_CORRECTION, PROBE_SENTENCE, GrammarCorrector
+
+
+class Space:
+    """The grammar Space; `hold` keeps every prediction waiting until it is set."""
+
+    def __init__(self, failing=False):
+        self.calls = []
+        self.failing = failing
+        self.hold = None
+
+    def predict(self, sentence, api_name=None):
+        self.calls.append(sentence)
+        if self.hold is not None:
+            self.hold.wait(5)
+        if self.failing:
+            raise ConnectionError("space is asleep")
+        return "Corrected: " + sentence.replace(" go ", " goes ")
+
+
+@pytest.fixture
+def space(monkeypatch):
+    monkeypatch.setenv("AGENTS_GRAMMAR_KEEP_WARM", "false")
+    space = Space()
+    providers.registry.override("grammar_space", space)
+    yield space
+    providers.registry.reset("grammar_space")
+
+
+def test_corrections_are_cached(space):
+    corrector = GrammarCorrector()
+    assert corrector.correct("She go home.") == "She goes home."
+    assert corrector.correct("She  go home.") == "She goes home."
+    assert space.calls == ["She go home."]
+    assert corrector.stats()["remote_calls"] == 1
+
+
+def test_nothing_back_before_the_deadline_answers_no_correction(space):
+    space.hold = threading.Event()
+    corrector = GrammarCorrector()
+    try:
+        assert corrector.correct("She go home.", deadline=0.05) == NO_CORRECTION
+    finally:
+        space.hold.set()
+    assert corrector.stats()["timeouts"] == 1
+
+
+def test_probe_calls_the_space_every_time_without_the_cache(space):
+    corrector = GrammarCorrector()
+    corrector.probe_once()
+    corrector.probe_once()
+    assert space.calls == [PROBE_SENTENCE, PROBE_SENTENCE]
+    stats = corrector.stats()
+    assert stats["remote_calls"] == 0
+    assert corrector.cache.get(PROBE_SENTENCE) is None
+    assert stats["probe"]["healthy"] is True and stats["probe"]["probes"] == 2
+
+
+def test_failed_probe_is_reported(space):
+    space.failing = True
+    corrector = GrammarCorrector()
+    corrector.probe_once()
+    probe = corrector.stats()["probe"]
+    assert probe["healthy"] is False and "space is asleep" in probe["last_error"]
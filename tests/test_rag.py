@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import pytest
+
+from Agents import providers
+from Agents.Rag import Rag
+
+
+class Completions:
+
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, model=None, messages=None, stream=False, **kwargs):
+        self.calls += 1
+        text = "<think>hmm</think>Use 'an' before vowel sounds."
+        return iter([SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text[i:i + 5]))])
+                     for i in range(0, len(text), 5)])
+
+
+class Store:
+
+    def __init__(self):
+        self.embeddings = []
+
+    def query(self, text, embedding=None, n_results=1):
+        self.embeddings.append(embedding)
+        return ["Use 'a' before consonant sounds. Use 'an' before vowel sounds."], [{"file_name": "grammar.pdf"}]
+
+
+def broken_embedder(texts):
+    raise RuntimeError("onnxruntime is not installed")
+
+
+@pytest.fixture
+def rag():
+    """A Rag over a fake model and store; `rag.completions` / `rag.store` record the calls."""
+    completions, store = Completions(), Store()
+    providers.registry.override("hf", SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    providers.registry.override("vector_store", store)
+    rag = Rag()
+    rag.completions, rag.store = completions, store
+    yield rag
+    for name in ("hf", "vector_store", "embedder"):
+        providers.registry.reset(name)
+
+
+def test_explain_streams_the_answer_and_cites_the_book(rag):
+    providers.registry.override("embedder", lambda texts: [[1.0, 0.0, 0.0] for _ in texts])
+    tokens = []
+    answer = rag.explain("When do I use an article before a vowel?", on_token=tokens.append)
+    assert answer.startswith("Use 'an' before vowel sounds.")
+    assert "grammar.pdf" in answer
+    assert "".join(tokens) == answer
+    assert rag.store.embeddings == [[1.0, 0.0, 0.0]]
+
+
+def test_explain_works_without_the_local_embedder(rag):
+    providers.registry.override("embedder", broken_embedder)
+    question = "Is it a hour or an hour?"
+    first = rag.explain(question)
+    assert first.startswith("Use 'an' before vowel sounds.")
+    # retrieval without the query embedding, the store embeds the text itself
+    assert rag.store.embeddings == [None]
+    # the exact question is still served from the cache
+    assert rag.explain(question) == first
+    assert rag.completions.calls == 1
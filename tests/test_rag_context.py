@@ -0,0 +1,55 @@
+from Agents.rag_context import UNKNOWN_BOOK, build_context, query_terms, split_sentences
+
+ARTICLES = ("Articles come before nouns. Use 'an' before a vowel sound, as in an apple. "
+            "Use 'a' before a consonant sound, as in a car. Some nouns take no article at all.")
+TENSES = "The past tense of go is went. Regular verbs add -ed in the past."
+FILLER = " ".join(f"Filler sentence number {n} says nothing useful." for n in range(40))
+
+
+def test_query_terms_keep_content_and_quoted_words():
+    assert query_terms("What's the difference between 'a' and 'an'?") == {"a", "an"}
+    assert "vowel" in query_terms("when do vowels take an article")
+
+
+def test_split_sentences_keeps_list_items_apart():
+    assert split_sentences("Rules:\n- one\n- two") == ["Rules:", "- one", "- two"]
+
+
+def test_irrelevant_sentences_are_dropped_within_the_budget():
+    context = build_context("when do I use 'an' before a vowel", [FILLER, ARTICLES], [{"file_name": "filler.pdf"}, {"file_name": "grammar.pdf"}], token_budget=40)
+    assert "Use 'an' before a vowel sound" in context["text"]
+    assert "Filler" not in context["text"]
+    assert context["tokens_after"] <= 40 < context["tokens_before"]
+    assert context["book"] == "grammar.pdf"
+
+
+def test_kept_sentences_are_in_document_order():
+    rule = "Use 'an' before a vowel sound. For example: an apple, an egg, an umbrella."
+    # the example scores higher than its rule, it still comes after it
+    context = build_context("an apple, an egg or an umbrella with a vowel", [rule], [None], token_budget=200)
+    assert context["text"] == rule
+
+
+def test_near_duplicates_from_overlapping_chunks_are_dropped():
+    sentence = "Use 'an' before a vowel sound, as in an apple."
+    context = build_context("'an' before a vowel", [sentence, sentence + " Extra words here."], [None, None])
+    assert context["text"].count("apple") == 1
+    assert context["chunks"] == 2 and context["kept"] == 1
+
+
+def test_no_matching_word_keeps_the_chunk_openings():
+    context = build_context("zzz", [TENSES, ARTICLES], [None, None], token_budget=15)
+    assert context["text"].startswith("The past tense of go is went.")
+    assert context["book"] == UNKNOWN_BOOK
+
+
+def test_a_single_sentence_over_the_budget_is_cut():
+    long_sentence = "The vowel rule " + "applies again and again " * 50 + "in every case."
+    context = build_context("vowel rule", [long_sentence], [{"file_name": "grammar.pdf"}], token_budget=20)
+    assert context["text"].endswith(" ...")
+    assert context["tokens_after"] <= 20
+
+
+def test_no_documents_gives_an_empty_context():
+    context = build_context("anything", [], [])
+    assert context["text"] == "" and context["kept"] == 0 and context["book"] == UNKNOWN_BOOK
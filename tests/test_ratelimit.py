@@ -0,0 +1,141 @@
+import threading
+import time
+
+import pytest
+
+from Agents.ratelimit import FairScheduler, RateLimited, RateLimitTimeout, TokenBucket, limit, retry_after, scheduling
+from Agents.routing import AllTargetsFailed, Router, Target
+
+
+def drained_scheduler(rate):
+    scheduler = FairScheduler("test", TokenBucket(rate, capacity=1))
+    assert scheduler.bucket.try_acquire() == 0.0
+    return scheduler
+
+
+def queue_in_order(scheduler, requests):
+    """Start one waiting request per (priority, session, label), each queued before the next, returns the grant order."""
+    granted, threads = [], []
+
+    def run(priority, session, label):
+        with scheduling(priority, session=session):
+            scheduler.acquire(timeout=5)
+        granted.append(label)
+
+    for n, request in enumerate(requests, 1):
+        thread = threading.Thread(target=run, args=request)
+        thread.start()
+        threads.append(thread)
+        deadline = time.monotonic() + 2
+        while scheduler.depth() < n and time.monotonic() < deadline:
+            time.sleep(0.001)
+        assert scheduler.depth() == n
+    for thread in threads:
+        thread.join(5)
+    return granted
+
+
+def test_higher_priority_is_served_first():
+    scheduler = drained_scheduler(rate=5)
+    granted = queue_in_order(scheduler, [("background", "s1", "background"), ("batch", "s2", "batch"),
+                                         ("interactive", "s3", "interactive")])
+    assert granted == ["interactive", "batch", "background"]
+
+
+def test_round_robin_across_sessions():
+    scheduler = drained_scheduler(rate=5)
+    granted = queue_in_order(scheduler, [("interactive", "a", "a1"), ("interactive", "a", "a2"),
+                                         ("interactive", "a", "a3"), ("interactive", "b", "b1")])
+    assert granted == ["a1", "b1", "a2", "a3"]
+
+
+def test_timeout_removes_the_waiting_request():
+    scheduler = drained_scheduler(rate=0.1)
+    with pytest.raises(RateLimitTimeout):
+        scheduler.acquire(timeout=0.05)
+    assert scheduler.depth() == 0
+    assert scheduler.stats()["interactive"]["timeouts"] == 1
+
+
+def test_concurrent_pauses_do_not_add_up():
+    bucket = TokenBucket(100, capacity=1)
+    for _ in range(4):
+        bucket.pause(0.2)
+    assert 0.0 < bucket.try_acquire() <= 0.2
+    # a shorter pause doesn't end a longer one early
+    bucket.pause(0.01)
+    assert bucket.try_acquire() > 0.1
+    time.sleep(0.25)
+    assert bucket.try_acquire() == 0.0
+
+
+def test_throttle_holds_the_queue_for_the_pause():
+    scheduler = FairScheduler("test", TokenBucket(100, capacity=1))
+    scheduler.throttle(0.1)
+    assert scheduler.acquire(timeout=1) >= 0.09
+
+
+class RateLimitError(Exception):
+    pass
+
+
+class Response:
+    status_code = 429
+    headers = {"retry-after": "3"}
+
+
+class HTTPError(Exception):
+    response = Response()
+
+
+def test_retry_after_matches_status_or_type_only():
+    assert retry_after(HTTPError("too many")) == 3.0
+    assert retry_after(RateLimitError("slow down")) == 10.0
+    assert retry_after(ValueError("book page 429: rate limit of the verb")) is None
+
+
+class StreamingClient:
+
+    def stream(self, messages):
+        yield "first"
+        raise RateLimitError("slow down")
+
+
+def test_a_429_raised_while_streaming_throttles_the_quota():
+    scheduler = limit("test_stream", 100, capacity=5)
+    client = RateLimited(StreamingClient(), "test_stream")
+    chunks = client.stream([])
+    assert next(chunks) == "first"
+    with pytest.raises(RateLimitError):
+        next(chunks)
+    assert scheduler.throttled == 1
+    assert scheduler.bucket.try_acquire() > 0.0
+
+
+class ModelClient:
+
+    def create(self, model=None):
+        return model
+
+
+def test_a_model_quota_timeout_gives_the_service_token_back(monkeypatch):
+    monkeypatch.setenv("AGENTS_RATELIMIT_INTERACTIVE_MAX_WAIT_SECONDS", "0.05")
+    service = limit("test_model", 100, capacity=1)
+    model = limit("test_model:slow", 0.1, capacity=1)
+    assert model.bucket.try_acquire() == 0.0
+    with pytest.raises(RateLimitTimeout):
+        RateLimited(ModelClient(), "test_model").create(model="slow")
+    assert service.bucket.try_acquire() == 0.0
+
+
+def test_waiting_on_our_own_quota_does_not_open_the_breaker(monkeypatch):
+    monkeypatch.setenv("AGENTS_ROUTING_QUEUED_TARGETS", "a")
+    monkeypatch.setenv("AGENTS_ROUTING_FAILURE_THRESHOLD", "1")
+    router = Router(max_workers=2)
+
+    def queued(target):
+        raise RateLimitTimeout("no slot")
+
+    with pytest.raises(AllTargetsFailed):
+        router.call("queued", queued)
+    assert router.target_stats("queued", Target("a")).breaker.state == "closed"
@@ -0,0 +1,160 @@
+import threading
+import time
+
+import pytest
+
+from Agents.routing import AllTargetsFailed, CircuitBreaker, DeadlineExceeded, Router, Target
+
+
+@pytest.fixture
+def route(monkeypatch):
+    """A router for a "test" role over the given targets and settings."""
+
+    def make(targets, **settings):
+        monkeypatch.setenv("AGENTS_ROUTING_TEST_TARGETS", targets)
+        for key, value in settings.items():
+            # the breaker settings are shared by every role
+            section = "routing" if key in ("failure_threshold", "reset_seconds") else "routing_test"
+            monkeypatch.setenv(f"AGENTS_{section}_{key}".upper(), str(value))
+        return Router(max_workers=8)
+
+    return make
+
+
+def breaker(router, spec):
+    return router.target_stats("test", Target(spec)).breaker
+
+
+def open_breaker(b):
+    for _ in range(b.failure_threshold):
+        b.failure()
+
+
+# circuit breaker
+
+
+def test_breaker_opens_after_the_threshold_and_lets_one_probe_through():
+    b = CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+    b.failure()
+    assert b.state == "closed" and b.allow()
+    b.failure()
+    assert b.state == "open" and not b.allow()
+    time.sleep(0.06)
+    assert b.state == "half-open"
+    assert [b.allow() for _ in range(3)] == [True, False, False]
+
+
+def test_failed_probe_reopens_and_successful_probe_closes():
+    b = CircuitBreaker(failure_threshold=1, reset_seconds=0.05)
+    b.failure()
+    time.sleep(0.06)
+    assert b.allow()
+    b.failure()
+    assert b.state == "open"
+    time.sleep(0.06)
+    assert b.allow()
+    b.success()
+    assert b.state == "closed"
+    assert b.allow() and b.allow()
+
+
+# router
+
+
+def test_first_target_answers(route):
+    router = route("a,b")
+    assert router.call("test", lambda target: target.spec) == "a"
+    assert router.roles["test"]["failovers"] == 0
+
+
+def test_fails_over_to_the_next_target(route):
+    router = route("a,b")
+
+    def fn(target):
+        if target.spec == "a":
+            raise ConnectionError("down")
+        return target.spec
+
+    assert router.call("test", fn) == "b"
+    assert router.roles["test"]["failovers"] == 1
+
+
+def test_every_target_failing_raises(route):
+    router = route("a,b")
+
+    def fn(target):
+        raise ConnectionError(target.spec)
+
+    with pytest.raises(AllTargetsFailed):
+        router.call("test", fn)
+
+
+def test_slow_attempt_is_hedged_and_the_faster_answer_wins(route):
+    router = route("a,b", attempt_seconds=0.05, deadline_seconds=2)
+    release = threading.Event()
+
+    def fn(target):
+        if target.spec == "a":
+            release.wait(2)
+        return target.spec
+
+    try:
+        assert router.call("test", fn) == "b"
+    finally:
+        release.set()
+    assert router.roles["test"]["hedged"] == 1
+    assert router.stats()["test"]["targets"]["b"]["wins"] == 1
+
+
+def test_deadline_exceeded_opens_the_slow_targets(route):
+    router = route("a", deadline_seconds=0.1, attempt_seconds=1, failure_threshold=1)
+    release = threading.Event()
+
+    def fn(target):
+        release.wait(2)
+        return target.spec
+
+    try:
+        with pytest.raises(DeadlineExceeded):
+            router.call("test", fn)
+        assert router.roles["test"]["deadline_exceeded"] == 1
+        assert breaker(router, "a").state == "open"
+    finally:
+        # the late answer closes it again
+        release.set()
+
+
+def test_every_breaker_open_fails_without_a_call(route):
+    router = route("a,b", failure_threshold=1)
+    open_breaker(breaker(router, "a"))
+    open_breaker(breaker(router, "b"))
+    calls = []
+    with pytest.raises(AllTargetsFailed):
+        router.call("test", calls.append)
+    assert calls == []
+
+
+def test_open_target_is_skipped(route):
+    router = route("a,b", failure_threshold=1)
+    open_breaker(breaker(router, "a"))
+    assert router.call("test", lambda target: target.spec) == "b"
+
+
+def test_probe_is_not_used_up_by_a_target_that_is_not_called(route):
+    router = route("a,b", failure_threshold=1, reset_seconds=0.05)
+    open_breaker(breaker(router, "b"))
+    time.sleep(0.06)
+    assert router.call("test", lambda target: target.spec) == "a"
+    # b was never called, its probe is still available
+    assert breaker(router, "b").allow()
+
+
+def test_stream_wins_on_its_first_chunk(route):
+    router = route("a,b")
+
+    def fn(target):
+        if target.spec == "a":
+            raise ConnectionError("down")
+        return iter(["x", "y"])
+
+    assert list(router.call("test", fn, stream=True)) == ["x", "y"]
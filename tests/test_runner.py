@@ -0,0 +1,109 @@
+import gc
+import threading
+import time
+
+import pytest
+
+from Agents.runner import TurnRunner
+
+
+class Graph:
+    """Streams `state["events"]`; a turn whose state has a `hold` event waits on it first."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = {}
+        self.overlap = {}  # thread_id -> most turns of the chat seen running at once
+        self.started = threading.Semaphore(0)
+
+    def stream(self, state, stream_mode=None, config=None):
+        thread_id = config["configurable"]["thread_id"]
+        with self.lock:
+            self.running[thread_id] = self.running.get(thread_id, 0) + 1
+            self.overlap[thread_id] = max(self.overlap.get(thread_id, 0), self.running[thread_id])
+        self.started.release()
+        try:
+            if "hold" in state:
+                state["hold"].wait(5)
+            if "error" in state:
+                raise state["error"]
+            yield from state["events"]
+        finally:
+            with self.lock:
+                self.running[thread_id] -= 1
+
+
+def config(thread_id):
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def consume(runner, state, thread_id, out):
+    out.extend(runner.stream(state, config(thread_id), timeout=5))
+
+
+def test_events_are_streamed_back():
+    runner = TurnRunner(Graph(), max_workers=2)
+    assert list(runner.stream({"events": [1, 2, 3]}, config("a"), timeout=5)) == [1, 2, 3]
+    assert runner.stats()["completed"] == 1
+
+
+def test_turns_of_a_chat_run_one_at_a_time():
+    graph = Graph()
+    runner = TurnRunner(graph, max_workers=4)
+    hold, out = threading.Event(), []
+    first = threading.Thread(target=consume, args=(runner, {"hold": hold, "events": ["first"]}, "a", out))
+    first.start()
+    assert graph.started.acquire(timeout=5)
+    second = threading.Thread(target=consume, args=(runner, {"events": ["second"]}, "a", out))
+    second.start()
+    # the second turn waits for the chat's lock, it doesn't start
+    assert not graph.started.acquire(timeout=0.1)
+    assert runner.is_busy("a")
+    hold.set()
+    first.join(5)
+    second.join(5)
+    assert out == ["first", "second"]
+    assert graph.overlap["a"] == 1
+
+
+def test_turns_of_different_chats_run_concurrently():
+    graph = Graph()
+    runner = TurnRunner(graph, max_workers=4)
+    hold, out = threading.Event(), []
+    threads = [threading.Thread(target=consume, args=(runner, {"hold": hold, "events": [chat]}, chat, out))
+               for chat in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    # both are running before either is released
+    assert graph.started.acquire(timeout=5) and graph.started.acquire(timeout=5)
+    hold.set()
+    for thread in threads:
+        thread.join(5)
+    assert sorted(out) == ["a", "b"]
+
+
+def test_chat_lock_is_dropped_after_the_turn():
+    runner = TurnRunner(Graph(), max_workers=2)
+    list(runner.stream({"events": []}, config("a"), timeout=5))
+    deadline = time.monotonic() + 2
+    while runner.is_busy("a") and time.monotonic() < deadline:
+        gc.collect()
+        time.sleep(0.01)
+    assert not runner.is_busy("a")
+
+
+def test_silent_turn_times_out():
+    runner = TurnRunner(Graph(), max_workers=2)
+    hold = threading.Event()
+    try:
+        with pytest.raises(TimeoutError):
+            list(runner.stream({"hold": hold, "events": [1]}, config("a"), timeout=0.05))
+    finally:
+        hold.set()
+
+
+def test_graph_error_is_raised_in_the_caller():
+    runner = TurnRunner(Graph(), max_workers=2)
+    with pytest.raises(ValueError, match="bad state"):
+        list(runner.stream({"error": ValueError("bad state"), "events": []}, config("a"), timeout=5))
+    assert runner.stats()["failed"] == 1
@@ -0,0 +1,96 @@
+import threading
+
+import pytest
+from langchain_core.messages import AIMessageChunk
+
+from Agents import providers, speculation
+from Agents.speculation import Speculation
+
+
+class Client:
+    """Streams `chunks`; after the first one it waits for `resume` (when set) before the rest."""
+
+    def __init__(self, chunks, fail=False):
+        self.chunks = chunks
+        self.fail = fail
+        self.resume = None
+        self.closed = False
+
+    def stream(self, messages):
+        try:
+            for n, text in enumerate(self.chunks):
+                if n == 1 and self.resume is not None:
+                    self.resume.wait(5)
+                yield AIMessageChunk(content=text)
+            if self.fail:
+                raise ConnectionError("stream broke")
+        finally:
+            self.closed = True
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("AGENTS_ROUTING_CHAT_TARGETS", "spec_chat")
+    client = Client(["Hel", "lo", "!"])
+    providers.registry.override("spec_chat", client)
+    yield client
+    providers.registry.reset("spec_chat")
+
+
+def speculate(summarized_upto=0):
+    spec = Speculation(summarized_upto)
+    speculation.register(spec)
+    thread = threading.Thread(target=spec.run, args=(lambda: ["hi"],))
+    thread.start()
+    return spec, thread
+
+
+def counter(name):
+    return speculation.stats.as_dict()[name]
+
+
+def test_speculation_is_taken_and_replayed(client):
+    used = counter("speculations_used")
+    spec, thread = speculate(summarized_upto=4)
+    thread.join(5)
+    assert speculation.take({"speculation_id": spec.id, "summarized_upto": 4}) is spec
+    tokens = []
+    assert spec.stream(tokens.append, timeout=5).content == "Hello!"
+    assert tokens == ["Hel", "lo", "!"]
+    assert counter("speculations_used") == used + 1
+    # taken once
+    assert speculation.take({"speculation_id": spec.id, "summarized_upto": 4}) is None
+
+
+def test_speculation_built_on_an_older_summary_is_discarded(client):
+    discarded = counter("speculations_discarded")
+    spec, thread = speculate(summarized_upto=0)
+    thread.join(5)
+    assert speculation.take({"speculation_id": spec.id, "summarized_upto": 6}) is None
+    assert spec.cancelled.is_set()
+    assert counter("speculations_discarded") == discarded + 1
+
+
+def test_failed_speculation_is_discarded(client):
+    client.fail = True
+    spec, thread = speculate()
+    thread.join(5)
+    assert speculation.take({"speculation_id": spec.id}) is None
+    assert isinstance(spec.error, Exception)
+
+
+def test_cancelled_speculation_stops_streaming(client):
+    cancelled = counter("speculations_cancelled")
+    client.resume = threading.Event()
+    spec, thread = speculate()
+    speculation.discard(spec, "cancelled")
+    client.resume.set()
+    thread.join(5)
+    assert client.closed
+    assert spec.response is None or spec.response.content != "Hello!"
+    assert speculation.take({"speculation_id": spec.id}) is None
+    assert counter("speculations_cancelled") == cancelled + 1
+
+
+def test_turn_without_a_speculation_takes_nothing():
+    assert speculation.take({}) is None
@@ -0,0 +1,33 @@
+import json
+
+import numpy as np
+
+from Agents.vector_store import NpyStore
+
+
+def npy_index(path, vectors, documents):
+    path.mkdir()
+    np.save(path / "embeddings.npy", np.asarray(vectors, dtype=np.float32))
+    with open(path / "records.json", "w", encoding="utf-8") as f:
+        json.dump({"ids": [str(i) for i in range(len(documents))], "documents": documents,
+                   "metadatas": [{"file_name": f"{d}.pdf"} for d in documents]}, f)
+    return NpyStore(str(path))
+
+
+def test_npy_returns_the_nearest_chunks_best_first(tmp_path):
+    store = npy_index(tmp_path / "npy", [[1, 0], [0, 1], [0.8, 0.6]], ["x", "y", "xy"])
+    documents, metadatas = store.query("q", embedding=[1.0, 0.1], n_results=2)
+    assert documents == ["x", "xy"]
+    assert metadatas == [{"file_name": "x.pdf"}, {"file_name": "xy.pdf"}]
+
+
+def test_npy_asks_for_more_than_the_index_holds(tmp_path):
+    store = npy_index(tmp_path / "npy", [[1, 0], [0, 1]], ["x", "y"])
+    assert store.query("q", embedding=[0.0, 1.0], n_results=5)[0] == ["y", "x"]
+
+
+def test_npy_empty_index_or_no_results(tmp_path):
+    empty = npy_index(tmp_path / "empty", np.zeros((0, 2)), [])
+    assert empty.query("q", embedding=[1.0, 0.0], n_results=3) == ([], [])
+    store = npy_index(tmp_path / "npy", [[1, 0]], ["x"])
+    assert store.query("q", embedding=[1.0, 0.0], n_results=0) == ([], [])
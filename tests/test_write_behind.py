@@ -0,0 +1,123 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("firebase_admin")
+
+from functions import WriteBehind  # noqa: E402
+
+
+class Chats:
+
+    def document(self, chat_id):
+        return SimpleNamespace(path=f"users/u/chats/{chat_id}")
+
+
+class FakeDB:
+    """What the write-behind worker uses of a DataBase; an op is (chat_id, message)."""
+
+    def __init__(self, failing_writes=0, failing_reads=0):
+        self.chats = Chats()
+        self.counts = {}
+        self.batches = []
+        self.failing_writes = failing_writes
+        self.failing_reads = failing_reads
+        self.write_started = threading.Event()
+        self.hold = None
+
+    def chat_ops(self, chat_id, chat, chat_bot_hist, summary=None, summarized_upto=None, hist_offset=0):
+        if self.failing_reads:
+            self.failing_reads -= 1
+            raise ConnectionError("read failed")
+        stored = self.counts.get(chat_id, 0)
+        return [(chat_id, m) for m in chat[stored:]], len(chat)
+
+    def write_batched(self, ops):
+        self.write_started.set()
+        if self.hold is not None:
+            self.hold.wait(5)
+        if any(chat_id == "bad" for chat_id, _ in ops):
+            raise ConnectionError("bad chat")
+        if self.failing_writes:
+            self.failing_writes -= 1
+            raise ConnectionError("write failed")
+        self.batches.append(list(ops))
+
+    def set_counts(self, chat_id, counts, overwrite=True):
+        self.counts[chat_id] = counts
+
+    def written(self, chat_id="c"):
+        return [m for batch in self.batches for c, m in batch if c == chat_id]
+
+
+def snapshot(messages, summary=None):
+    return {"chat": list(messages), "chat_bot_hist": [], "summary": summary, "summarized_upto": None, "hist_offset": 0}
+
+
+def test_updates_of_a_chat_are_coalesced_into_one_write():
+    writer, db = WriteBehind(linger=0.1), FakeDB()
+    for n in range(1, 4):
+        writer.submit(db, "c", snapshot([f"m{i}" for i in range(n)], summary="s" if n == 1 else None))
+    assert writer.flush(timeout=5)
+    assert db.batches == [[("c", "m0"), ("c", "m1"), ("c", "m2")]]
+    stats = writer.stats()
+    assert stats["coalesced"] == 2 and stats["flushes"] == 1
+
+
+def test_coalesced_update_keeps_the_earlier_summary():
+    writer, db = WriteBehind(linger=0.1), FakeDB()
+    writer.submit(db, "c", snapshot(["m0"], summary="s"))
+    writer.submit(db, "c", snapshot(["m0", "m1"]))
+    assert writer._pending["users/u/chats/c"]["snapshot"]["summary"] == "s"
+    assert writer.flush(timeout=5)
+
+
+def test_failed_write_is_retried_until_stored():
+    writer, db = WriteBehind(linger=0.01, retry_seconds=0.01, max_retries=2), FakeDB(failing_writes=3)
+    writer.submit(db, "c", snapshot(["m0", "m1"]))
+    assert writer.flush(timeout=5)
+    assert db.written() == ["m0", "m1"]
+    assert writer.stats()["failures"] == 3
+    assert writer.failed == {}
+
+
+def test_failed_read_is_retried_too():
+    writer, db = WriteBehind(linger=0.01, retry_seconds=0.01), FakeDB(failing_reads=2)
+    writer.submit(db, "c", snapshot(["m0"]))
+    assert writer.flush(timeout=5)
+    assert db.written() == ["m0"]
+
+
+def test_lasting_failure_is_reported_and_cleared_once_stored():
+    writer, db = WriteBehind(linger=0.01, retry_seconds=0.01, max_retries=2, max_backoff=0.02), FakeDB(failing_writes=1000)
+    writer.submit(db, "c", snapshot(["m0"]))
+    assert not writer.flush(timeout=0.3)
+    assert writer.failed == {"users/u/chats/c": "write failed"}
+    db.failing_writes = 0
+    assert writer.flush(timeout=5)
+    assert writer.failed == {}
+    assert db.written() == ["m0"]
+
+
+def test_update_queued_during_a_write_is_stored_after_it():
+    writer, db = WriteBehind(linger=0.01), FakeDB()
+    db.hold = threading.Event()
+    writer.submit(db, "c", snapshot(["m0"]))
+    assert db.write_started.wait(5)
+    # the first write is in progress, the next update of the chat waits for it
+    writer.submit(db, "c", snapshot(["m0", "m1"]))
+    assert not writer.flush(timeout=0.1, keys=["users/u/chats/c"])
+    db.hold.set()
+    assert writer.flush(timeout=5)
+    assert db.batches == [[("c", "m0")], [("c", "m1")]]
+
+
+def test_a_failing_chat_does_not_hold_back_the_others():
+    writer, db = WriteBehind(linger=0.05, retry_seconds=0.01, max_backoff=0.02), FakeDB()
+    writer.submit(db, "bad", snapshot(["m0"]))
+    writer.submit(db, "c", snapshot(["m0"]))
+    # both fail in the shared batch, then the good chat is retried on its own
+    assert writer.flush(timeout=5, keys=["users/u/chats/c"])
+    assert db.written("c") == ["m0"]
+    assert not writer.flush(timeout=0.1)
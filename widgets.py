@@ -1,6 +1,7 @@
 
 import streamlit as st
 from functions import DataBase
+from Agents.settings import setting
 
 def login():
     st.session_state.db_app = DataBase()
@@ -35,6 +36,9 @@ def login():
             st.rerun()
 
 def logout(): 
+    # queued chat updates are stored before the session goes away
+    if "db_app" in st.session_state:
+        st.session_state.db_app.flush(timeout=setting("persistence", "flush_timeout", 10.0))
     for key in st.session_state.keys():
         del st.session_state[key]
     st.rerun()   